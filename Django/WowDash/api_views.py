@@ -1,19 +1,27 @@
 import re
+import hashlib
 import json as _json
-import subprocess
 import tempfile
 import os
 from reportlab.lib.pagesizes import mm as _rl_mm
 from reportlab.pdfgen import canvas as _rl_canvas
 from django.contrib.auth import authenticate
-from django.http import JsonResponse, HttpRequest
+from django.http import Http404, JsonResponse, HttpRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.db.models import Count
-from core.models import UsuarioPerfilOptimizador, Cliente, Proyecto, AuditLog, OptimizationRun, NotificacionEnchapador
+from core.models import UsuarioPerfilOptimizador, Cliente, Proyecto, ProyectoResumen, AuditLog, OptimizationRun
 from core.auth_utils import jwt_encode, get_auth_context
+from core.cache_utils import cache_compartido
+from core.resumen_utils import resumen_payload
+from core.fields import cargar_json
+from core.audit import registrar_auditoria
+from core.db_router import lectura_en_replica
 
 
 def _parse_resultado(res):
@@ -22,8 +30,10 @@ def _parse_resultado(res):
     - Si es dict (JSONField entregado ya parseado por Django) → lo devuelve tal cual.
     - Si es string JSON simple → hace un json.loads.
     - Si está doblemente serializado (string dentro de JSON) → hace dos json.loads.
+    - Si llega comprimido vía values() (CompressedJSONField) → lo descomprime primero.
     Siempre retorna un dict.
     """
+    res = cargar_json(res)
     if res is None:
         return None
     if isinstance(res, dict):
@@ -38,6 +48,36 @@ def _parse_resultado(res):
         return None
 
 
+# Payload normalizado del Operador: una entrada por proyecto (la versión nueva pisa a la
+# vieja) guardada junto a su ETag. Solo con cache compartido: con LocMem cada worker
+# guardaría su propia copia de un payload grande.
+TIMEOUT_PAYLOAD_OPERADOR = 300
+
+
+def _version_proyecto(*partes) -> str:
+    """ETag débil a partir de lo que identifica una versión (fechas de modificación, estado...)."""
+    base = ':'.join('' if x is None else (x.isoformat() if hasattr(x, 'isoformat') else str(x)) for x in partes)
+    return 'W/"p-' + hashlib.md5(base.encode('utf-8')).hexdigest() + '"'
+
+
+def _respuesta_condicional(request, etag, last_modified=None):
+    """304 si el cliente ya tiene la versión (If-None-Match / If-Modified-Since), si no None."""
+    ts = int(last_modified.timestamp()) if last_modified else None
+    resp = get_conditional_response(request, etag=etag, last_modified=ts)
+    if resp is not None:
+        resp['ETag'] = etag
+    return resp
+
+
+def _con_validadores(resp, etag, last_modified=None):
+    resp['ETag'] = etag
+    if last_modified:
+        resp['Last-Modified'] = http_date(last_modified.timestamp())
+    # El cliente puede guardar la respuesta pero debe revalidarla en cada consulta
+    resp['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
 def _claims_for_user(user: User):
     perfil = None
     org_id = None
@@ -80,7 +120,7 @@ def auth_login(request: HttpRequest):
         token = jwt_encode(claims)
         # Auditoría LOGIN
         try:
-            AuditLog.objects.create(
+            registrar_auditoria(
                 actor=user,
                 organizacion=getattr(user.usuarioperfiloptimizador, 'organizacion', None),
                 verb='LOGIN',
@@ -182,6 +222,7 @@ def user_resumen_api(request: HttpRequest, user_id: int):
 
 
 @login_required
+@lectura_en_replica
 def analytics_optimizations(request: HttpRequest):
     """GET /api/analytics/optimizations?start=YYYY-MM-DD&end=YYYY-MM-DD
     Retorna lista de eventos por día: [{title, start, allDay:true}]
@@ -266,15 +307,59 @@ def operador_proyectos_api(request: HttpRequest):
 @login_required
 @require_http_methods(["GET"])
 def operador_proyecto_detalle_api(request: HttpRequest, proyecto_id: int):
-    """GET /api/operador/proyectos/<id>: retorna diseño optimizado normalizado para UI Operador."""
+    """GET /api/operador/proyectos/<id>: retorna diseño optimizado normalizado para UI Operador.
+
+    Responde con ETag/Last-Modified derivados de fecha_modificacion y del resumen (que se
+    recalcula con cada cambio de layout); si el cliente ya tiene esa versión devuelve 304
+    sin leer el layout. Con cache compartido el payload normalizado se cachea por proyecto
+    junto a su ETag.
+    """
     ctx = get_auth_context(request)
-    base_qs = Proyecto.objects.select_related('cliente')
+    base_qs = Proyecto.objects.all()
     if not (ctx.get('organization_is_general') or ctx.get('is_support')):
         base_qs = base_qs.filter(organizacion_id=ctx.get('organization_id'))
-    p = get_object_or_404(base_qs, id=proyecto_id)
-    if ctx.get('role') == 'operador' and p.operador_id != request.user.id:
+    # Consulta liviana (sin el layout) para permisos y versión
+    info = base_qs.filter(id=proyecto_id).values(
+        'operador_id', 'estado', 'fecha_modificacion', 'resumen__actualizado_en', 'cliente__nombre'
+    ).first()
+    if info is None:
+        raise Http404
+    if ctx.get('role') == 'operador' and info['operador_id'] != request.user.id:
         return JsonResponse({'success': False, 'message': 'Forbidden'}, status=403)
 
+    etag = _version_proyecto(
+        proyecto_id, info['fecha_modificacion'], info['resumen__actualizado_en'], info['estado'], info['cliente__nombre']
+    )
+    last_modified = max(filter(None, (info['fecha_modificacion'], info['resumen__actualizado_en'])), default=None)
+    no_modificado = _respuesta_condicional(request, etag, last_modified)
+    if no_modificado is not None:
+        return no_modificado
+
+    clave = f"operador:detalle:{proyecto_id}"
+    usar_cache = cache_compartido()
+    payload = None
+    if usar_cache:
+        try:
+            guardado = cache.get(clave)
+        except Exception:
+            guardado = None
+        if guardado and guardado[0] == etag:
+            payload = guardado[1]
+    if payload is None:
+        p = get_object_or_404(base_qs.select_related('cliente'), id=proyecto_id)
+        payload = _payload_operador(p)
+        if isinstance(payload, JsonResponse):
+            return payload
+        if usar_cache:
+            try:
+                cache.set(clave, (etag, payload), TIMEOUT_PAYLOAD_OPERADOR)
+            except Exception:
+                pass
+    return _con_validadores(JsonResponse(payload), etag, last_modified)
+
+
+def _payload_operador(p):
+    """Normaliza el layout del proyecto para la UI Operador (o JsonResponse de error)."""
     # Parsear resultado
     res = p.resultado_optimizacion
     if not res:
@@ -340,7 +425,7 @@ def operador_proyecto_detalle_api(request: HttpRequest, proyecto_id: int):
 
     # Mantener compatibilidad: exponer también el PRIMER material al nivel raíz
     first = normalized_materiales[0] if normalized_materiales else {'meta': {}, 'tableros': []}
-    return JsonResponse({
+    return {
         'success': True,
         'proyecto': {
             'id': p.id,
@@ -353,7 +438,7 @@ def operador_proyecto_detalle_api(request: HttpRequest, proyecto_id: int):
         'tableros': first.get('tableros', []),  # legacy
         'meta': first.get('meta', {}),          # legacy
         'materiales': normalized_materiales,    # nuevo para selector
-    })
+    }
 
 
 @csrf_exempt
@@ -465,11 +550,11 @@ def operador_pieza_estado_api(request: HttpRequest, proyecto_id: int, pieza_id:
             p.resultado_optimizacion = resd
         else:
             p.resultado_optimizacion = materiales[0]
-        p.save(update_fields=['resultado_optimizacion'])
+        p.save(update_fields=['resultado_optimizacion', 'fecha_modificacion'])
 
     # Auditoría
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='EDIT',
@@ -566,10 +651,10 @@ def operador_piezas_batch_api(request: HttpRequest, proyecto_id: int):
             p.resultado_optimizacion = resd
         else:
             p.resultado_optimizacion = materiales[0]
-        p.save(update_fields=['resultado_optimizacion'])
+        p.save(update_fields=['resultado_optimizacion', 'fecha_modificacion'])
 
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='EDIT',
@@ -609,9 +694,9 @@ def operador_proyecto_estado_api(request: HttpRequest, proyecto_id: int):
     if estado not in valid_estados:
         return JsonResponse({'success': False, 'message': 'Estado inválido'}, status=400)
     p.estado = estado
-    p.save(update_fields=['estado'])
+    p.save(update_fields=['estado', 'fecha_modificacion'])
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='UPDATE',
@@ -668,9 +753,9 @@ def operador_proyecto_marcar_todas_cortadas_api(request: HttpRequest, proyecto_i
         p.resultado_optimizacion = resd
     else:
         p.resultado_optimizacion = materiales[0]
-    p.save(update_fields=['resultado_optimizacion'])
+    p.save(update_fields=['resultado_optimizacion', 'fecha_modificacion'])
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='EDIT',
@@ -741,9 +826,9 @@ def operador_proyecto_completar_api(request: HttpRequest, proyecto_id: int):
     # Si hay tapacanto pendiente → enchapado_pendiente, si no → completado directamente
     nuevo_estado = 'enchapado_pendiente' if tiene_tapacanto else 'completado'
     p.estado = nuevo_estado
-    p.save(update_fields=['estado'])
+    p.save(update_fields=['estado', 'fecha_modificacion'])
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='UPDATE',
@@ -755,20 +840,11 @@ def operador_proyecto_completar_api(request: HttpRequest, proyecto_id: int):
     except Exception:
         pass
     # Notificar a todos los enchapadores de la organización si hay enchapado pendiente
+    # (bulk_create en segundo plano tras el commit: no depende del tamaño de la organización)
     if nuevo_estado == 'enchapado_pendiente':
         try:
-            from django.contrib.auth.models import User as _User
-            from core.models import UsuarioPerfilOptimizador as _UP
-            enchapadores = _User.objects.filter(
-                usuarioperfiloptimizador__rol='enchapador',
-                usuarioperfiloptimizador__organizacion_id=p.organizacion_id,
-            )
-            for enc in enchapadores:
-                NotificacionEnchapador.objects.create(
-                    destinatario=enc,
-                    proyecto_nombre=p.nombre or '',
-                    proyecto_id=p.id,
-                )
+            from core.notificaciones import notificar_enchapadores
+            notificar_enchapadores(p)
         except Exception:
             pass
     return JsonResponse({'success': True, 'estado': nuevo_estado, 'enchapado_pendiente': nuevo_estado == 'enchapado_pendiente'})
@@ -832,7 +908,7 @@ def operador_tablero_completado_api(request: HttpRequest, proyecto_id: int):
         p.resultado_optimizacion = materiales[0]
 
     # Actualizar estado del proyecto a en_proceso si corresponde
-    campos_a_guardar = ['resultado_optimizacion']
+    campos_a_guardar = ['resultado_optimizacion', 'fecha_modificacion']
     if p.estado not in ('completado', 'en_proceso', 'produccion'):
         p.estado = 'en_proceso'
         campos_a_guardar.append('estado')
@@ -853,7 +929,7 @@ def operador_tablero_completado_api(request: HttpRequest, proyecto_id: int):
                 todos_cortados = False
 
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='EDIT',
@@ -879,32 +955,64 @@ def operador_tablero_completado_api(request: HttpRequest, proyecto_id: int):
 @login_required
 @require_http_methods(["GET"])
 def impresoras_list_api(request: HttpRequest):
-    """GET /api/impresoras  →  lista de impresoras CUPS disponibles."""
-    try:
-        result = subprocess.run(
-            ['lpstat', '-p'],
-            capture_output=True, text=True, timeout=5
-        )
-        lines = result.stdout.splitlines()
-        printers = []
-        for line in lines:
-            # formato: "la impresora NOMBRE está ..."
-            parts = line.split()
-            if len(parts) >= 3:
-                printers.append(parts[2])
-        # impresora por defecto
-        default_result = subprocess.run(
-            ['lpstat', '-d'],
-            capture_output=True, text=True, timeout=5
-        )
-        default_name = ''
-        for line in default_result.stdout.splitlines():
-            if ':' in line:
-                default_name = line.split(':', 1)[-1].strip()
-                break
-        return JsonResponse({'success': True, 'impresoras': printers, 'default': default_name})
-    except Exception as e:
-        return JsonResponse({'success': False, 'message': str(e), 'impresoras': [], 'default': ''}, status=500)
+    """GET /api/impresoras  →  lista de impresoras CUPS disponibles.
+    La lista se cachea y se refresca en segundo plano (core.impresion); ?refrescar=1 fuerza
+    un refresco para la próxima consulta sin esperar a que termine.
+    """
+    from core.impresion import listar_impresoras, refrescar_impresoras
+    if request.GET.get('refrescar', '').lower() in ('1', 'true', 'yes'):
+        refrescar_impresoras()
+    info = listar_impresoras()
+    if info['error'] and not info['impresoras']:
+        return JsonResponse({'success': False, 'message': info['error'], 'impresoras': [], 'default': ''}, status=500)
+    return JsonResponse({'success': True, 'impresoras': info['impresoras'], 'default': info['default'],
+                         'actualizado': info['actualizado']})
+
+
+def _encolar_zpl(request, zpl, impresora, etiquetas=1):
+    """Envía el ZPL al spooler (core.impresion) y responde 202 con el id del trabajo."""
+    from core.impresion import encolar_impresion
+    trabajo_id = encolar_impresion(zpl, impresora, usuario_id=request.user.id)
+    return JsonResponse({'success': True, 'trabajo_id': trabajo_id, 'etiquetas': etiquetas}, status=202)
+
+
+@login_required
+@require_http_methods(["GET"])
+def impresion_trabajo_estado_api(request: HttpRequest, trabajo_id: str):
+    """GET /api/impresion/trabajos/<id>  →  estado de un trabajo de impresión encolado."""
+    from core.impresion import estado_trabajo
+    estado = estado_trabajo(trabajo_id)
+    if estado is None:
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado'}, status=404)
+    ctx = get_auth_context(request)
+    if estado.get('usuario_id') != request.user.id and not ctx.get('is_support'):
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado'}, status=404)
+    return JsonResponse({'success': True, 'trabajo': estado})
+
+
+@login_required
+@require_http_methods(["GET"])
+def computo_trabajo_estado_api(request: HttpRequest, trabajo_id: str):
+    """GET /api/computo/trabajos/<id>  →  estado de un trabajo del pool de cómputo (PDF,
+    optimización) que respondió 202. Al completarse trae ``respuesta`` (si la vista la guarda)."""
+    from core.computo import estado_trabajo
+    estado = estado_trabajo(trabajo_id)
+    if estado is None:
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado'}, status=404)
+    ctx = get_auth_context(request)
+    if estado.get('usuario_id') != request.user.id and not ctx.get('is_support'):
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado'}, status=404)
+    return JsonResponse({'success': True, 'trabajo': estado})
+
+
+@login_required
+@require_http_methods(["GET"])
+def computo_metricas_api(request: HttpRequest):
+    """GET /api/computo/metricas  →  cola y cupos del pool de cómputo de este proceso (soporte)."""
+    from core.computo import metricas
+    if not get_auth_context(request).get('is_support'):
+        return JsonResponse({'success': False, 'message': 'No autorizado'}, status=403)
+    return JsonResponse({'success': True, 'metricas': metricas()})
 
 
 @csrf_exempt
@@ -912,8 +1020,10 @@ def impresoras_list_api(request: HttpRequest):
 @require_http_methods(["POST"])
 def imprimir_etiqueta_pieza_api(request: HttpRequest, proyecto_id: int, pieza_id: str):
     """POST /api/operador/proyectos/<id>/piezas/<pieza_id>/imprimir-etiqueta
-    Body JSON: { impresora: str (opcional), copias: int (opcional, default 1) }
-    Genera un PDF de etiqueta con reportlab y lo envía a la impresora CUPS.
+    Body JSON: { impresora: str (opcional), copias: int (opcional, default 1),
+                 enviar: bool (opcional) }
+    Genera el ZPL de la etiqueta y lo devuelve como texto; con enviar=true lo encola en el
+    spooler de CUPS (core.impresion) y responde 202 con el id del trabajo.
     """
     ctx = get_auth_context(request)
     base_qs = Proyecto.objects
@@ -1007,8 +1117,6 @@ def imprimir_etiqueta_pieza_api(request: HttpRequest, proyecto_id: int, pieza_id
     # Para mostrar pieza N (idx/total)
     if mti:
         target_m2 = int(mti.group(1)); target_t2 = int(mti.group(2)); target_p2 = int(mti.group(3))
-        mismo_nombre = [p for mat in materiales for t in (mat.get('tableros') or [])
-                        for p in (t.get('piezas') or []) if str(p.get('nombre') or '') == nombre]
         pieza_idx_global = 0
         cnt = 0
         for mat2 in materiales:
@@ -1109,155 +1217,164 @@ def imprimir_etiqueta_pieza_api(request: HttpRequest, proyecto_id: int, pieza_id
 
     zpl = '\n'.join(zpl_lines)
 
+    if payload.get('enviar'):
+        return _encolar_zpl(request, zpl, impresora)
+
     # Devolver el ZPL como texto — el navegador lo envía a Zebra Browser Print local
     from django.http import HttpResponse
     return HttpResponse(zpl, content_type='text/plain; charset=utf-8')
 
 
-# ---------------------------------------------------------------------------
-# RESUMEN DE PROYECTO — popup de previsualización
-# ---------------------------------------------------------------------------
+def _nombre_material_etiqueta(mat):
+    nombre = mat.get('material') or mat.get('nombre') or (mat.get('meta') or {}).get('material') or '—'
+    if isinstance(nombre, dict):
+        nombre = nombre.get('nombre') or nombre.get('codigo') or '—'
+    return nombre
 
-@login_required
-@require_http_methods(["GET"])
-def proyecto_resumen_api(request, proyecto_id: int):
-    """GET /api/proyectos/<id>/resumen
-    Devuelve un resumen calculado del proyecto: materiales, tableros, piezas,
-    cortes, metros de tapacanto y porcentaje de avance.
 
-    Estructura real de resultado_optimizacion:
-      { materiales: [ { material: {nombre, codigo}, tapacanto: {nombre, codigo},
-                        tableros: [ { piezas: [ {nombre, ancho, largo,
-                                                  indiceUnidad, totalUnidades,
-                                                  estado?, tapacantos:{arriba,abajo,izq,der} } ] } ] } ],
-        total_piezas, total_tableros, ... }
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def imprimir_etiquetas_lote_api(request: HttpRequest, proyecto_id: int):
+    """POST /api/operador/proyectos/<id>/etiquetas
+    Body JSON: { material: int (opcional, 1-based), tablero: int (opcional, requiere material),
+                 copias: int (opcional, default 1), impresora: str (opcional), enviar: bool (opcional) }
+    Devuelve en una sola respuesta el ZPL concatenado de todas las etiquetas del proyecto,
+    de un material o de un tablero, con el diseño de ConfiguracionEtiqueta de la organización.
+    El layout se lee una vez y el contador "(n/total)" por nombre se calcula en el mismo
+    recorrido (los totales se cuentan antes), así que el costo es lineal en piezas.
     """
-    import json as _json
-    from core.auth_utils import get_auth_context
+    from WowDash.settings_views import _generar_zpl_con_config
+    from core.models import ConfiguracionEtiqueta
+    from collections import Counter
+
     ctx = get_auth_context(request)
-    qs = Proyecto.objects.select_related('cliente', 'operador')
+    base_qs = Proyecto.objects
     if not (ctx.get('organization_is_general') or ctx.get('is_support')):
-        qs = qs.filter(organizacion_id=ctx.get('organization_id'))
-    p = get_object_or_404(qs, id=proyecto_id)
+        base_qs = base_qs.filter(organizacion_id=ctx.get('organization_id'))
+    row = base_qs.filter(id=proyecto_id).values(
+        'id', 'resultado_optimizacion', 'public_id', 'organizacion_id', 'cliente__nombre'
+    ).first()
+    if not row:
+        raise Http404
 
-    # resultado_optimizacion puede ser dict o string JSON
-    raw = p.resultado_optimizacion or {}
-    if isinstance(raw, str):
-        try:
-            resultado = _json.loads(raw)
-        except Exception:
-            resultado = {}
-    else:
-        resultado = raw
+    try:
+        payload = _json.loads(request.body.decode('utf-8') or '{}')
+    except Exception:
+        payload = {}
+    try:
+        filtro_m = int(payload['material']) if payload.get('material') not in (None, '') else None
+        filtro_t = int(payload['tablero']) if payload.get('tablero') not in (None, '') else None
+        copias = max(1, min(10, int(payload.get('copias') or 1)))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos'}, status=400)
+    if filtro_t is not None and filtro_m is None:
+        return JsonResponse({'success': False, 'message': 'tablero requiere material'}, status=400)
 
-    materiales_raw = resultado.get('materiales') or []
+    res = row['resultado_optimizacion']
+    if not res:
+        return JsonResponse({'success': False, 'message': 'Proyecto sin resultado'}, status=404)
+    try:
+        resd = _parse_resultado(res)
+    except Exception:
+        resd = None
+    if not isinstance(resd, dict):
+        return JsonResponse({'success': False, 'message': 'Resultado inválido'}, status=500)
+    materiales = resd.get('materiales') if isinstance(resd.get('materiales'), list) else [resd]
 
-    total_piezas_global = 0
-    total_piezas_cortadas = 0
-    total_tableros = 0
-    total_cortes = 0
-    metros_tapacanto = 0.0
-    tiene_tapacanto = False
-    materiales_resumen = []
+    cfg = ConfiguracionEtiqueta.get_config(row['organizacion_id']).to_dict()
+    folio_id = str(row.get('public_id') or proyecto_id)
+    cliente_n = str(row.get('cliente__nombre') or '').strip()
 
-    for mat in materiales_raw:
-        # material es un dict {nombre, codigo, ...}
-        mat_info = mat.get('material') or {}
-        mat_nombre = mat_info.get('nombre') or mat_info.get('codigo') or mat.get('nombre') or '—'
+    # Totales por nombre en todo el proyecto (igual que la etiqueta individual)
+    totales = Counter(
+        str(pi.get('nombre') or '')
+        for mat in materiales for t in (mat.get('tableros') or []) for pi in (t.get('piezas') or [])
+    )
+    vistos = Counter()
+    etiquetas = []
+    for m_idx, mat in enumerate(materiales, start=1):
+        material_nombre = _nombre_material_etiqueta(mat)
+        for t_idx, tablero in enumerate(mat.get('tableros') or [], start=1):
+            for i, pi in enumerate(tablero.get('piezas') or [], start=1):
+                nombre_base = str(pi.get('nombre') or '')
+                # El contador avanza aunque la pieza quede fuera del filtro: el índice es global
+                vistos[nombre_base] += 1
+                if filtro_m is not None and m_idx != filtro_m:
+                    continue
+                if filtro_t is not None and t_idx != filtro_t:
+                    continue
+                total = totales[nombre_base]
+                etiquetas.append(_generar_zpl_con_config(cfg, {
+                    'nombre': nombre_base or f"m{m_idx}t{t_idx}p{i}",
+                    'ancho': int(pi.get('ancho') or 0),
+                    'largo': int(pi.get('largo') or 0),
+                    'pieza_idx': vistos[nombre_base],
+                    'pieza_count': total if total > 1 else '',
+                    'material': material_nombre,
+                    'cliente': cliente_n,
+                    'proyecto_id': folio_id,
+                    'tapacantos': pi.get('tapacantos') or {},
+                    'veta': pi.get('veta') or '',
+                }, copias=copias, guardar_config=not etiquetas))
 
-        # tapacanto es un dict {nombre, codigo}
-        tap_info = mat.get('tapacanto') or {}
-        tap_nombre = (tap_info.get('nombre') or tap_info.get('codigo') or '').strip()
+    if not etiquetas:
+        return JsonResponse({'success': False, 'message': 'No hay piezas para el filtro indicado'}, status=404)
 
-        tableros = mat.get('tableros') or []
-        mat_tableros = len(tableros)
+    zpl = '\n'.join(etiquetas)
+    if payload.get('enviar'):
+        return _encolar_zpl(request, zpl, (payload.get('impresora') or '').strip() or None, len(etiquetas))
 
-        # Conteo de piezas: cada (nombre, indiceUnidad) es una pieza distinta.
-        # totalUnidades indica cuántas unidades del tipo hay (no útil para contar).
-        piezas_vistas: set = set()    # set de (nombre, indiceUnidad)
-        piezas_cortadas_vistas: set = set()
-        mat_tc_metros = 0.0
-        mat_cortes = 0
+    from django.http import HttpResponse
+    resp = HttpResponse(zpl, content_type='text/plain; charset=utf-8')
+    resp['X-Etiquetas-Total'] = str(len(etiquetas))
+    return resp
 
-        for t in tableros:
-            piezas = t.get('piezas') or []
-            piezas_activas = []
-            for pi in piezas:
-                estado_pi = (pi.get('estado') or 'pendiente').strip()
-                if estado_pi == 'descartada':
-                    continue
-                piezas_activas.append(pi)
-
-                clave = (pi.get('nombre') or '', int(pi.get('indiceUnidad') or 0))
-                piezas_vistas.add(clave)
-                if estado_pi == 'cortada':
-                    piezas_cortadas_vistas.add(clave)
-
-                # Metros de tapacanto por pieza (dimensiones en mm → metros)
-                tc = pi.get('tapacantos') or {}
-                ancho_m = float(pi.get('ancho') or 0) / 1000
-                largo_m = float(pi.get('largo') or 0) / 1000
-                if tc.get('arriba'):    mat_tc_metros += ancho_m
-                if tc.get('abajo'):     mat_tc_metros += ancho_m
-                if tc.get('izquierda'): mat_tc_metros += largo_m
-                if tc.get('derecha'):   mat_tc_metros += largo_m
-                if any(tc.get(k) for k in ('arriba', 'abajo', 'izquierda', 'derecha')):
-                    tiene_tapacanto = True
-
-            # Cortes guillotina: filas + columnas únicas de corte en este tablero
-            if piezas_activas:
-                xs = set(round(pi.get('x', 0)) for pi in piezas_activas)
-                ys = set(round(pi.get('y', 0)) for pi in piezas_activas)
-                mat_cortes += max(0, len(xs) - 1) + max(0, len(ys) - 1)
 
-        if tap_nombre:
-            tiene_tapacanto = True
+# ---------------------------------------------------------------------------
+# RESUMEN DE PROYECTO — popup de previsualización
+# ---------------------------------------------------------------------------
 
-        # Totales de piezas para este material
-        mat_total_piezas = len(piezas_vistas)
-        mat_cortadas = len(piezas_cortadas_vistas)
-
-        total_piezas_global += mat_total_piezas
-        total_piezas_cortadas += mat_cortadas
-        total_tableros += mat_tableros
-        total_cortes += mat_cortes
-        metros_tapacanto += mat_tc_metros
-
-        materiales_resumen.append({
-            'nombre': mat_nombre,
-            'tableros': mat_tableros,
-            'piezas': mat_total_piezas,
-            'tapacanto': tap_nombre,
-            'tiene_tapacanto': bool(tap_nombre) or mat_tc_metros > 0,
-        })
+def _resumen_de(p):
+    """Devuelve el ProyectoResumen del proyecto; si aún no existe (filas anteriores
+    a la denormalización) lo calcula una vez desde el layout y lo persiste."""
+    try:
+        return p.resumen
+    except ProyectoResumen.DoesNotExist:
+        resultado = Proyecto.objects.filter(id=p.id).values_list('resultado_optimizacion', flat=True).first()
+        return ProyectoResumen.sincronizar(p, resultado=resultado or {})
 
-    pct_avance = 0
-    if total_piezas_global > 0:
-        pct_avance = round(total_piezas_cortadas * 100 / total_piezas_global, 1)
-
-    # Si el proyecto no ha entrado a producción las piezas no tienen estado → 0%
-    estado_sin_avance = p.estado in ('borrador', 'optimizado', 'aprobado', 'asignado', 'enchapado_pendiente')
-    if estado_sin_avance:
-        pct_avance = 0
-        total_piezas_cortadas = 0
-
-    # Usar totales del header JSON si el parseo de piezas da cero (proyecto nuevo)
-    if total_piezas_global == 0 and resultado.get('total_piezas'):
-        total_piezas_global = int(resultado['total_piezas'])
-    if total_tableros == 0 and resultado.get('total_tableros'):
-        total_tableros = int(resultado['total_tableros'])
-
-    # Si no hay detalle por material pero sí hay totales globales, crear entry genérico
-    if not materiales_resumen and (total_piezas_global > 0 or total_tableros > 0):
-        materiales_resumen = [{
-            'nombre': '—',
-            'tableros': total_tableros,
-            'piezas': total_piezas_global,
-            'tapacanto': '',
-            'tiene_tapacanto': tiene_tapacanto,
-        }]
 
-    return JsonResponse({
+@login_required
+@require_http_methods(["GET"])
+@lectura_en_replica
+def proyecto_resumen_api(request, proyecto_id: int):
+    """GET /api/proyectos/<id>/resumen
+    Devuelve un resumen del proyecto: materiales, tableros, piezas,
+    cortes, metros de tapacanto y porcentaje de avance.
+
+    Los totales se leen de ProyectoResumen (mantenido al guardar el layout),
+    por lo que no se recorre resultado_optimizacion en cada llamada. Con If-None-Match /
+    If-Modified-Since responde 304 si el proyecto y su resumen no cambiaron.
+    """
+    from core.auth_utils import get_auth_context
+    ctx = get_auth_context(request)
+    qs = Proyecto.objects.select_related('cliente', 'operador', 'resumen').defer(
+        'resultado_optimizacion', 'configuracion', 'descripcion'
+    )
+    if not (ctx.get('organization_is_general') or ctx.get('is_support')):
+        qs = qs.filter(organizacion_id=ctx.get('organization_id'))
+    p = get_object_or_404(qs, id=proyecto_id)
+    resumen = _resumen_de(p)
+    etag = _version_proyecto(
+        p.id, p.fecha_modificacion, resumen.actualizado_en, p.estado, p.operador_id, p.cliente_id and p.cliente.nombre
+    )
+    last_modified = max(p.fecha_modificacion, resumen.actualizado_en)
+    no_modificado = _respuesta_condicional(request, etag, last_modified)
+    if no_modificado is not None:
+        return no_modificado
+
+    return _con_validadores(JsonResponse({
         'id': p.id,
         'codigo': p.public_id or p.codigo,
         'nombre': p.nombre,
@@ -1265,16 +1382,8 @@ def proyecto_resumen_api(request, proyecto_id: int):
         'estado': p.estado,
         'estado_display': p.get_estado_display(),
         'operador': (p.operador.get_full_name() or p.operador.username) if p.operador else None,
-        'total_materiales': len(materiales_resumen),
-        'total_tableros': total_tableros,
-        'total_piezas': total_piezas_global,
-        'total_piezas_cortadas': total_piezas_cortadas,
-        'total_cortes': total_cortes,
-        'metros_tapacanto': round(metros_tapacanto, 2),
-        'tiene_tapacanto': tiene_tapacanto,
-        'pct_avance': pct_avance,
-        'materiales': materiales_resumen,
-    })
+        **resumen_payload(resumen, p.estado),
+    }), etag, last_modified)
 
 
 # ---------------------------------------------------------------------------
@@ -1283,12 +1392,13 @@ def proyecto_resumen_api(request, proyecto_id: int):
 
 @login_required
 @require_http_methods(["GET"])
+@lectura_en_replica
 def proyectos_resumen_batch_api(request):
     """GET /api/proyectos/resumen-batch?ids=1,2,3
     Devuelve los resúmenes de varios proyectos en una sola llamada.
-    Usado para precargar datos al cargar la página.
+    Usado para precargar datos al cargar la página. El ETag cubre todos los proyectos
+    pedidos: si ninguno cambió responde 304.
     """
-    import json as _json
     from core.auth_utils import get_auth_context
     ctx = get_auth_context(request)
 
@@ -1301,125 +1411,41 @@ def proyectos_resumen_batch_api(request):
     if not ids:
         return JsonResponse({'resumenes': {}})
 
-    qs = Proyecto.objects.select_related('cliente', 'operador').filter(id__in=ids).defer(
-        'configuracion', 'descripcion'
+    qs = Proyecto.objects.select_related('cliente', 'operador', 'resumen').filter(id__in=ids).defer(
+        'resultado_optimizacion', 'configuracion', 'descripcion'
     )
     if not (ctx.get('organization_is_general') or ctx.get('is_support')):
         qs = qs.filter(organizacion_id=ctx.get('organization_id'))
 
-    def _calcular(p):
-        raw = p.resultado_optimizacion or {}
-        if isinstance(raw, str):
-            try:
-                resultado = _json.loads(raw)
-            except Exception:
-                resultado = {}
-        else:
-            resultado = raw
-
-        materiales_raw = resultado.get('materiales') or []
-        total_piezas_global = 0
-        total_piezas_cortadas = 0
-        total_tableros = 0
-        total_cortes = 0
-        metros_tapacanto = 0.0
-        tiene_tapacanto = False
-        materiales_resumen = []
-
-        for mat in materiales_raw:
-            mat_info = mat.get('material') or {}
-            mat_nombre = mat_info.get('nombre') or mat_info.get('codigo') or mat.get('nombre') or '—'
-            tap_info = mat.get('tapacanto') or {}
-            tap_nombre = (tap_info.get('nombre') or tap_info.get('codigo') or '').strip()
-            tableros = mat.get('tableros') or []
-            mat_tableros = len(tableros)
-            piezas_vistas = set()
-            piezas_cortadas_vistas = set()
-            mat_tc_metros = 0.0
-            mat_cortes = 0
-
-            for t in tableros:
-                piezas_activas = []
-                for pi in (t.get('piezas') or []):
-                    if (pi.get('estado') or '').strip() == 'descartada':
-                        continue
-                    piezas_activas.append(pi)
-                    clave = (pi.get('nombre') or '', int(pi.get('indiceUnidad') or 0))
-                    piezas_vistas.add(clave)
-                    if (pi.get('estado') or '').strip() == 'cortada':
-                        piezas_cortadas_vistas.add(clave)
-                    tc = pi.get('tapacantos') or {}
-                    ancho_m = float(pi.get('ancho') or 0) / 1000
-                    largo_m = float(pi.get('largo') or 0) / 1000
-                    if tc.get('arriba'):    mat_tc_metros += ancho_m
-                    if tc.get('abajo'):     mat_tc_metros += ancho_m
-                    if tc.get('izquierda'): mat_tc_metros += largo_m
-                    if tc.get('derecha'):   mat_tc_metros += largo_m
-                    if any(tc.get(k) for k in ('arriba', 'abajo', 'izquierda', 'derecha')):
-                        tiene_tapacanto = True
-                if piezas_activas:
-                    xs = set(round(pi.get('x', 0)) for pi in piezas_activas)
-                    ys = set(round(pi.get('y', 0)) for pi in piezas_activas)
-                    mat_cortes += max(0, len(xs) - 1) + max(0, len(ys) - 1)
-
-            if tap_nombre:
-                tiene_tapacanto = True
-
-            mat_total_piezas = len(piezas_vistas)
-            mat_cortadas = len(piezas_cortadas_vistas)
-            total_piezas_global += mat_total_piezas
-            total_piezas_cortadas += mat_cortadas
-            total_tableros += mat_tableros
-            total_cortes += mat_cortes
-            metros_tapacanto += mat_tc_metros
-            materiales_resumen.append({
-                'nombre': mat_nombre,
-                'tableros': mat_tableros,
-                'piezas': mat_total_piezas,
-                'tapacanto': tap_nombre,
-            })
-
-        pct_avance = 0
-        if total_piezas_global > 0:
-            pct_avance = round(total_piezas_cortadas * 100 / total_piezas_global, 1)
-        if p.estado in ('borrador', 'optimizado', 'aprobado', 'asignado', 'enchapado_pendiente'):
-            pct_avance = 0
-            total_piezas_cortadas = 0
-        if total_piezas_global == 0 and resultado.get('total_piezas'):
-            total_piezas_global = int(resultado['total_piezas'])
-        if total_tableros == 0 and resultado.get('total_tableros'):
-            total_tableros = int(resultado['total_tableros'])
-
-        # Si no hay detalle por material pero sí hay totales globales, crear entry genérico
-        if not materiales_resumen and (total_piezas_global > 0 or total_tableros > 0):
-            materiales_resumen = [{
-                'nombre': '—',
-                'tableros': total_tableros,
-                'piezas': total_piezas_global,
-                'tapacanto': '',
-            }]
-
-        return {
-            'id': p.id,
-            'codigo': p.public_id or p.codigo,
-            'cliente': p.cliente.nombre if p.cliente else '—',
-            'estado': p.estado,
-            'estado_display': p.get_estado_display(),
-            'total_tableros': total_tableros,
-            'total_piezas': total_piezas_global,
-            'total_piezas_cortadas': total_piezas_cortadas,
-            'total_cortes': total_cortes,
-            'metros_tapacanto': round(metros_tapacanto, 2),
-            'tiene_tapacanto': tiene_tapacanto,
-            'pct_avance': pct_avance,
-            'materiales': materiales_resumen,
-        }
+    proyectos = []
+    versiones = []
+    for p in qs.order_by('id'):
+        try:
+            resumen = _resumen_de(p)
+        except Exception:
+            resumen = None
+        proyectos.append((p, resumen))
+        versiones += [p.id, p.fecha_modificacion, getattr(resumen, 'actualizado_en', None), p.estado,
+                      p.operador_id, p.cliente_id and p.cliente.nombre]
+    etag = _version_proyecto(*versiones)
+    no_modificado = _respuesta_condicional(request, etag)
+    if no_modificado is not None:
+        return no_modificado
 
     resumenes = {}
-    for p in qs:
+    for p, resumen in proyectos:
         try:
-            resumenes[str(p.id)] = _calcular(p)
+            datos = resumen_payload(resumen, p.estado)
+            datos.pop('total_materiales', None)
+            resumenes[str(p.id)] = {
+                'id': p.id,
+                'codigo': p.public_id or p.codigo,
+                'cliente': p.cliente.nombre if p.cliente else '—',
+                'estado': p.estado,
+                'estado_display': p.get_estado_display(),
+                **datos,
+            }
         except Exception:
             resumenes[str(p.id)] = None
 
-    return JsonResponse({'resumenes': resumenes})
+    return _con_validadores(JsonResponse({'resumenes': resumenes}), etag)
@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from core.auth_utils import jwt_encode
-from core.models import AuditLog
+from core.audit import registrar_auditoria
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -53,7 +53,7 @@ def signin(request):
                 pass
             # Auditoría LOGIN
             try:
-                AuditLog.objects.create(
+                registrar_auditoria(
                     actor=user,
                     organizacion=getattr(getattr(user, 'usuarioperfiloptimizador', None), 'organizacion', None),
                     verb='LOGIN',
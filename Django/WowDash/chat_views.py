@@ -2,17 +2,88 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.http import JsonResponse
-from django.db.models import Q, Max, Count
+from django.db.models import Q, Max, Count, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.db import models
 from django.utils import timezone
 from django.contrib import messages
-from core.models import Conversacion, Mensaje, MensajeLeido, UsuarioPerfilOptimizador
+from core.models import Conversacion, LecturaConversacion, Mensaje, UsuarioPerfilOptimizador
 from core.auth_utils import get_auth_context
 import json
 from django.core.paginator import Paginator
 from django.urls import reverse
 
 
+def _marcar_leidos(request, conversacion, hasta_id):
+    """Avanza la marca de lectura del usuario hasta ``hasta_id`` (una escritura, sin importar
+    cuántos mensajes había sin leer) y, si avanzó, lo anuncia en su canal de chat (los badges
+    de sus otras pestañas se actualizan sin polling)."""
+    if not hasta_id or not LecturaConversacion.marcar(request.user.id, conversacion.id, hasta_id):
+        return False
+    try:
+        from core.eventos import publicar_leidos
+        publicar_leidos(conversacion, [request.user.id], request.user.id)
+    except Exception:
+        pass
+    return True
+
+
+def _marca_lectura(user_id, conversacion=OuterRef('conversacion_id')):
+    """Subconsulta con la marca de lectura del usuario en la conversación (0 si no hay)."""
+    return Coalesce(Subquery(
+        LecturaConversacion.objects.filter(usuario_id=user_id, conversacion_id=conversacion)
+        .values('ultimo_leido_id')[:1]
+    ), Value(0))
+
+
+def _leido_hasta(conversacion, usuario):
+    """Mayor marca de lectura de los demás participantes: los mensajes propios con id
+    menor o igual ya los leyó alguien (doble check en la plantilla)."""
+    return conversacion.lecturas.exclude(usuario=usuario).aggregate(m=Max('ultimo_leido_id'))['m'] or 0
+
+
+def _participantes_prefetch(lookup='participantes'):
+    """Participantes con solo los campos que usa nombre_display (una consulta para todas)."""
+    return Prefetch(lookup, queryset=User.objects.only('id', 'username', 'first_name', 'last_name'))
+
+
+def _bandeja(user, base):
+    """Conversaciones de ``base`` para la barra lateral, con nombre, último mensaje y no leídos.
+
+    Dos consultas sin importar cuántas conversaciones haya: conversaciones anotadas con
+    subconsultas correlacionadas (marca de lectura, último mensaje, conteo sobre el índice
+    conversacion+id) y el prefetch de participantes para ``nombre_display``. Deja en cada
+    conversación los alias que espera la plantilla.
+    """
+    ultimos = Mensaje.objects.filter(conversacion=OuterRef('pk')).order_by('-id')
+    no_leidos = (Mensaje.objects.filter(conversacion=OuterRef('pk'), id__gt=OuterRef('marca_lectura'))
+                 .exclude(autor=user).order_by().values('conversacion').annotate(n=Count('id')).values('n'))
+    qs = (base.annotate(
+        marca_lectura=_marca_lectura(user.id, OuterRef('pk')),
+        ultimo_id=Subquery(ultimos.values('id')[:1]),
+        ultimo_contenido=Subquery(ultimos.values('contenido')[:1]),
+        ultimo_enviado_en=Subquery(ultimos.values('enviado_en')[:1]),
+        no_leidos=Coalesce(Subquery(no_leidos), Value(0)),
+    ).prefetch_related(_participantes_prefetch()).distinct().order_by('-actualizado_en'))
+
+    conversaciones = list(qs)
+    for c in conversaciones:
+        # nombre_display es un método; la plantilla usa el texto ya resuelto
+        c.nombre_display = c.nombre_display(user)
+        c.mensajes_no_leidos = c.no_leidos
+        c.ultimo_mensaje = None
+        if c.ultimo_id:
+            c.ultimo_mensaje = Mensaje(id=c.ultimo_id, conversacion_id=c.id,
+                                       contenido=c.ultimo_contenido, enviado_en=c.ultimo_enviado_en)
+    return conversaciones
+
+
+def _marcar_bandeja_leida(request, conversacion):
+    """Marca como leída una conversación de la bandeja (ya anotada con su último mensaje)."""
+    _marcar_leidos(request, conversacion, conversacion.ultimo_id)
+    conversacion.mensajes_no_leidos = 0
+
+
 @login_required
 def chat_lista(request):
     """Vista principal del chat - lista de conversaciones"""
@@ -20,27 +91,16 @@ def chat_lista(request):
     base = Conversacion.objects.filter(participantes=request.user)
     if not (ctx.get('organization_is_general') or ctx.get('is_support')):
         base = base.filter(organizacion_id=ctx.get('organization_id'))
-    conversaciones = base.prefetch_related('participantes', 'mensajes').distinct().order_by('-actualizado_en')
-    
-    # Agregar información adicional a cada conversación
-    for conversacion in conversaciones:
-        # Importante: calcular nombre_display ANTES de tocar otros atributos para no romper métodos
-        nombre_disp = conversacion.nombre_display(request.user)
-        no_leidos = conversacion.mensajes_no_leidos(request.user)
-        # Asignar alias que el template espera
-        conversacion.nombre_display = nombre_disp
-        conversacion.mensajes_no_leidos = no_leidos
-        # No sobrescribir el método otros_participantes; si se requiere, usar un alias distinto
-    
     # Buscar conversaciones
     search = request.GET.get('search', '')
     if search:
-        conversaciones = conversaciones.filter(
+        base = base.filter(
             Q(nombre__icontains=search) |
             Q(participantes__first_name__icontains=search) |
             Q(participantes__last_name__icontains=search) |
             Q(participantes__username__icontains=search)
-        ).distinct()
+        )
+    conversaciones = _bandeja(request.user, base)
     
     # Obtener usuarios disponibles para iniciar chat
     usuarios_disponibles = User.objects.filter(is_active=True).exclude(id=request.user.id)
@@ -48,17 +108,13 @@ def chat_lista(request):
         usuarios_disponibles = usuarios_disponibles.filter(usuarioperfiloptimizador__organizacion_id=ctx.get('organization_id'))
     
     # Conversación activa (la primera por defecto)
-    conversacion_activa = conversaciones.first()
+    conversacion_activa = conversaciones[0] if conversaciones else None
     mensajes = []
     
     if conversacion_activa:
         mensajes = conversacion_activa.mensajes.all().select_related('autor')[:50]
-        # Marcar mensajes como leídos
-        mensajes_no_leidos = conversacion_activa.mensajes.exclude(autor=request.user).filter(leido=False)
-        for mensaje in mensajes_no_leidos:
-            MensajeLeido.objects.get_or_create(usuario=request.user, mensaje=mensaje)
-            mensaje.leido = True
-            mensaje.save(update_fields=['leido'])
+        # Marcar la conversación como leída hasta su último mensaje
+        _marcar_bandeja_leida(request, conversacion_activa)
     
     context = {
         "title": "Chat",
@@ -66,6 +122,7 @@ def chat_lista(request):
         "conversaciones": conversaciones,
         "conversacion_actual": conversacion_activa,
         "mensajes": mensajes,
+        "leido_hasta": _leido_hasta(conversacion_activa, request.user) if conversacion_activa else 0,
         "usuarios_disponibles": usuarios_disponibles,
         "search": search,
         "usuario_actual": request.user,
@@ -101,18 +158,14 @@ def chat_conversacion(request, conversacion_id):
     else:
         mensajes = conversacion.mensajes.all().select_related('autor')[:50]
     
-    # Marcar mensajes como leídos
-    mensajes_no_leidos = conversacion.mensajes.exclude(autor=request.user).filter(leido=False)
-    for mensaje in mensajes_no_leidos:
-        MensajeLeido.objects.get_or_create(usuario=request.user, mensaje=mensaje)
-        mensaje.leido = True
-        mensaje.save(update_fields=['leido'])
-    
-    # Obtener todas las conversaciones para la sidebar (respetando el mismo scoping)
-    conversaciones = base.prefetch_related('participantes').distinct().order_by('-actualizado_en')
-    for c in conversaciones:
-        c.nombre_display = c.nombre_display(request.user)
-        c.mensajes_no_leidos = c.mensajes_no_leidos(request.user)
+    # Obtener todas las conversaciones para la sidebar (respetando el mismo scoping);
+    # la actual se toma de la bandeja para reutilizar sus anotaciones
+    conversaciones = _bandeja(request.user, base)
+    actual = next((c for c in conversaciones if c.id == conversacion.id), None)
+    if actual is not None:
+        conversacion = actual
+        # Marcar la conversación como leída hasta su último mensaje
+        _marcar_bandeja_leida(request, conversacion)
     
     # Usuarios disponibles
     usuarios_disponibles = User.objects.filter(
@@ -130,6 +183,7 @@ def chat_conversacion(request, conversacion_id):
         "conversaciones": conversaciones,
         "conversacion_actual": conversacion,
         "mensajes": mensajes,
+        "leido_hasta": _leido_hasta(conversacion, request.user),
         "usuarios_disponibles": usuarios_disponibles,
         "usuario_actual": request.user,
         "focus_id": int(focus_id) if focus_id else None,
@@ -163,7 +217,7 @@ def enviar_mensaje(request):
             )
             
             # Marcar como leído para el autor
-            MensajeLeido.objects.create(usuario=request.user, mensaje=mensaje)
+            LecturaConversacion.marcar(request.user.id, conversacion.id, mensaje.id)
             
             return JsonResponse({
                 'success': True,
@@ -227,7 +281,7 @@ def crear_conversacion(request):
                     autor=request.user,
                     contenido=primer_mensaje
                 )
-                MensajeLeido.objects.create(usuario=request.user, mensaje=mensaje)
+                LecturaConversacion.marcar(request.user.id, conversacion.id, mensaje.id)
             
             return JsonResponse({
                 'success': True,
@@ -257,16 +311,13 @@ def obtener_mensajes(request, conversacion_id):
         ultimo_mensaje_id = 0
     
     # Obtener mensajes más recientes
-    mensajes = conversacion.mensajes.filter(
+    mensajes = list(conversacion.mensajes.filter(
         id__gt=ultimo_mensaje_id
-    ).select_related('autor')[:20]
+    ).select_related('autor')[:20])
     
-    # Marcar mensajes como leídos
-    mensajes_no_leidos = mensajes.exclude(autor=request.user).filter(leido=False)
-    for mensaje in mensajes_no_leidos:
-        MensajeLeido.objects.get_or_create(usuario=request.user, mensaje=mensaje)
-        mensaje.leido = True
-        mensaje.save(update_fields=['leido'])
+    # Marcar como leído hasta el último mensaje entregado
+    if mensajes:
+        _marcar_leidos(request, conversacion, max(m.id for m in mensajes))
     
     mensajes_data = []
     for mensaje in mensajes:
@@ -353,7 +404,9 @@ def buscar_mensajes(request):
     mensajes = Mensaje.objects.filter(
         conversacion__in=convs,
         contenido__icontains=q
-    ).select_related('conversacion', 'autor').order_by('-id')[:30]
+    ).select_related('conversacion', 'autor').prefetch_related(
+        _participantes_prefetch('conversacion__participantes')
+    ).order_by('-id')[:30]
 
     resultados = []
     for m in mensajes:
@@ -373,40 +426,75 @@ def buscar_mensajes(request):
     return JsonResponse({'resultados': resultados})
 
 
-@login_required
-def unread_summary(request):
-    """API para obtener resumen de mensajes no leídos del usuario actual.
-    Devuelve el total y el detalle por conversación para poder mostrar badges/notificaciones.
-    """
-    user = request.user
+def _chat_alcance(request):
+    """Usuario y alcance de conversaciones del chat (síncrono: usa sesión y BD)."""
+    if not request.user.is_authenticated:
+        return None
     ctx = get_auth_context(request)
-    convs = Conversacion.objects.filter(participantes=user)
-    if not (ctx.get('organization_is_general') or ctx.get('is_support')):
-        convs = convs.filter(organizacion_id=ctx.get('organization_id'))
+    return {
+        'user': request.user,
+        'filtrar_org': not (ctx.get('organization_is_general') or ctx.get('is_support')),
+        'org_id': ctx.get('organization_id'),
+    }
 
-    # Mensajes no leídos donde el autor no es el usuario actual
-    qs = Mensaje.objects.filter(conversacion__in=convs, leido=False).exclude(autor=user)
 
-    total_unread = qs.count()
-    base = qs.values('conversacion_id').annotate(unread=models.Count('id'), ultimo_id=models.Max('id')).order_by('-ultimo_id')
-    por_conversacion = []
-    # Adjuntar nombres de conversación de forma segura (normalmente son pocos)
-    for item in base:
-        conv_id = item['conversacion_id']
-        try:
-            conv = Conversacion.objects.get(id=conv_id)
-            nombre = conv.nombre_display(request.user)
-        except Exception:
-            nombre = f"Conversación {conv_id}"
-        por_conversacion.append({
-            'conversacion_id': conv_id,
+def _nombre_conversacion(user, conv_id):
+    try:
+        return Conversacion.objects.prefetch_related(_participantes_prefetch()).get(id=conv_id).nombre_display(user)
+    except Exception:
+        return f"Conversación {conv_id}"
+
+
+def _resumen_no_leidos(alcance):
+    """{conversacion_id: {'unread', 'ultimo_id', 'nombre'}} de los mensajes ajenos sin leer."""
+    user = alcance['user']
+    convs = Conversacion.objects.filter(participantes=user)
+    if alcance['filtrar_org']:
+        convs = convs.filter(organizacion_id=alcance['org_id'])
+
+    # Mensajes ajenos posteriores a la marca de lectura: un rango por conversación (índice conversacion, id)
+    qs = Mensaje.objects.filter(conversacion__in=convs, id__gt=_marca_lectura(user.id)).exclude(autor=user)
+    base = qs.values('conversacion_id').annotate(unread=models.Count('id'), ultimo_id=models.Max('id'))
+    filas = list(base)
+    # Nombres de todas las conversaciones en una consulta más (participantes precargados)
+    nombres = {
+        c.id: c.nombre_display(user)
+        for c in Conversacion.objects.filter(id__in=[f['conversacion_id'] for f in filas])
+        .prefetch_related(_participantes_prefetch())
+    } if filas else {}
+    return {
+        item['conversacion_id']: {
             'unread': item['unread'],
             'ultimo_id': item['ultimo_id'],
-            'nombre': nombre,
-        })
+            'nombre': nombres.get(item['conversacion_id']) or f"Conversación {item['conversacion_id']}",
+        }
+        for item in filas
+    }
 
-    return JsonResponse({
+
+def _no_leidos_conversacion(user_id, conv_id):
+    """(no leídos, último id) de una conversación para ``user_id``."""
+    agg = Mensaje.objects.filter(
+        conversacion_id=conv_id, id__gt=_marca_lectura(user_id, conv_id)).exclude(autor_id=user_id).aggregate(
+        unread=models.Count('id'), ultimo_id=models.Max('id'))
+    return agg['unread'], agg['ultimo_id']
+
+
+def _payload_no_leidos(no_leidos):
+    por_conversacion = [
+        {'conversacion_id': cid, **datos}
+        for cid, datos in sorted(no_leidos.items(), key=lambda kv: kv[1]['ultimo_id'] or 0, reverse=True)
+    ]
+    return {
         'success': True,
-        'total_unread': total_unread,
+        'total_unread': sum(d['unread'] for d in no_leidos.values()),
         'conversaciones': por_conversacion,
-    })
\ No newline at end of file
+    }
+
+
+@login_required
+def unread_summary(request):
+    """API para obtener resumen de mensajes no leídos del usuario actual.
+    Devuelve el total y el detalle por conversación para poder mostrar badges/notificaciones.
+    """
+    return JsonResponse(_payload_no_leidos(_resumen_no_leidos(_chat_alcance(request))))
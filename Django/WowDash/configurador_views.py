@@ -11,6 +11,8 @@ from reportlab.lib import colors
 from reportlab.lib.units import mm
 import json
 from django.utils import timezone
+from core.db_router import lectura_en_replica
+from core.catalogo import catalogo_org, etag_catalogo, no_modificado, payload_cacheado
 
 
 @login_required
@@ -45,15 +47,17 @@ def materiales_json(request):
         org, err = get_user_organization(request)
     if err:
         return JsonResponse({'success': False, 'message': 'Organización inválida'}, status=400)
-    qs = Material.objects.filter(activo=True)
-    if org is not None:
-        qs = qs.filter(organizacion=org)
+    org_id = getattr(org, 'id', None)
+    etag = etag_catalogo(org_id, 'materiales_json')
+    no_mod = no_modificado(request, etag)
+    if no_mod is not None:
+        return no_mod
     # Colores sugeridos por tipo
     tipo_color = {
         'melamina': '#d7ccc8', 'mdf': '#bdbdbd', 'osb': '#ffecb3',
         'terciado': '#ffe0b2', 'aglomerado': '#c8e6c9', 'otro': '#e0e0e0'
     }
-    data = [
+    data = payload_cacheado('materiales_json', org_id, lambda: [
         {
             'id': m.id,
             'codigo': m.codigo,
@@ -64,9 +68,12 @@ def materiales_json(request):
             'largo': m.largo,
             'color': tipo_color.get(m.tipo, '#e0e0e0'),
         }
-        for m in qs.order_by('nombre')
-    ]
-    return JsonResponse({'success': True, 'materiales': data})
+        for m in catalogo_org('material', org_id) if m.activo
+    ])
+    resp = JsonResponse({'success': True, 'materiales': data})
+    resp['ETag'] = etag
+    resp['Cache-Control'] = 'private, no-cache'
+    return resp
 
 
 @login_required
@@ -79,10 +86,12 @@ def tapacantos_json(request):
         org, err = get_user_organization(request)
     if err:
         return JsonResponse({'success': False, 'message': 'Organización inválida'}, status=400)
-    qs = Tapacanto.objects.filter(activo=True)
-    if org is not None:
-        qs = qs.filter(organizacion=org)
-    data = [
+    org_id = getattr(org, 'id', None)
+    etag = etag_catalogo(org_id, 'tapacantos_json')
+    no_mod = no_modificado(request, etag)
+    if no_mod is not None:
+        return no_mod
+    data = payload_cacheado('tapacantos_json', org_id, lambda: [
         {
             'id': t.id,
             'codigo': t.codigo,
@@ -92,12 +101,16 @@ def tapacantos_json(request):
             'espesor': float(t.espesor),
             'precio_metro': float(t.precio_metro),
         }
-        for t in qs.order_by('nombre')
-    ]
-    return JsonResponse({'success': True, 'tapacantos': data})
+        for t in catalogo_org('tapacanto', org_id) if t.activo
+    ])
+    resp = JsonResponse({'success': True, 'tapacantos': data})
+    resp['ETag'] = etag
+    resp['Cache-Control'] = 'private, no-cache'
+    return resp
 
 
 @login_required
+@lectura_en_replica
 def configurador_pdf(request, proyecto_id: int):
     """Genera un PDF simple del proyecto del configurador 3D usando la lista de cortes en `proyecto.configuracion`."""
     proyecto = get_object_or_404(Proyecto, pk=proyecto_id)
@@ -5,9 +5,11 @@ from django.http import JsonResponse
 from django.db.models import Q, Count
 from django.db.models.functions import TruncMonth, TruncWeek
 from core.models import Cliente, Proyecto, Organizacion, NotificacionOperador, NotificacionEnchapador
+from core.notificaciones import notificar_operador
 from core.auth_utils import get_auth_context, can_approve_projects, can_delete_projects
 from core.models import UsuarioPerfilOptimizador
 from core.forms import ClienteForm, ProyectoForm
+from core.db_router import lectura_en_replica
 
 @login_required
 def organizacion_detalle(request, organizacion_id):
@@ -356,6 +358,7 @@ def buscar_cliente_por_rut(request):
 
 
 @login_required
+@lectura_en_replica
 def proyectos_list(request):
     """Lista de proyectos (página principal de proyectos)"""
     ctx = get_auth_context(request)
@@ -608,7 +611,7 @@ def asignar_operador(request):
 
         # Si se asignó un operador y el estado es 'optimizado' (listo para producción),
         # avanzarlo automáticamente a 'asignado' para que aparezca en la lista del operador.
-        fields_to_save = ['operador']
+        fields_to_save = ['operador', 'fecha_modificacion']
         ESTADOS_ASIGNABLES = ('optimizado', 'aprobado', 'produccion')
         if operador_obj and proyecto.estado in ESTADOS_ASIGNABLES:
             proyecto.estado = 'asignado'
@@ -616,13 +619,9 @@ def asignar_operador(request):
 
         proyecto.save(update_fields=fields_to_save)
 
-        # Crear notificación persistente en BD para el operador
+        # Crear notificación persistente en BD para el operador (y avisarle por su stream)
         if operador_obj:
-            NotificacionOperador.objects.create(
-                destinatario=operador_obj,
-                proyecto_nombre=proyecto.nombre or '',
-                proyecto_id=proyecto.id,
-            )
+            notificar_operador(proyecto, operador_obj.id)
 
         return JsonResponse({
             'success': True,
@@ -916,6 +915,7 @@ def visor_publico(request):
     return render(request, 'visor/visor.html')
 
 
+@lectura_en_replica
 def visor_api(request):
     """API JSON pública: devuelve datos de un proyecto por su public_id."""
     proyecto_id = request.GET.get('id', '').strip()
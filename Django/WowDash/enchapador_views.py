@@ -14,7 +14,8 @@ from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
 from core.auth_utils import get_auth_context
-from core.models import AuditLog, Proyecto
+from core.models import Proyecto
+from core.audit import registrar_auditoria
 
 
 def _require_enchapador_or_admin(ctx):
@@ -164,10 +165,10 @@ def enchapador_completar_api(request: HttpRequest, proyecto_id: int):
     p = get_object_or_404(base_qs, id=proyecto_id)
 
     p.estado = 'completado'
-    p.save(update_fields=['estado'])
+    p.save(update_fields=['estado', 'fecha_modificacion'])
 
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=request.user,
             organizacion=p.organizacion,
             verb='UPDATE',
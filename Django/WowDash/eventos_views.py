@@ -0,0 +1,167 @@
+"""Stream unificado de eventos del usuario (SSE).
+
+Una sola conexión por pestaña entrega:
+
+- ``notificaciones``: notificaciones de operador (proyecto asignado) y de enchapador
+  (proyecto listo para enchapado), con ``id`` = cursor de lectura ``"<op>.<ench>"``;
+  al reconectar (Last-Event-ID) se reenvían las posteriores al cursor.
+- ``mensaje`` y ``no_leidos``: mensajes nuevos del chat y resumen de no leídos
+  (mismo formato que chat_unread_summary, más ``delta`` del total).
+
+Reemplaza el polling de /api/operador/notificaciones/, /api/enchapador/notificaciones/,
+/chat/unread-summary/ y obtener_mensajes.
+"""
+import json
+
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+
+from core.eventos import liberar_conexion
+from core.notificaciones import formatear_cursor, parsear_cursor, pendientes
+
+from WowDash.chat_views import (
+    _chat_alcance,
+    _no_leidos_conversacion,
+    _nombre_conversacion,
+    _payload_no_leidos,
+    _resumen_no_leidos,
+)
+
+SSE_HEARTBEAT = 25         # segundos entre keep-alive
+SSE_DURACION_MAX = 300     # cerrar y dejar que el cliente reconecte
+SSE_RETRY_WSGI_MS = 5000   # sin ASGI: el cliente reconecta (y recibe lo pendiente) cada 5 s
+
+
+def _sse(evento, datos, id_evento=None):
+    cabecera = f'id: {id_evento}\n' if id_evento else ''
+    return f'{cabecera}event: {evento}\ndata: {json.dumps(datos)}\n\n'
+
+
+def _evento_notificaciones(user_id, cursor):
+    """(evento SSE o None, cursor nuevo) con las notificaciones pendientes."""
+    datos, cursor = pendientes(user_id, cursor)
+    if not any(datos.values()):
+        return None, cursor
+    return _sse('notificaciones', datos, formatear_cursor(cursor)), cursor
+
+
+@liberar_conexion
+def _estado_inicial(alcance, previa):
+    """Lo que se envía al conectar: notificaciones pendientes y resumen de chat."""
+    user_id = alcance['user'].id
+    evento, cursor = _evento_notificaciones(user_id, parsear_cursor(previa))
+    no_leidos = _resumen_no_leidos(alcance)
+    return evento, cursor, no_leidos
+
+
+async def eventos_usuario(request: HttpRequest):
+    """SSE /api/eventos (también /chat/eventos/)
+
+    Bajo ASGI la conexión espera eventos de core.eventos en los canales del usuario
+    (notificaciones y chat) sin consultar la BD mientras no pase nada; cada evento cuesta
+    a lo sumo una consulta acotada y la conexión se cierra después (``liberar_conexion``),
+    así que una pestaña abierta no retiene una conexión a la BD. Si un mensaje es muy largo el evento trae solo
+    ``mensaje_id`` y el cliente lo pide a obtener_mensajes. Bajo WSGI se responde lo
+    pendiente y se cierra, con ``retry`` corto (equivale al polling anterior).
+    """
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from core.eventos import canal_chat, canal_notificaciones, suscribir
+
+    alcance = await sync_to_async(liberar_conexion(_chat_alcance))(request)
+    if alcance is None:
+        return HttpResponse(status=401)
+    user_id = alcance['user'].id
+    previa = request.headers.get('Last-Event-ID')
+
+    if not isinstance(request, ASGIRequest):
+        evento, cursor, no_leidos = await sync_to_async(_estado_inicial)(alcance, previa)
+        cuerpo = [f'retry: {SSE_RETRY_WSGI_MS}\n\n']
+        if evento:
+            cuerpo.append(evento)
+        else:
+            # Fijar el cursor aunque no haya notificaciones: la próxima conexión parte de aquí
+            cuerpo.append(f'id: {formatear_cursor(cursor)}\n\n')
+        cuerpo.append(_sse('no_leidos', dict(_payload_no_leidos(no_leidos), delta=0)))
+        resp = StreamingHttpResponse(iter(cuerpo), content_type='text/event-stream')
+    else:
+        async def _aplicar_chat(evento, no_leidos, salida):
+            """Aplica un evento de chat; deja en ``salida`` los eventos 'mensaje'. True si cambió no_leidos."""
+            if alcance['filtrar_org'] and evento.get('organizacion_id') != alcance['org_id']:
+                return False
+            cid = evento.get('conversacion_id')
+            if evento.get('tipo') == 'mensaje':
+                mensaje = evento.get('mensaje')
+                autor_id = mensaje['autor_id'] if mensaje else evento.get('autor_id')
+                mensaje_id = mensaje['id'] if mensaje else evento.get('mensaje_id')
+                salida.append(_sse('mensaje', {
+                    'conversacion_id': cid,
+                    'mensaje': dict(mensaje, es_mio=autor_id == user_id) if mensaje else None,
+                    'mensaje_id': mensaje_id,
+                }))
+                if autor_id == user_id:
+                    return False
+                entrada = no_leidos.get(cid)
+                if entrada is None:
+                    nombre = await sync_to_async(liberar_conexion(_nombre_conversacion))(alcance['user'], cid)
+                    entrada = no_leidos[cid] = {'unread': 0, 'ultimo_id': None, 'nombre': nombre}
+                entrada['unread'] += 1
+                entrada['ultimo_id'] = max(entrada['ultimo_id'] or 0, mensaje_id or 0)
+                return True
+            if evento.get('tipo') == 'leido':
+                # Leído desde otra pestaña del usuario: recalcular solo esta conversación
+                unread, ultimo_id = await sync_to_async(liberar_conexion(_no_leidos_conversacion))(user_id, cid)
+                previo = no_leidos.get(cid)
+                if not unread:
+                    return no_leidos.pop(cid, None) is not None
+                if previo is not None and previo['unread'] == unread:
+                    return False
+                nombre = previo['nombre'] if previo else await sync_to_async(liberar_conexion(_nombre_conversacion))(alcance['user'], cid)
+                no_leidos[cid] = {'unread': unread, 'ultimo_id': ultimo_id, 'nombre': nombre}
+                return True
+            return False
+
+        async def _event_stream():
+            loop = asyncio.get_running_loop()
+            canales = [canal_notificaciones(user_id), canal_chat(user_id)]
+            async with suscribir(canales) as cola:
+                # Suscribirse antes del estado inicial: no se pierde nada de lo que pase entretanto
+                evento, cursor, no_leidos = await sync_to_async(_estado_inicial)(alcance, previa)
+                total = sum(d['unread'] for d in no_leidos.values())
+                yield 'retry: 3000\n\n'
+                yield evento or f'id: {formatear_cursor(cursor)}\n\n'
+                yield _sse('no_leidos', dict(_payload_no_leidos(no_leidos), delta=0))
+                fin = loop.time() + SSE_DURACION_MAX
+                while loop.time() < fin:
+                    try:
+                        lote = [await asyncio.wait_for(cola.get(), timeout=SSE_HEARTBEAT)]
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+                        continue
+                    # Juntar la ráfaga pendiente: los mensajes van uno a uno, el resto una vez
+                    while not cola.empty():
+                        lote.append(cola.get_nowait())
+                    salida, cambio_chat, hay_notificaciones = [], False, False
+                    for canal, datos in lote:
+                        if canal == canales[0]:
+                            hay_notificaciones = True
+                        else:
+                            cambio_chat = await _aplicar_chat(datos, no_leidos, salida) or cambio_chat
+                    if hay_notificaciones:
+                        evento, cursor = await sync_to_async(liberar_conexion(_evento_notificaciones))(user_id, cursor)
+                        if evento:
+                            yield evento
+                    for linea in salida:
+                        yield linea
+                    if cambio_chat:
+                        payload = _payload_no_leidos(no_leidos)
+                        payload['delta'] = payload['total_unread'] - total
+                        total = payload['total_unread']
+                        yield _sse('no_leidos', payload)
+        resp = StreamingHttpResponse(_event_stream(), content_type='text/event-stream')
+
+    resp['Cache-Control'] = 'no-cache'
+    resp['X-Accel-Buffering'] = 'no'   # Nginx: deshabilitar buffering
+    # GZipMiddleware no comprime respuestas con Content-Encoding: el compresor retendría los eventos
+    resp['Content-Encoding'] = 'identity'
+    return resp
@@ -6,9 +6,12 @@ from django.views.decorators.http import require_POST
 import csv
 import io
 import os
+from django.db import transaction
 from django.db.models import Q
 from django.template.loader import render_to_string
 from core.models import Material, Tapacanto, UsuarioPerfilOptimizador
+from core.audit import auditoria_agrupada
+from core.catalogo import catalogo_org, etag_catalogo, invalidar_catalogo, no_modificado
 from core.forms import MaterialForm, TapacantoForm
 from core.auth_utils import get_auth_context, is_support, is_org_admin, is_agent, is_subordinador
 from django.conf import settings
@@ -397,22 +400,28 @@ def tableros_search_ajax(request):
     if error_response:
         return JsonResponse({'error': 'Error de organización'})
     
-    # Query base - Super Admins ven todos los materiales, otros solo de su organización
-    if organizacion_usuario is None:  # Super Admin
-        materiales = Material.objects.filter(activo=True)
-    else:  # Usuarios con organización específica
-        materiales = Material.objects.filter(activo=True, organizacion=organizacion_usuario)
-    
-    # Aplicar filtros
+    # Catálogo cacheado por organización (Super Admins ven todos los materiales)
+    org_id = getattr(organizacion_usuario, 'id', None)
+    # El HTML depende del rol/usuario además del catálogo: que el ETag no se comparta entre ellos
+    rol = getattr(getattr(request.user, 'usuarioperfiloptimizador', None), 'rol', '')
+    etag = etag_catalogo(org_id, 'tableros_search', rol, request.user.pk, search, tipo_filter)
+    no_mod = no_modificado(request, etag)
+    if no_mod is not None:
+        return no_mod
+    materiales = [m for m in catalogo_org('material', org_id) if m.activo]
+    
+    # Aplicar filtros (mismo criterio que icontains sobre codigo/nombre/proveedor)
     if search:
-        materiales = materiales.filter(
-            Q(codigo__icontains=search) | 
-            Q(nombre__icontains=search) |
-            Q(proveedor__icontains=search)
-        )
+        termino = search.casefold()
+        materiales = [
+            m for m in materiales
+            if termino in (m.codigo or '').casefold()
+            or termino in (m.nombre or '').casefold()
+            or termino in (m.proveedor or '').casefold()
+        ]
     
     if tipo_filter:
-        materiales = materiales.filter(tipo=tipo_filter)
+        materiales = [m for m in materiales if m.tipo == tipo_filter]
     
     # Obtener tipos únicos para el filtro
     tipos_materiales = Material.TIPOS_MATERIAL
@@ -425,10 +434,13 @@ def tableros_search_ajax(request):
         'tipo_filter': tipo_filter
     })
     
-    return JsonResponse({
+    resp = JsonResponse({
         'html': html,
-        'count': materiales.count()
+        'count': len(materiales)
     })
+    resp['ETag'] = etag
+    resp['Cache-Control'] = 'private, no-cache'
+    return resp
 
 @login_required
 def tapacantos_search_ajax(request):
@@ -487,6 +499,128 @@ def descargar_plantilla_tapacantos(request):
     response["Content-Disposition"] = 'attachment; filename="plantilla_tapacantos.csv"'
     return response
 
+# Filas por lote en las importaciones CSV (una consulta de existentes + un INSERT ... ON CONFLICT por lote)
+IMPORTACION_LOTE = 1000
+
+
+def _leer_csv_subido(request):
+    """DictReader sobre el CSV del body, detectando delimitador (",", ";" o tabulador)."""
+    payload = request.body.decode('utf-8', errors='ignore')
+    sample = payload[:1024]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=[',',';','\t'])
+        delimiter = dialect.delimiter
+    except Exception:
+        delimiter = ','
+    return csv.DictReader(io.StringIO(payload), delimiter=delimiter)
+
+
+def _upsert_lote(modelo, org_target, lote, campos, grupo, errores):
+    """Aplica un lote de filas validadas [(linea, codigo, defaults)] con un solo
+    ``bulk_create(update_conflicts=True)`` sobre (codigo, organizacion).
+    Devuelve (creados, actualizados).
+    """
+    # Un mismo código repetido en el lote: gana la última fila (igual que update_or_create en secuencia)
+    ultimas = {}
+    for linea, codigo, defaults in lote:
+        ultimas[codigo] = (linea, defaults)
+    existentes = set(
+        modelo.objects.filter(organizacion=org_target, codigo__in=list(ultimas)).values_list('codigo', flat=True)
+    )
+    nuevos = [c for c in ultimas if c not in existentes]
+    creados = len(nuevos)
+    actualizados = len(lote) - creados
+    objs = [modelo(codigo=codigo, organizacion=org_target, **defaults) for codigo, (_, defaults) in ultimas.items()]
+    try:
+        with transaction.atomic():
+            modelo.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=['codigo', 'organizacion'],
+                update_fields=campos,
+            )
+    except Exception:
+        # El lote falló completo (p.ej. una restricción de BD): reintentar fila a fila para
+        # reportar exactamente qué líneas fallan; las señales caen en la auditoría agrupada
+        creados = actualizados = 0
+        for linea, codigo, defaults in lote:
+            try:
+                with transaction.atomic():
+                    _, created = modelo.objects.update_or_create(codigo=codigo, organizacion=org_target, defaults=defaults)
+                if created: creados += 1
+                else: actualizados += 1
+            except Exception as e:
+                errores.append(f'Línea {linea}: {e}')
+        return creados, actualizados
+    # bulk_create no dispara señales: invalidar el catálogo cacheado a mano
+    invalidar_catalogo(getattr(org_target, 'id', None))
+    # En la auditoría agrupada se identifican por código (bulk_create no devuelve pk en upserts)
+    nombre = modelo.__name__
+    grupo.sumar('CREATE', nombre, creados, nuevos)
+    grupo.sumar('UPDATE', nombre, actualizados, [c for c in ultimas if c in existentes])
+    return creados, actualizados
+
+
+def _importar_catalogo(modelo, org_target, reader, parsear_fila, campos, grupo):
+    """Recorre el CSV validando fila a fila y aplicando los cambios por lotes."""
+    creados = 0; actualizados = 0; errores = []
+    lote = []
+    for i, row in enumerate(reader, start=2):
+        try:
+            codigo, defaults = parsear_fila(i, row)
+            if not codigo:
+                raise ValueError('codigo es requerido')
+            lote.append((i, codigo, defaults))
+        except Exception as e:
+            errores.append(f'Línea {i}: {e}')
+        if len(lote) >= IMPORTACION_LOTE:
+            c, a = _upsert_lote(modelo, org_target, lote, campos, grupo, errores)
+            creados += c; actualizados += a
+            lote = []
+    if lote:
+        c, a = _upsert_lote(modelo, org_target, lote, campos, grupo, errores)
+        creados += c; actualizados += a
+    return creados, actualizados, errores
+
+
+def _parsear_fila_tablero(i, row):
+    codigo = row.get('codigo') or row.get('CODIGO')
+    nombre = row.get('nombre') or row.get('NOMBRE')
+    tipo = (row.get('tipo') or '').lower()
+    espesor = float(row.get('espesor_mm') or row.get('espesor') or 0)
+    a = float((row.get('ancho_mm') or row.get('ancho') or 0) or 0)
+    b = float((row.get('largo_mm') or row.get('largo') or 0) or 0)
+    mayor, menor = (max(a,b), min(a,b))
+    if menor <= 0:
+        raise ValueError('Medidas inválidas')
+    if mayor != a:
+        raise ValueError(f'El ancho debe ser la medida mayor (línea {i})')
+    precio_m2 = row.get('precio_m2')
+    precio_tablero = row.get('precio_tablero')
+    if precio_m2:
+        precio_m2 = float(precio_m2)
+    elif precio_tablero:
+        area = (mayor*menor)/1_000_000
+        precio_m2 = (float(precio_tablero)/area) if area>0 else 0
+    else:
+        precio_m2 = 0
+    stock = int(row.get('stock') or 0)
+    defaults = dict(nombre=nombre, tipo=tipo, espesor=espesor, ancho=mayor, largo=menor, precio_m2=precio_m2, stock=stock, activo=True)
+    return codigo, defaults
+
+
+def _parsear_fila_tapacanto(i, row):
+    codigo = row.get('codigo')
+    nombre = row.get('nombre')
+    color = row.get('color')
+    ancho = float(row.get('ancho_mm') or row.get('ancho') or 0)
+    espesor = float(row.get('espesor_mm') or row.get('espesor') or 0)
+    valor = float(row.get('valor_por_metro') or row.get('precio_metro') or 0)
+    stock_metros = float(row.get('stock_metros') or 0)
+    defaults = dict(nombre=nombre, color=color, ancho=ancho, espesor=espesor, precio_metro=valor, stock_metros=stock_metros, activo=True)
+    return codigo, defaults
+
+
 @login_required
 @require_POST
 def importar_tableros_csv(request):
@@ -510,55 +644,23 @@ def importar_tableros_csv(request):
         if mode not in ('append', 'replace'):
             mode = 'append'
 
-        payload = request.body.decode('utf-8', errors='ignore')
-        # Detectar delimitador automáticamente para soportar "," y ";"
-        sample = payload[:1024]
-        try:
-            dialect = csv.Sniffer().sniff(sample, delimiters=[',',';','\t'])
-            delimiter = dialect.delimiter
-        except Exception:
-            delimiter = ','
-        f = io.StringIO(payload)
-        reader = csv.DictReader(f, delimiter=delimiter)
+        reader = _leer_csv_subido(request)
         fieldnames = [c.lower() for c in (reader.fieldnames or [])]
         # Aceptar alias: espesor/espesor_mm, ancho/ancho_mm, largo/largo_mm
         def has_any(*names):
             return any(n in fieldnames for n in names)
         if not (has_any('codigo') and has_any('nombre') and has_any('tipo') and has_any('espesor_mm','espesor') and has_any('ancho_mm','ancho') and has_any('largo_mm','largo')):
             return JsonResponse({'success': False, 'message': 'Columnas requeridas faltantes'}, status=400)
-        # Si es reemplazo, desactivar todos los materiales actuales del org
-        if mode == 'replace':
-            Material.objects.filter(organizacion=org_target, activo=True).update(activo=False)
-        creados = 0; actualizados = 0; errores = []
-        for i, row in enumerate(reader, start=2):
-            try:
-                codigo = row.get('codigo') or row.get('CODIGO')
-                nombre = row.get('nombre') or row.get('NOMBRE')
-                tipo = (row.get('tipo') or '').lower()
-                espesor = float(row.get('espesor_mm') or row.get('espesor') or 0)
-                a = float((row.get('ancho_mm') or row.get('ancho') or 0) or 0)
-                b = float((row.get('largo_mm') or row.get('largo') or 0) or 0)
-                mayor, menor = (max(a,b), min(a,b))
-                if menor <= 0:
-                    raise ValueError('Medidas inválidas')
-                if mayor != a:
-                    raise ValueError(f'El ancho debe ser la medida mayor (línea {i})')
-                precio_m2 = row.get('precio_m2')
-                precio_tablero = row.get('precio_tablero')
-                if precio_m2:
-                    precio_m2 = float(precio_m2)
-                elif precio_tablero:
-                    area = (mayor*menor)/1_000_000
-                    precio_m2 = (float(precio_tablero)/area) if area>0 else 0
-                else:
-                    precio_m2 = 0
-                stock = int(row.get('stock') or 0)
-                defaults = dict(nombre=nombre, tipo=tipo, espesor=espesor, ancho=mayor, largo=menor, precio_m2=precio_m2, stock=stock, activo=True)
-                mat, created = Material.objects.update_or_create(codigo=codigo, organizacion=org_target, defaults=defaults)
-                if created: creados += 1
-                else: actualizados += 1
-            except Exception as e:
-                errores.append(f'Línea {i}: {e}')
+        # Una sola entrada de auditoría para toda la importación
+        with auditoria_agrupada(f'Importación CSV de tableros ({mode})', actor=request.user, organizacion=org_target) as grupo:
+            # Si es reemplazo, desactivar todos los materiales actuales del org
+            if mode == 'replace':
+                grupo.datos['desactivados'] = Material.objects.filter(organizacion=org_target, activo=True).update(activo=False)
+                invalidar_catalogo(getattr(org_target, 'id', None))
+            creados, actualizados, errores = _importar_catalogo(
+                Material, org_target, reader, _parsear_fila_tablero,
+                ['nombre', 'tipo', 'espesor', 'ancho', 'largo', 'precio_m2', 'stock', 'activo'], grupo,
+            )
         return JsonResponse({'success': len(errores)==0, 'creados': creados, 'actualizados': actualizados, 'errores': errores, 'mode': mode})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
@@ -583,39 +685,22 @@ def importar_tapacantos_csv(request):
         if mode not in ('append', 'replace'):
             mode = 'append'
 
-        payload = request.body.decode('utf-8', errors='ignore')
-        sample = payload[:1024]
-        try:
-            dialect = csv.Sniffer().sniff(sample, delimiters=[',',';','\t'])
-            delimiter = dialect.delimiter
-        except Exception:
-            delimiter = ','
-        f = io.StringIO(payload)
-        reader = csv.DictReader(f, delimiter=delimiter)
+        reader = _leer_csv_subido(request)
         fieldnames = [c.lower() for c in (reader.fieldnames or [])]
         def has_any(*names):
             return any(n in fieldnames for n in names)
         if not (has_any('codigo') and has_any('nombre') and has_any('color') and has_any('ancho_mm','ancho') and has_any('espesor_mm','espesor') and has_any('valor_por_metro','precio_metro')):
             return JsonResponse({'success': False, 'message': 'Columnas requeridas faltantes'}, status=400)
-        # Si es replace, desactivar los existentes del org
-        if mode == 'replace':
-            Tapacanto.objects.filter(organizacion=org_target, activo=True).update(activo=False)
-        creados = 0; actualizados = 0; errores = []
-        for i, row in enumerate(reader, start=2):
-            try:
-                codigo = row.get('codigo')
-                nombre = row.get('nombre')
-                color = row.get('color')
-                ancho = float(row.get('ancho_mm') or row.get('ancho') or 0)
-                espesor = float(row.get('espesor_mm') or row.get('espesor') or 0)
-                valor = float(row.get('valor_por_metro') or row.get('precio_metro') or 0)
-                stock_metros = float(row.get('stock_metros') or 0)
-                defaults = dict(nombre=nombre, color=color, ancho=ancho, espesor=espesor, precio_metro=valor, stock_metros=stock_metros, activo=True)
-                tap, created = Tapacanto.objects.update_or_create(codigo=codigo, organizacion=org_target, defaults=defaults)
-                if created: creados += 1
-                else: actualizados += 1
-            except Exception as e:
-                errores.append(f'Línea {i}: {e}')
+        # Una sola entrada de auditoría para toda la importación
+        with auditoria_agrupada(f'Importación CSV de tapacantos ({mode})', actor=request.user, organizacion=org_target) as grupo:
+            # Si es replace, desactivar los existentes del org
+            if mode == 'replace':
+                grupo.datos['desactivados'] = Tapacanto.objects.filter(organizacion=org_target, activo=True).update(activo=False)
+                invalidar_catalogo(getattr(org_target, 'id', None))
+            creados, actualizados, errores = _importar_catalogo(
+                Tapacanto, org_target, reader, _parsear_fila_tapacanto,
+                ['nombre', 'color', 'ancho', 'espesor', 'precio_metro', 'stock_metros', 'activo'], grupo,
+            )
         return JsonResponse({'success': len(errores)==0, 'creados': creados, 'actualizados': actualizados, 'errores': errores, 'mode': mode})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
@@ -2,6 +2,8 @@ from django.shortcuts import redirect
 from django.conf import settings
 from django.urls import resolve
 
+from core.auth_utils import get_perfil_usuario
+
 
 PUBLIC_PATH_PREFIXES = (
     '/authentication/signin/',
@@ -67,7 +69,7 @@ class RequireLoginMiddleware:
 
         # Restricción de rutas por rol
         try:
-            perfil = user.usuarioperfiloptimizador
+            perfil = get_perfil_usuario(user)
             if perfil.rol == 'operador':
                 allowed = any(path.startswith(p or '') for p in OPERADOR_ALLOWED_PREFIXES if p)
                 if not allowed:
@@ -2,10 +2,11 @@ import json as _json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http import JsonResponse, HttpRequest, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
 from django.db.models import Q
 from core.models import Proyecto
 from core.auth_utils import get_auth_context
+from core.eventos import liberar_conexion
 
 
 def _require_operator_or_admin(ctx):
@@ -166,7 +167,7 @@ def operador_corte_guiado(request: HttpRequest, proyecto_id: int):
     ESTADOS_PRE_INICIO = ('aprobado', 'produccion', 'optimizado')
     if proyecto.estado in ESTADOS_PRE_INICIO:
         proyecto.estado = 'asignado'
-        proyecto.save(update_fields=['estado'])
+        proyecto.save(update_fields=['estado', 'fecha_modificacion'])
 
     context = {
         'title': f'Corte Guiado - {proyecto.codigo}',
@@ -177,56 +178,124 @@ def operador_corte_guiado(request: HttpRequest, proyecto_id: int):
     return render(request, 'operador/corte_guiado.html', context)
 
 
-@login_required
-def operador_proyectos_sse(request: HttpRequest):
+ESTADOS_HISTORIAL_SSE = ('completado', 'pendiente_enchapado', 'cancelado')
+SSE_HEARTBEAT = 25         # segundos entre keep-alive
+SSE_DURACION_MAX = 300     # cerrar y dejar que el cliente reconecte (libera conexiones huérfanas)
+SSE_RETRY_WSGI_MS = 15000  # sin ASGI: el cliente reconecta cada 15 s en lugar de retener un worker
+
+
+@liberar_conexion
+def _sse_alcance(request):
+    """Usuario y alcance del listado del operador (síncrono: usa sesión y BD)."""
+    if not request.user.is_authenticated:
+        return None
+    ctx = get_auth_context(request)
+    general = ctx.get('organization_is_general') or ctx.get('is_support')
+    return {
+        'user_id': request.user.id,
+        'org_id': None if general else ctx.get('organization_id'),
+        'solo_asignados': ctx.get('role') == 'operador',
+    }
+
+
+@liberar_conexion
+def _sse_visibles(alcance):
+    """{id: estado} de los proyectos activos visibles para el alcance."""
+    qs = Proyecto.objects.exclude(estado__in=ESTADOS_HISTORIAL_SSE)
+    if alcance['org_id'] is not None:
+        qs = qs.filter(organizacion_id=alcance['org_id'])
+    if alcance['solo_asignados']:
+        qs = qs.filter(operador_id=alcance['user_id'])
+    return dict(qs.values_list('id', 'estado'))
+
+
+def _sse_aplicar(alcance, visibles, evento) -> bool:
+    """Aplica un evento de core.eventos al conjunto visible; True si el proyecto es nuevo
+    o cambió de estado dentro del conjunto."""
+    pid = evento.get('id')
+    visible = not evento.get('eliminado') and evento.get('estado') not in ESTADOS_HISTORIAL_SSE
+    if alcance['org_id'] is not None and evento.get('organizacion_id') != alcance['org_id']:
+        visible = False
+    if alcance['solo_asignados'] and evento.get('operador_id') != alcance['user_id']:
+        visible = False
+    if not visible:
+        visibles.pop(pid, None)
+        return False
+    nuevo = visibles.get(pid) != evento.get('estado')
+    visibles[pid] = evento.get('estado')
+    return nuevo
+
+
+def _sse_firma(visibles) -> str:
+    import hashlib
+    return hashlib.md5(_json.dumps(sorted(visibles.items())).encode('utf-8')).hexdigest()[:16]
+
+
+def _sse_evento_cambio(visibles, nuevos) -> str:
+    payload = _json.dumps({'total': len(visibles), 'nuevos': nuevos})
+    return f'id: {_sse_firma(visibles)}\nevent: cambio\ndata: {payload}\n\n'
+
+
+async def operador_proyectos_sse(request: HttpRequest):
     """SSE /operador/proyectos/eventos/
     Emite un evento 'cambio' cada vez que el conjunto de proyectos activos
     del operador cambia (nuevo proyecto, cambio de estado, etc.).
     El cliente reconecta automáticamente si se cae la conexión.
+
+    Bajo ASGI la conexión queda abierta sin ocupar un hilo: los cambios llegan desde las
+    señales de Proyecto vía core.eventos y se aplican sobre el conjunto en memoria, así que
+    una conexión inactiva no hace consultas ni retiene una conexión a la BD. Cada evento lleva como ``id`` una firma del
+    conjunto; al reconectar (Last-Event-ID) se emite 'cambio' si hubo cambios entretanto.
+    Bajo WSGI se responde el estado actual y se cierra, con ``retry`` largo.
     """
-    import time
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from core.eventos import canal_proyectos, suscribir
+
+    alcance = await sync_to_async(_sse_alcance)(request)
+    if alcance is None:
+        return HttpResponse(status=401)
+    previa = request.headers.get('Last-Event-ID')
+
+    def _inicio(visibles):
+        firma = _sse_firma(visibles)
+        if previa and previa != firma:
+            return _sse_evento_cambio(visibles, 0)
+        return f'id: {firma}\n\n'
+
+    if not isinstance(request, ASGIRequest):
+        visibles = await sync_to_async(_sse_visibles)(alcance)
+        cuerpo = [f'retry: {SSE_RETRY_WSGI_MS}\n\n', _inicio(visibles)]
+        resp = StreamingHttpResponse(iter(cuerpo), content_type='text/event-stream')
+    else:
+        async def _event_stream():
+            loop = asyncio.get_running_loop()
+            async with suscribir([canal_proyectos(alcance['org_id'])]) as cola:
+                # Suscribirse antes de leer el estado inicial: no se pierde ningún cambio intermedio
+                visibles = await sync_to_async(_sse_visibles)(alcance)
+                yield 'retry: 5000\n\n'   # reconectar tras 5 s si se corta
+                yield _inicio(visibles)
+                fin = loop.time() + SSE_DURACION_MAX
+                while loop.time() < fin:
+                    try:
+                        _, evento = await asyncio.wait_for(cola.get(), timeout=SSE_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        # Heartbeat para mantener la conexión viva
+                        yield ': keep-alive\n\n'
+                        continue
+                    antes = dict(visibles)
+                    nuevos = int(_sse_aplicar(alcance, visibles, evento))
+                    # Juntar la ráfaga pendiente en un solo evento
+                    while not cola.empty():
+                        _, evento = cola.get_nowait()
+                        nuevos += int(_sse_aplicar(alcance, visibles, evento))
+                    if visibles != antes:
+                        yield _sse_evento_cambio(visibles, nuevos)
+        resp = StreamingHttpResponse(_event_stream(), content_type='text/event-stream')
 
-    ctx = get_auth_context(request)
-    ESTADOS_HISTORIAL = ('completado', 'pendiente_enchapado', 'cancelado')
-
-    def _get_firma():
-        """Devuelve una firma liviana del estado actual: lista de (id, estado)."""
-        qs = Proyecto.objects.only('id', 'estado', 'nombre')
-        if not (ctx.get('organization_is_general') or ctx.get('is_support')):
-            qs = qs.filter(organizacion_id=ctx.get('organization_id'))
-        if ctx.get('role') == 'operador':
-            qs = qs.filter(operador=request.user)
-        qs = qs.exclude(estado__in=ESTADOS_HISTORIAL)
-        return frozenset((p.id, p.estado) for p in qs)
-
-    def _event_stream():
-        # Inicializar con el estado actual para NO disparar un cambio falso al conectar
-        firma_anterior = _get_firma()
-        INTERVALO = 8   # segundos entre chequeos
-        HEARTBEAT  = 25 # segundos entre keep-alive
-        ultimo_hb  = time.time()
-        yield 'retry: 5000\n\n'   # reconectar tras 5 s si se corta
-        while True:
-            try:
-                firma = _get_firma()
-                if firma != firma_anterior:
-                    # Proyectos añadidos al conjunto visible del operador
-                    nuevos = firma - firma_anterior
-                    payload = _json.dumps({
-                        'total': len(firma),
-                        'nuevos': len(nuevos),
-                    })
-                    yield f'event: cambio\ndata: {payload}\n\n'
-                    firma_anterior = firma
-                # Heartbeat para mantener la conexión viva
-                if time.time() - ultimo_hb >= HEARTBEAT:
-                    yield ': keep-alive\n\n'
-                    ultimo_hb = time.time()
-            except Exception:
-                pass
-            time.sleep(INTERVALO)
-
-    resp = StreamingHttpResponse(_event_stream(), content_type='text/event-stream')
     resp['Cache-Control'] = 'no-cache'
     resp['X-Accel-Buffering'] = 'no'   # Nginx: deshabilitar buffering
+    # GZipMiddleware no comprime respuestas con Content-Encoding: el compresor retendría los eventos
+    resp['Content-Encoding'] = 'identity'
     return resp
@@ -10,6 +10,7 @@ from django.utils.text import slugify
 # Reutilizamos modelos y utilidades del proyecto
 from core.models import Proyecto, Cliente, Material, Tapacanto, OptimizationRun, AuditLog
 from core.auth_utils import get_auth_context
+from core.catalogo import catalogo_org
 
 # Importar funciones del optimizador original para reutilizarlas
 from WowDash.optimizer_views import OptimizationEngine, _pdf_from_result, _normalize_rut
@@ -63,24 +64,12 @@ def optimizador_autoservicio_home_clone(request):
             print(f"ERROR: Proyecto {proyecto_copiado_id} no existe")
             proyecto_a_cargar = None
     
-    # Obtener materiales y tapacantos
-    materiales_qs = Material.objects.all()
-    tapacantos_qs = Tapacanto.objects.all()
-    
-    if not (ctx.get('organization_is_general') or ctx.get('is_support')):
-        if hasattr(Material, 'organizacion'):
-            materiales_qs = materiales_qs.filter(organizacion_id=ctx.get('organization_id'))
-        if hasattr(Tapacanto, 'organizacion'):
-            tapacantos_qs = tapacantos_qs.filter(organizacion_id=ctx.get('organization_id'))
+    # Obtener materiales y tapacantos (catálogo cacheado por versión de organización)
+    org_id = None if (ctx.get('organization_is_general') or ctx.get('is_support')) else ctx.get('organization_id')
     
     # Fallback si los filtros devolvieron vacío
-    mats_list = list(materiales_qs[:50])
-    if not mats_list:
-        mats_list = list(Material.objects.all()[:50])
-    
-    taps_list = list(tapacantos_qs[:50])
-    if not taps_list:
-        taps_list = list(Tapacanto.objects.all()[:50])
+    mats_list = catalogo_org('material', org_id)[:50] or catalogo_org('material', None)[:50]
+    taps_list = catalogo_org('tapacanto', org_id)[:50] or catalogo_org('tapacanto', None)[:50]
     
     context = {
         'title': 'Optimizador Autoservicio',
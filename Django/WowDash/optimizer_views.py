@@ -2,7 +2,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -10,7 +10,11 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
 from typing import Optional
+import hashlib
 import json
+import logging
+import os
+import time
 import uuid
 from datetime import datetime
 from reportlab.pdfgen import canvas
@@ -24,10 +28,16 @@ except Exception:
 from django.templatetags.static import static
 from django.utils.text import slugify
 from django.contrib.staticfiles import finders
-from core.models import Proyecto, Cliente, Material, Tapacanto, OptimizationRun, AuditLog
+from core.models import Proyecto, Cliente, Material, Tapacanto, OptimizationRun
+from core.audit import registrar_auditoria
 from core.auth_utils import get_auth_context
+from core.secuencias import siguiente_correlativo, siguiente_public_id
+from core.db_router import lectura_en_replica
+from core.catalogo import catalogo_org
 import math
 
+logger = logging.getLogger(__name__)
+
 def _normalize_rut(rut: str) -> str:
     """Normaliza un RUT/identificador para comparación: quita puntos, guiones y espacios, y pasa a mayúsculas.
     Evita duplicados por formato (ej. 12.345.678-9 vs 12345678-9).
@@ -281,8 +291,9 @@ def optimizador_home_clasico(request):
         base = base.filter(organizacion_id=ctx.get('organization_id'))
     proyectos = base.order_by('-fecha_creacion')[:10]
     clientes = Cliente.objects.all()
-    tableros = Material.objects.all()
-    tapacantos = Tapacanto.objects.all()
+    org_id = None if (ctx.get('organization_is_general') or ctx.get('is_support')) else ctx.get('organization_id')
+    tableros = catalogo_org('material', org_id)
+    tapacantos = catalogo_org('tapacanto', org_id)
 
     context = {
         'proyectos': proyectos,
@@ -309,19 +320,11 @@ def optimizador_autoservicio(request):
         request.session.pop(SESSION_KEY_CLIENTE, None)
         return redirect('/autoservicio/')
     ctx = get_auth_context(request)
-    # Limitar materiales al org si aplica
-    materiales_qs = Material.objects.all()
-    tapacantos_qs = Tapacanto.objects.all()
-    if not (ctx.get('organization_is_general') or ctx.get('is_support')):
-        materiales_qs = materiales_qs.filter(organizacion_id=ctx.get('organization_id')) if hasattr(Material, 'organizacion') else materiales_qs
-        tapacantos_qs = tapacantos_qs.filter(organizacion_id=ctx.get('organization_id')) if hasattr(Tapacanto, 'organizacion') else tapacantos_qs
+    # Limitar materiales al org si aplica (catálogo cacheado por versión de organización)
+    org_id = None if (ctx.get('organization_is_general') or ctx.get('is_support')) else ctx.get('organization_id')
     # Fallback: si filtros devolvieron vacío, usar primeros materiales/tapacantos globales para evitar select vacío
-    mats_list = list(materiales_qs[:50])
-    if not mats_list:
-        mats_list = list(Material.objects.all()[:50])
-    taps_list = list(tapacantos_qs[:50])
-    if not taps_list:
-        taps_list = list(Tapacanto.objects.all()[:50])
+    mats_list = catalogo_org('material', org_id)[:50] or catalogo_org('material', None)[:50]
+    taps_list = catalogo_org('tapacanto', org_id)[:50] or catalogo_org('tapacanto', None)[:50]
     context = {
         'title': 'Optimizador Autoservicio',
         'subTitle': 'Proyecto Nuevo',
@@ -391,47 +394,60 @@ def _materiales_desde_resultado(resultado):
         return [resultado]
     return []
 
-def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
+def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None, solo=None, numerar: bool = True,
+                     destino=None):
     """Genera un PDF (bytes) que dibuja cada tablero y sus piezas según el resultado guardado.
     Paridad 1:1 con la vista: coords relativas al área útil con origen arriba-izquierda.
+
+    ``solo`` limita el dibujo a un grupo de páginas (0 = portada, k = material k) y
+    ``numerar=False`` omite "Página X de Y": así se generan las partes que _unir_pdf junta
+    y numera (ver _enviar_pdf_resultado). Con ``destino`` (ruta o archivo) el PDF se escribe
+    ahí y se devuelve ``destino`` en lugar de los bytes.
     """
     from io import BytesIO
-    buf = BytesIO()
+    buf = BytesIO() if destino is None else destino
 
-    # Canvas con numeración total de páginas
+    # Canvas con numeración "Página X de Y". Y solo se conoce al guardar: va en un formulario
+    # (XObject) que cada página referencia y que se define en save(), así no se guarda el
+    # estado de cada página y la memoria no crece con el número de páginas.
     class NumberedCanvas(canvas.Canvas):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self._saved_page_states = []
             self._page_width, self._page_height = landscape(letter)
         def showPage(self):
-            # Guarda el estado de la página actual y empieza una nueva
-            self._saved_page_states.append(dict(self.__dict__))
-            self._startPage()
+            self._draw_page_number(self.getPageNumber())
+            super().showPage()
         def save(self):
-            # Asegurar que el estado de la página actual también esté incluido
-            # (si no se llamó a showPage() tras el último contenido, se perdería la última página).
-            try:
-                self._saved_page_states.append(dict(self.__dict__))
-            except Exception:
-                pass
-            # Inserta numeración "Página X de Y" centrada abajo
-            page_count = len(self._saved_page_states)
-            for i, state in enumerate(self._saved_page_states, start=1):
-                self.__dict__.update(state)
-                self._draw_page_number(i, page_count)
-                canvas.Canvas.showPage(self)
-            canvas.Canvas.save(self)
-        def _draw_page_number(self, page_num, page_count):
+            # La página actual siempre se emite (aunque no se haya llamado a showPage() tras
+            # el último contenido, como hacía la numeración anterior)
+            self.showPage()
+            self.beginForm('total_paginas')
+            self.setFont("Helvetica", 9)
+            self.drawString(0, 0, str(self.getPageNumber() - 1))
+            self.endForm()
+            super().save()
+        def _draw_page_number(self, page_num):
             try:
                 self.setFont("Helvetica", 9)
-                txt = f"Página {page_num} de {page_count}"
-                self.drawCentredString(self._page_width/2.0, 18, txt)
+                txt = f"Página {page_num} de "
+                # Centrado como si Y tuviera los dígitos de X (en Helvetica todos los dígitos
+                # miden lo mismo): exacto salvo en las primeras páginas de informes largos
+                x = (self._page_width - self.stringWidth(txt + str(page_num), "Helvetica", 9)) / 2.0
+                self.drawString(x, 18, txt)
+                self.saveState()
+                self.translate(x + self.stringWidth(txt, "Helvetica", 9), 18)
+                self.doForm('total_paginas')
+                self.restoreState()
             except Exception:
                 pass
 
+    def _salida():
+        if destino is not None:
+            return destino
+        data = buf.getvalue(); buf.close(); return data
+
     # PDF en orientación horizontal (apaisado)
-    p = NumberedCanvas(buf, pagesize=landscape(letter))
+    p = (NumberedCanvas if numerar else canvas.Canvas)(buf, pagesize=landscape(letter))
     width, height = landscape(letter)
     # Título del documento para evitar "Untitled" en el viewer
     try:
@@ -492,7 +508,7 @@ def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
         p.drawString(40, y, f"Cliente: {proyecto.cliente.nombre if proyecto.cliente_id else '-'}"); y -= 16
         p.drawString(40, y, f"Código de proyecto: {proyecto.codigo}"); y -= 16
         p.drawString(40, y, "No hay resultado de optimización guardado.")
-        p.showPage(); p.save(); data = buf.getvalue(); buf.close(); return data
+        p.showPage(); p.save(); return _salida()
 
     # Página(s) de resumen con logo
     # Cache de logo para mejorar rendimiento
@@ -624,7 +640,7 @@ def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
         materiales = _materiales_desde_resultado(resultado)
     except Exception:
         materiales = _materiales_desde_resultado(resultado)
-    if materiales:
+    if materiales and (solo is None or 0 in solo):
         _t_sum0 = _t.perf_counter() if PROFILE else None
         draw_logo(width-40, height-40)
         # Título e ID del proyecto
@@ -892,12 +908,17 @@ def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
             # Avanzar a la siguiente fila
             y_row_top -= row_height + 8
             i += 3
-    if PROFILE:
-        _prof['summary_s'] += (_t.perf_counter() - _t_sum0)
-    p.showPage()
+        if PROFILE:
+            _prof['summary_s'] += (_t.perf_counter() - _t_sum0)
+    # Último material a dibujar (en una parte no se deja página en blanco al final)
+    ultimo = len(materiales) if solo is None else max(solo)
+    if (solo is None or 0 in solo) and ultimo > 0:
+        p.showPage()
 
     # Un tablero por página, por cada material (páginas horizontales sin tabla inferior)
     for m_idx, mat in enumerate(materiales, start=1):
+        if solo is not None and m_idx not in solo:
+            continue
         # Precalcular totales globales por tipo (nombre + dimensiones normalizadas) en TODO el material
         # para que las etiquetas (i/j) coincidan con el visualizador (no por tablero).
         totales_global_por_tipo = {}
@@ -1619,7 +1640,7 @@ def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
         # forzar salto de página si no es el último material, para que
         # el próximo bloque de tableros comience en una página nueva.
         try:
-            if m_idx < len(materiales):
+            if m_idx < ultimo:
                 p.showPage()
         except Exception:
             # Si por alguna razón no podemos evaluar la longitud, 
@@ -1635,7 +1656,155 @@ def _pdf_from_result(proyecto, resultado, opts: Optional[dict] = None):
             ))
         except Exception:
             pass
-    data = buf.getvalue(); buf.close(); return data
+    return _salida()
+
+# Con menos tableros, repartir el PDF entre procesos y unirlo cuesta más de lo que ahorra
+PDF_PARALELO_MIN_TABLEROS = 12
+
+
+def _lector_pdf():
+    """(PdfReader, PdfWriter) de pypdf (o PyPDF2); None si no hay ninguno instalado."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        try:
+            from PyPDF2 import PdfReader, PdfWriter
+        except ImportError:
+            return None
+    return PdfReader, PdfWriter
+
+
+def _pdf_grupos(resultado, paralelismo: int):
+    """Reparte portada (0) y materiales (1..N) en hasta ``paralelismo`` grupos contiguos
+    de carga parecida (tableros); None si no conviene dividir el PDF."""
+    materiales = _materiales_desde_resultado(resultado)
+    if paralelismo < 2 or len(materiales) < 2 or _lector_pdf() is None:
+        return None
+    pesos = [1] + [1 + len(m.get('tableros') or []) for m in materiales]
+    if sum(pesos) - len(pesos) < PDF_PARALELO_MIN_TABLEROS:
+        return None
+
+    def _cortar(capacidad):
+        grupos, actual, carga = [], [], 0
+        for idx, peso in enumerate(pesos):
+            if actual and carga + peso > capacidad:
+                grupos.append(actual)
+                actual, carga = [], 0
+            actual.append(idx)
+            carga += peso
+        grupos.append(actual)
+        return grupos
+
+    # Menor carga máxima por grupo que cabe en ``paralelismo`` grupos (búsqueda binaria)
+    bajo, alto = max(pesos), sum(pesos)
+    while bajo < alto:
+        medio = (bajo + alto) // 2
+        if len(_cortar(medio)) <= paralelismo:
+            alto = medio
+        else:
+            bajo = medio + 1
+    grupos = _cortar(bajo)
+    return grupos if len(grupos) > 1 else None
+
+
+def _resultado_para_grupo(resultado, grupo):
+    """Resultado recortado para una parte: sin historial y, si no incluye la portada, con
+    los materiales ajenos vacíos (se conservan los índices). Menos datos hacia el pool."""
+    recorte = {k: v for k, v in resultado.items() if k != 'historial'}
+    if 0 not in grupo:
+        recorte['materiales'] = [m if idx in grupo else {}
+                                 for idx, m in enumerate(_materiales_desde_resultado(resultado), start=1)]
+    return recorte
+
+
+def _escribir_pdf(destino, escribir):
+    """Escribe con ``escribir(ruta_temporal)`` junto a ``destino`` y lo reemplaza de una vez:
+    quien esté sirviendo el PDF anterior nunca ve un archivo a medias."""
+    tmp = f"{destino}.{uuid.uuid4().hex}.tmp"
+    try:
+        escribir(tmp)
+        os.replace(tmp, destino)
+    finally:
+        if os.path.exists(tmp):
+            _borrar_archivo(tmp)
+    return destino
+
+
+def _pdf_a_archivo(proyecto, resultado, opts, destino, solo=None, numerar=True):
+    """_pdf_from_result escrito en ``destino`` (corre en el pool de core.computo): el PDF no
+    vuelve al proceso web como bytes, la vista lo sirve del disco."""
+    return _escribir_pdf(destino, lambda tmp: _pdf_from_result(
+        proyecto, resultado, opts, solo=solo, numerar=numerar, destino=tmp))
+
+
+def _pdf_grupo(proyecto, resultado, opts, grupo, destino):
+    """Páginas de un grupo sin numerar, en ``destino`` (corre en el pool de core.computo)."""
+    return _pdf_a_archivo(proyecto, resultado, opts, destino, solo=set(grupo), numerar=False)
+
+
+def _unir_pdf(partes, destino):
+    """Une los archivos de ``partes`` en orden en ``destino`` y numera "Página X de Y" igual
+    que NumberedCanvas (corre en el pool de core.computo). Las partes se leen del disco a
+    medida que se copian."""
+    import tempfile
+    from contextlib import ExitStack
+    PdfReader, PdfWriter = _lector_pdf()
+    with ExitStack() as pila:
+        lectores = [PdfReader(pila.enter_context(open(ruta, 'rb'))) for ruta in partes]
+        total = sum(len(lector.pages) for lector in lectores)
+        # Una página transparente con el número por cada página del documento
+        width, height = landscape(letter)
+        numeros_buf = pila.enter_context(tempfile.SpooledTemporaryFile(max_size=1024 * 1024))
+        numeros = canvas.Canvas(numeros_buf, pagesize=(width, height))
+        for n in range(1, total + 1):
+            numeros.setFont("Helvetica", 9)
+            numeros.drawCentredString(width/2.0, 18, f"Página {n} de {total}")
+            numeros.showPage()
+        numeros.save()
+        numeros_buf.seek(0)
+        paginas_numero = PdfReader(numeros_buf).pages
+        writer = PdfWriter()
+        n = 0
+        for lector in lectores:
+            for pagina in lector.pages:
+                pagina.merge_page(paginas_numero[n])
+                writer.add_page(pagina)
+                n += 1
+        try:
+            if lectores[0].metadata:
+                writer.add_metadata(dict(lectores[0].metadata))
+        except Exception:
+            pass
+        return _escribir_pdf(destino, writer.write)
+
+
+def _enviar_pdf_resultado(proyecto, resultado, opts, destino, **kwargs):
+    """Encola en core.computo el PDF de _pdf_from_result, que queda escrito en ``destino``.
+    Si es grande y la organización tiene más de un cupo, cada grupo de materiales se dibuja
+    en un proceso distinto (a un archivo temporal) y _unir_pdf junta las partes: el PDF
+    tarda lo que el grupo más pesado."""
+    import shutil
+    import tempfile
+    from functools import partial
+    from core import computo
+    datos = _datos_pdf_proyecto(proyecto)
+    grupos = _pdf_grupos(resultado, computo.paralelismo()) if isinstance(resultado, dict) else None
+    if grupos is None:
+        return computo.enviar(_pdf_a_archivo, datos, resultado, opts, destino, **kwargs)
+    carpeta = tempfile.mkdtemp(prefix='pdf-partes-')
+    try:
+        trabajo = computo.enviar_partes(
+            _pdf_grupo,
+            [(datos, _resultado_para_grupo(resultado, g), opts, tuple(g), os.path.join(carpeta, f'parte_{i}.pdf'))
+             for i, g in enumerate(grupos)],
+            partial(_unir_pdf, destino=destino), **kwargs,
+        )
+    except Exception:
+        shutil.rmtree(carpeta, ignore_errors=True)
+        raise
+    # Las partes se borran cuando el trabajo termina, bien o con error
+    trabajo.futuro.add_done_callback(lambda _futuro: shutil.rmtree(carpeta, ignore_errors=True))
+    return trabajo
 
 # ------------------------------
 # Utilidades: reconstrucción del resultado desde configuración
@@ -1867,19 +2036,9 @@ def crear_proyecto_optimizacion(request):
             sec = datetime.now().strftime('%Y%m%d%H%M%S')
             codigo = f"{base}-{sec}"
 
-            # Asignar correlativo único por cliente: max+1
-            try:
-                ultimo = Proyecto.objects.filter(cliente_id=cliente_id).order_by('-correlativo').first()
-                correlativo = (ultimo.correlativo + 1) if ultimo and (ultimo.correlativo is not None) else 1
-            except Exception:
-                correlativo = 1
-
-            # Determinar siguiente public_id global iniciando en 100
-            try:
-                ultimo_pub = Proyecto.objects.exclude(public_id__isnull=True).order_by('-public_id').first()
-                next_public_id = (ultimo_pub.public_id + 1) if ultimo_pub and ultimo_pub.public_id and ultimo_pub.public_id >= 100 else 100
-            except Exception:
-                next_public_id = 100
+            # Correlativo por cliente y public_id global (inicia en 100) desde el asignador atómico
+            correlativo = siguiente_correlativo(cliente_id)
+            next_public_id = siguiente_public_id()
 
             ctx = get_auth_context(request)
             proyecto = Proyecto.objects.create(
@@ -1904,7 +2063,7 @@ def crear_proyecto_optimizacion(request):
             )
             # Auditoría de creación de proyecto
             try:
-                AuditLog.objects.create(
+                registrar_auditoria(
                     actor=request.user,
                     organizacion=proyecto.organizacion,
                     verb='CREATE',
@@ -2200,12 +2359,7 @@ def optimizar_material(request):
                         proyecto.version = (proyecto.version or 0) + 1
                     except Exception:
                         proyecto.version = 1
-                    try:
-                        ultimo_pub = Proyecto.objects.exclude(public_id__isnull=True).order_by('-public_id').first()
-                        next_public_id = (ultimo_pub.public_id + 1) if ultimo_pub and ultimo_pub.public_id and ultimo_pub.public_id >= 100 else 100
-                    except Exception:
-                        next_public_id = 100
-                    proyecto.public_id = next_public_id
+                    proyecto.public_id = siguiente_public_id()
                 existente['folio_proyecto'] = str(proyecto.public_id)
                 # Agregar snapshot al historial con el nuevo ID
                 try:
@@ -2242,7 +2396,7 @@ def optimizar_material(request):
                         porcentaje_uso=eficiencia_promedio,
                         tiempo_ms=int(resultado.get('tiempo_optimizacion', 0) * 1000) if resultado.get('tiempo_optimizacion') else None,
                     )
-                    AuditLog.objects.create(
+                    registrar_auditoria(
                         actor=request.user,
                         organizacion=proyecto.organizacion,
                         verb='RUN_OPT',
@@ -2378,18 +2532,110 @@ def exportar_json_salida(request, proyecto_id):
         messages.error(request, f'Error al exportar resultado: {str(e)}')
         return redirect('optimizador_home')
 
-@login_required
-def exportar_pdf(request, proyecto_id):
-    """[LEGACY] Generación/regeneración de PDF con layout pesado.
-    Marcado como legado: preferir exportar_pdf_snapshot / exportar_pdf_snapshot_cached.
-    Puede deshabilitarse estableciendo DISABLE_LEGACY_PDF=1 en variables de entorno.
+def _datos_pdf_proyecto(proyecto):
+    """Campos del proyecto que lee _pdf_from_result, como datos simples (se envían al pool
+    de core.computo, que no debe tocar la BD)."""
+    from types import SimpleNamespace
+    cliente = SimpleNamespace(nombre=proyecto.cliente.nombre) if proyecto.cliente_id else None
+    return SimpleNamespace(
+        id=proyecto.id, codigo=proyecto.codigo, nombre=proyecto.nombre,
+        correlativo=proyecto.correlativo, version=proyecto.version, public_id=proyecto.public_id,
+        cliente_id=proyecto.cliente_id, cliente=cliente,
+    )
+
+
+def _weasy_pdf(html: str) -> bytes:
+    """HTML → PDF con WeasyPrint (corre en el pool de core.computo)."""
+    return WEASY_HTML(string=html).write_pdf()
+
+
+def _respuesta_computo_saturado():
+    resp = JsonResponse({'success': False, 'message': 'Hay demasiados documentos en generación. Intenta en unos segundos.'}, status=503)
+    resp['Retry-After'] = '10'
+    return resp
+
+
+def _respuesta_computo_pendiente(request, trabajo, url=None):
+    """202 mientras el trabajo sigue en el pool: el cliente consulta ``estado_url`` y, al
+    completarse, pide ``url`` (que sirve lo ya guardado) o usa ``respuesta`` del estado."""
+    from django.utils.html import escape
+    estado_url = reverse('api_computo_trabajo_estado', args=[trabajo.id])
+    if url and request.method == 'GET' and 'text/html' in request.headers.get('Accept', ''):
+        # Navegación directa (pestaña nueva, iframe de impresión): recargar sola hasta tener el PDF
+        resp = HttpResponse(
+            f'<!doctype html><meta charset="utf-8"><meta http-equiv="refresh" content="3;url={escape(url)}">'
+            '<p style="font-family:sans-serif">Generando el PDF… esta página se actualizará sola.</p>',
+            status=202,
+        )
+    else:
+        resp = JsonResponse({'success': True, 'pendiente': True, 'trabajo_id': trabajo.id,
+                             'estado_url': estado_url, 'url': url}, status=202)
+    resp['Retry-After'] = '3'
+    resp['Cache-Control'] = 'no-store'
+    return resp
+
+
+async def _login_requerido(request):
+    """Equivalente a @login_required para vistas async (el de Django 4.2 es solo síncrono)."""
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth.views import redirect_to_login
+    if await sync_to_async(lambda: request.user.is_authenticated)():
+        return None
+    return redirect_to_login(request.get_full_path())
+
+
+def _borrar_archivo(path) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Bloque de envío de los PDF bajo ASGI: cada bloque es un salto a un hilo, 8 KB (el de
+# FileResponse) son demasiados saltos para archivos de varios MB
+PDF_BLOQUE_BYTES = 256 * 1024
+
+
+async def _leer_por_bloques(archivo, tamano=PDF_BLOQUE_BYTES):
+    from asgiref.sync import sync_to_async
+    leer = sync_to_async(archivo.read, thread_sensitive=False)
+    while True:
+        bloque = await leer(tamano)
+        if not bloque:
+            break
+        yield bloque
+
+
+def _servir_pdf(request, path, filename, cache_control='no-store', temporal=False):
+    """FileResponse del PDF en disco, enviado por bloques sin cargarlo entero en memoria.
+
+    Bajo ASGI el contenido sale de un iterador async: con uno síncrono Django 4.2 lo juntaría
+    todo en una lista antes de enviarlo. Con ``temporal`` el archivo se borra al abrirlo (el
+    descriptor abierto lo mantiene hasta terminar la respuesta).
     """
-    import os
-    from django.conf import settings
-    
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import FileResponse
+    archivo = open(path, 'rb')
+    if temporal:
+        _borrar_archivo(path)
+    resp = FileResponse(archivo, content_type='application/pdf')
+    # El iterador de FileResponse lee resp.block_size en cada bloque (también bajo WSGI)
+    resp.block_size = PDF_BLOQUE_BYTES
+    if isinstance(request, ASGIRequest):
+        # FileResponse ya fijó Content-Length y cierra el archivo al terminar
+        resp.streaming_content = _leer_por_bloques(archivo, resp.block_size)
+    resp['Content-Disposition'] = f'inline; filename="{filename}"'
+    resp['Cache-Control'] = cache_control
+    return resp
+
+
+@lectura_en_replica
+def _exportar_pdf_preparar(request, proyecto_id):
+    """Parte síncrona de exportar_pdf: sirve el PDF ya guardado o prepara los datos para
+    generarlo. Devuelve una respuesta o ``(proyecto, resultado, pdf_opts, usuario_id)``."""
     if os.getenv('DISABLE_LEGACY_PDF', '').lower() in ('1','true','yes','y','on'):
         return JsonResponse({'success': False, 'message': 'Ruta legacy PDF deshabilitada. Use snapshot.'}, status=410)
-    proyecto = get_object_or_404(Proyecto, id=proyecto_id)
+    proyecto = get_object_or_404(Proyecto.objects.select_related('cliente'), id=proyecto_id)
 
     # Leer flags/opciones de query
     q = request.GET
@@ -2424,7 +2670,6 @@ def exportar_pdf(request, proyecto_id):
         folio_actual = None
 
     from django.conf import settings
-    import os
     if folio_actual and not force_regen:
         rel_dir = f"proyectos/{proyecto.id}"
         # Primero buscar con cliente en nombre
@@ -2445,11 +2690,7 @@ def exportar_pdf(request, proyecto_id):
             serve_path = abs_path2
             serve_name = f"optimizacion_{folio_actual}.pdf"
         if serve_path:
-            with open(serve_path, 'rb') as f:
-                data = f.read()
-            resp = HttpResponse(data, content_type='application/pdf')
-            resp['Content-Disposition'] = f'inline; filename="{serve_name}"'
-            resp['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+            resp = _servir_pdf(request, serve_path, serve_name, 'no-store, no-cache, must-revalidate, max-age=0')
             resp['Pragma'] = 'no-cache'
             return resp
 
@@ -2458,47 +2699,171 @@ def exportar_pdf(request, proyecto_id):
         resultado = json.loads(proyecto.resultado_optimizacion) if proyecto.resultado_optimizacion else {}
     except Exception:
         resultado = {}
-    pdf_bytes = _pdf_from_result(proyecto, resultado, opts=pdf_opts)
+    usuario_id = request.user.id if request.user.is_authenticated else None
+    return proyecto, resultado, pdf_opts, usuario_id
 
-    # Guardar como PDF del ID/folio actual (si se pudo obtener)
+
+def _ruta_pdf_proyecto(proyecto):
+    """``(ruta relativa, ruta absoluta)`` del PDF del ID/folio actual; crea la carpeta."""
+    from django.conf import settings
+    try:
+        folio_actual = str(proyecto.public_id) if proyecto.public_id else f"{proyecto.correlativo}-{proyecto.version}"
+    except Exception:
+        folio_actual = None
+    try:
+        cliente_slug = slugify(proyecto.cliente.nombre) if proyecto.cliente_id else 'cliente'
+    except Exception:
+        cliente_slug = 'cliente'
     rel_dir = f"proyectos/{proyecto.id}"
     if folio_actual:
-        try:
-            cliente_slug = slugify(proyecto.cliente.nombre) if proyecto.cliente_id else 'cliente'
-        except Exception:
-            cliente_slug = 'cliente'
         rel_path = f"{rel_dir}/optimizacion_{folio_actual}_{cliente_slug}.pdf"
     else:
         ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-        try:
-            cliente_slug = slugify(proyecto.cliente.nombre) if proyecto.cliente_id else 'cliente'
-        except Exception:
-            cliente_slug = 'cliente'
         rel_path = f"{rel_dir}/optimizacion_{proyecto.codigo}_{cliente_slug}_{ts}.pdf"
     abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
     os.makedirs(abs_dir, exist_ok=True)
-    abs_path = os.path.join(settings.MEDIA_ROOT, rel_path)
-    with open(abs_path, 'wb') as f:
-        f.write(pdf_bytes)
+    return rel_path, os.path.join(settings.MEDIA_ROOT, rel_path)
+
+
+def _guardar_pdf_proyecto(proyecto, rel_path) -> None:
+    """Deja en ``archivo_pdf`` el PDF que el pool ya escribió en ``rel_path``."""
     proyecto.archivo_pdf = rel_path
     proyecto.save(update_fields=['archivo_pdf'])
 
-    resp = HttpResponse(pdf_bytes, content_type='application/pdf')
-    resp['Content-Disposition'] = f'inline; filename="{os.path.basename(rel_path)}"'
-    resp['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+
+async def exportar_pdf(request, proyecto_id):
+    """[LEGACY] Generación/regeneración de PDF con layout pesado.
+    Marcado como legado: preferir exportar_pdf_snapshot / exportar_pdf_snapshot_cached.
+    Puede deshabilitarse estableciendo DISABLE_LEGACY_PDF=1 en variables de entorno.
+
+    El dibujo con ReportLab corre en el pool de core.computo; si no termina en
+    COMPUTO_ESPERA_SEGUNDOS se responde 202 y el PDF queda guardado al terminar, así que
+    volver a pedir esta URL (sin ``force``) lo sirve del disco.
+
+    El pool escribe el PDF directamente en MEDIA_ROOT y la respuesta lo envía por bloques
+    desde el disco: la memoria del proceso web no depende del tamaño del informe.
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import HttpResponseBase
+    from core import computo
+
+    denegado = await _login_requerido(request)
+    if denegado is not None:
+        return denegado
+    preparado = await sync_to_async(_exportar_pdf_preparar)(request, proyecto_id)
+    if isinstance(preparado, HttpResponseBase):
+        return preparado
+    proyecto, resultado, pdf_opts, usuario_id = preparado
+    rel_path, abs_path = await sync_to_async(_ruta_pdf_proyecto)(proyecto)
+
+    try:
+        trabajo = _enviar_pdf_resultado(
+            proyecto, resultado, pdf_opts, abs_path, organizacion_id=proyecto.organizacion_id,
+            usuario_id=usuario_id, tipo='pdf_legacy',
+            al_terminar=lambda _ruta: _guardar_pdf_proyecto(proyecto, rel_path),
+        )
+    except computo.Saturado:
+        return _respuesta_computo_saturado()
+    try:
+        await computo.esperar_async(trabajo)
+    except TimeoutError:
+        return _respuesta_computo_pendiente(request, trabajo, reverse('exportar_pdf', args=[proyecto.id]))
+
+    resp = _servir_pdf(request, abs_path, os.path.basename(rel_path), 'no-store, no-cache, must-revalidate, max-age=0')
     resp['Pragma'] = 'no-cache'
     return resp
 
-@login_required
-@csrf_exempt
-def exportar_pdf_snapshot(request, proyecto_id: int):
-    """Genera PDF rápido desde snapshot HTML enviado por el frontend (sin recalcular optimización).
-    Espera POST con JSON: { materiales: [ { titulo, eficiencia, layout_html, piezas: [...] } ] }
-    Guarda caché en MEDIA_ROOT/proyectos/<id>/materiales_snapshot.json y snapshot.html.
-    """
-    if request.method != 'POST':
-        return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
-    proyecto = get_object_or_404(Proyecto, id=proyecto_id)
+SNAPSHOT_TEMPLATE = 'pdf/materiales_snapshot.html'
+# Subir si cambia la forma de renderizar el snapshot (no solo la plantilla): invalida los PDF cacheados
+SNAPSHOT_PDF_VERSION = 1
+# Los PDF de otras claves pueden estar sirviéndose todavía: solo se borran pasado este tiempo
+SNAPSHOT_PDF_GRACIA_SEGUNDOS = 600
+_snapshot_template_hash = None
+
+
+def _hash_template_snapshot() -> str:
+    """Hash del fuente de la plantilla del snapshot (una vez por proceso)."""
+    global _snapshot_template_hash
+    if _snapshot_template_hash is None:
+        from django.template.loader import get_template
+        try:
+            fuente = get_template(SNAPSHOT_TEMPLATE).template.source
+        except Exception:
+            fuente = ''
+        _snapshot_template_hash = hashlib.sha256(fuente.encode('utf-8')).hexdigest()[:16]
+    return _snapshot_template_hash
+
+
+def _clave_snapshot_pdf(proyecto, snapshot_bytes: bytes) -> str:
+    """Clave del PDF renderizado: JSON del snapshot + versión de plantilla + campos del
+    proyecto que aparecen en el documento."""
+    h = hashlib.sha256(snapshot_bytes)
+    try:
+        cliente_nombre = proyecto.cliente.nombre if proyecto.cliente_id else ''
+    except Exception:
+        cliente_nombre = ''
+    extra = f"|{SNAPSHOT_PDF_VERSION}|{_hash_template_snapshot()}|{proyecto.public_id}|{proyecto.nombre}|{cliente_nombre}"
+    h.update(extra.encode('utf-8'))
+    return h.hexdigest()[:32]
+
+
+def _rutas_snapshot_pdf(abs_dir: str, clave: str):
+    """(pdf completo, solo portada) cacheados para la clave."""
+    cache_dir = os.path.join(abs_dir, 'snapshot_pdf')
+    return os.path.join(cache_dir, f'{clave}.pdf'), os.path.join(cache_dir, f'{clave}-portada.pdf')
+
+
+def _guardar_snapshot_pdf(ruta: str, pdf_bytes: bytes):
+    """Escribe el PDF cacheado de forma atómica y borra los de snapshots anteriores que
+    lleven más de ``SNAPSHOT_PDF_GRACIA_SEGUNDOS`` sin modificarse."""
+    cache_dir = os.path.dirname(ruta)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{ruta}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, ruta)
+        clave = os.path.basename(ruta).split('.')[0].split('-')[0]
+        limite = time.time() - SNAPSHOT_PDF_GRACIA_SEGUNDOS
+        for nombre in os.listdir(cache_dir):
+            if nombre.startswith(clave):
+                continue
+            otro = os.path.join(cache_dir, nombre)
+            try:
+                if os.path.getmtime(otro) < limite:
+                    os.remove(otro)
+            except OSError:
+                pass
+    except Exception:
+        logger.warning('No se pudo guardar el PDF del snapshot en %s', ruta, exc_info=True)
+
+
+def _extraer_portada(pdf_bytes: bytes) -> bytes:
+    """Primera página del PDF (o el PDF completo si no se puede extraer)."""
+    try:
+        lector = _lector_pdf()
+        if lector is None:
+            raise ImportError('pypdf')
+        PdfReader, PdfWriter = lector
+        import io
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        if len(reader.pages) > 0:
+            writer = PdfWriter()
+            writer.add_page(reader.pages[0])
+            output_buffer = io.BytesIO()
+            writer.write(output_buffer)
+            return output_buffer.getvalue()
+    except ImportError:
+        logger.warning('pypdf no disponible, enviando PDF completo')
+    except Exception as e:
+        logger.warning('Error extrayendo primera página: %s', e)
+    return pdf_bytes
+
+
+def _snapshot_preparar(request, proyecto_id: int):
+    """Parte síncrona de exportar_pdf_snapshot: valida el JSON, renderiza el HTML y guarda
+    el snapshot en caché. Devuelve una respuesta de error o ``(proyecto, html, ruta_pdf, n_materiales, usuario_id)``."""
+    proyecto = get_object_or_404(Proyecto.objects.select_related('cliente'), id=proyecto_id)
     try:
         payload = json.loads(request.body.decode('utf-8') or '{}')
     except Exception:
@@ -2506,7 +2871,7 @@ def exportar_pdf_snapshot(request, proyecto_id: int):
     materiales = payload.get('materiales') or payload.get('materiales_json') or []
     if not isinstance(materiales, list) or not materiales:
         return JsonResponse({'success': False, 'message': 'Faltan materiales para generar PDF'}, status=400)
-    import re, os
+    import re
     # Compactar HTML de cada material
     for m in materiales:
         html = m.get('layout_html', '') or ''
@@ -2538,65 +2903,129 @@ def exportar_pdf_snapshot(request, proyecto_id: int):
     if WEASY_HTML is None:
         return JsonResponse({'success': False, 'message': 'WeasyPrint no disponible en el servidor'}, status=500)
     from django.template.loader import render_to_string
-    html_out = render_to_string('pdf/materiales_snapshot.html', context)
-    t0 = time.time()
-    pdf_bytes = WEASY_HTML(string=html_out).write_pdf()
-    t1 = time.time()
-    logger.info('Snapshot PDF generado en %.2fs (materiales=%d)', t1 - t0, len(materiales))
+    html_out = render_to_string(SNAPSHOT_TEMPLATE, context)
     # Guardar caché
     rel_dir = f"proyectos/{proyecto.id}"
     abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
     os.makedirs(abs_dir, exist_ok=True)
-    import uuid as _uuid
     # Persistir JSON y HTML para posteriores descargas rápidas
     json_path = os.path.join(abs_dir, 'materiales_snapshot.json')
     html_path = os.path.join(abs_dir, 'snapshot.html')
+    snapshot_bytes = json.dumps(
+        {'materiales': materiales, 'eficiencia_global': eficiencia_global, 'timestamp': timestamp}, ensure_ascii=False
+    ).encode('utf-8')
+    ruta_pdf = None
     try:
-        with open(json_path, 'w', encoding='utf-8') as fjson:
-            json.dump({'materiales': materiales, 'eficiencia_global': eficiencia_global, 'timestamp': timestamp}, fjson, ensure_ascii=False)
+        with open(json_path, 'wb') as fjson:
+            fjson.write(snapshot_bytes)
         with open(html_path, 'w', encoding='utf-8') as fhtml:
             fhtml.write(html_out)
+        ruta_pdf = _rutas_snapshot_pdf(abs_dir, _clave_snapshot_pdf(proyecto, snapshot_bytes))[0]
     except Exception:
         pass  # Caché opcional
-    # Si se solicita solo la portada (primera página), extraerla
+    return proyecto, html_out, ruta_pdf, len(materiales), request.user.id
+
+
+async def exportar_pdf_snapshot(request, proyecto_id: int):
+    """Genera PDF rápido desde snapshot HTML enviado por el frontend (sin recalcular optimización).
+    Espera POST con JSON: { materiales: [ { titulo, eficiencia, layout_html, piezas: [...] } ] }
+    Guarda caché en MEDIA_ROOT/proyectos/<id>/materiales_snapshot.json y snapshot.html.
+
+    WeasyPrint corre en el pool de core.computo. El PDF renderizado se guarda al terminar
+    (para exportar_pdf_snapshot_cached); si tarda más de COMPUTO_ESPERA_SEGUNDOS se responde
+    202 con la URL cached para descargarlo cuando el trabajo se complete.
+    """
+    from asgiref.sync import sync_to_async
+    from core import computo
+
+    denegado = await _login_requerido(request)
+    if denegado is not None:
+        return denegado
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
+    preparado = await sync_to_async(_snapshot_preparar)(request, proyecto_id)
+    if isinstance(preparado, HttpResponse):
+        return preparado
+    proyecto, html_out, ruta_pdf, n_materiales, usuario_id = preparado
     portada_only = request.GET.get('portada_only', '').lower() in ('1', 'true', 'yes')
+
+    def _guardar(pdf_bytes):
+        # Dejar el PDF ya renderizado para que la descarga "cached" no vuelva a pasar por WeasyPrint
+        if ruta_pdf:
+            _guardar_snapshot_pdf(ruta_pdf, pdf_bytes)
+
+    t0 = time.time()
+    try:
+        trabajo = computo.enviar(_weasy_pdf, html_out, organizacion_id=proyecto.organizacion_id,
+                                 usuario_id=usuario_id, tipo='pdf_snapshot', al_terminar=_guardar)
+    except computo.Saturado:
+        return _respuesta_computo_saturado()
+    try:
+        pdf_bytes = await computo.esperar_async(trabajo)
+    except TimeoutError:
+        url = reverse('exportar_pdf_snapshot_cached', args=[proyecto.id]) + ('?portada_only=1' if portada_only else '')
+        return _respuesta_computo_pendiente(request, trabajo, url)
+    logger.info('Snapshot PDF generado en %.2fs (materiales=%d)', time.time() - t0, n_materiales)
+    # Si se solicita solo la portada (primera página), extraerla
     if portada_only:
-        try:
-            from PyPDF2 import PdfReader, PdfWriter
-            import io
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            if len(reader.pages) > 0:
-                writer = PdfWriter()
-                writer.add_page(reader.pages[0])
-                output_buffer = io.BytesIO()
-                writer.write(output_buffer)
-                pdf_bytes = output_buffer.getvalue()
-        except ImportError:
-            logger.warning('PyPDF2 no disponible, enviando PDF completo')
-        except Exception as e:
-            logger.warning('Error extrayendo primera página: %s', e)
-    
+        pdf_bytes = await sync_to_async(_extraer_portada, thread_sensitive=False)(pdf_bytes)
+
     resp = HttpResponse(pdf_bytes, content_type='application/pdf')
     filename = 'portada_optimizacion.pdf' if portada_only else 'snapshot_optimizacion.pdf'
     resp['Content-Disposition'] = f'inline; filename="{filename}"'
     resp['Cache-Control'] = 'no-store'
     return resp
 
-@login_required
-def exportar_pdf_snapshot_cached(request, proyecto_id: int):
-    """Segunda descarga rápida: reutiliza archivos de caché si existen."""
-    proyecto = get_object_or_404(Proyecto, id=proyecto_id)
-    portada_only = request.GET.get('portada_only', '').lower() in ('1', 'true', 'yes')
+
+# csrf_exempt de Django 4.2 envuelve la vista en una función síncrona; se marca a mano
+exportar_pdf_snapshot.csrf_exempt = True
+
+
+@lectura_en_replica
+def _snapshot_cached_preparar(request, proyecto_id: int, portada_only: bool):
+    """Parte síncrona de exportar_pdf_snapshot_cached: sirve lo que ya está en disco o
+    renderiza el HTML a convertir. Devuelve una respuesta o ``(proyecto, html, rutas, n_materiales, usuario_id)``."""
+    proyecto = get_object_or_404(Proyecto.objects.select_related('cliente'), id=proyecto_id)
     from django.conf import settings
-    import os, json
     rel_dir = f"proyectos/{proyecto.id}"
     abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
     json_path = os.path.join(abs_dir, 'materiales_snapshot.json')
     if not os.path.exists(json_path):
         return JsonResponse({'success': False, 'message': 'No hay snapshot en caché'}, status=404)
     try:
-        with open(json_path, 'r', encoding='utf-8') as fjson:
-            data = json.load(fjson)
+        with open(json_path, 'rb') as fjson:
+            snapshot_bytes = fjson.read()
+    except Exception:
+        return JsonResponse({'success': False, 'message': 'Snapshot corrupto'}, status=500)
+    ruta_completo, ruta_portada = _rutas_snapshot_pdf(abs_dir, _clave_snapshot_pdf(proyecto, snapshot_bytes))
+    ruta = ruta_portada if portada_only else ruta_completo
+    filename = 'portada_optimizacion_cached.pdf' if portada_only else 'snapshot_optimizacion_cached.pdf'
+
+    # Otra request puede borrar el archivo entre la comprobación y la apertura: se regenera
+    try:
+        return _servir_pdf(request, ruta, filename)
+    except FileNotFoundError:
+        pass
+
+    try:
+        # Solo falta la portada: sale del PDF completo ya renderizado
+        with open(ruta_completo, 'rb') as f:
+            pdf_bytes = _extraer_portada(f.read())
+    except FileNotFoundError:
+        pdf_bytes = None
+    if pdf_bytes is not None:
+        _guardar_snapshot_pdf(ruta_portada, pdf_bytes)
+        try:
+            return _servir_pdf(request, ruta_portada, filename)
+        except FileNotFoundError:
+            pass
+        resp = HttpResponse(pdf_bytes, content_type='application/pdf')
+        resp['Content-Disposition'] = f'inline; filename="{filename}"'
+        resp['Cache-Control'] = 'no-store'
+        return resp
+
+    try:
+        data = json.loads(snapshot_bytes.decode('utf-8'))
     except Exception:
         return JsonResponse({'success': False, 'message': 'Snapshot corrupto'}, status=500)
     materiales = data.get('materiales') or []
@@ -2611,65 +3040,125 @@ def exportar_pdf_snapshot_cached(request, proyecto_id: int):
         'eficiencia_global': eficiencia_global,
         'timestamp': timestamp,
     }
-    html_out = render_to_string('pdf/materiales_snapshot.html', context)
+    html_out = render_to_string(SNAPSHOT_TEMPLATE, context)
+    return proyecto, html_out, (ruta_completo, ruta_portada), len(materiales), request.user.id
+
+
+async def exportar_pdf_snapshot_cached(request, proyecto_id: int):
+    """Segunda descarga rápida: reutiliza archivos de caché si existen.
+
+    El PDF renderizado (completo y solo portada) se guarda en
+    MEDIA_ROOT/proyectos/<id>/snapshot_pdf/ con una clave derivada del JSON del snapshot,
+    la plantilla y los datos del proyecto que aparecen en él; las descargas repetidas se
+    sirven directamente del disco sin WeasyPrint. Cuando hay que renderizar, WeasyPrint
+    corre en el pool de core.computo (202 + consulta si no termina a tiempo).
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import HttpResponseBase
+    from core import computo
+
+    denegado = await _login_requerido(request)
+    if denegado is not None:
+        return denegado
+    portada_only = request.GET.get('portada_only', '').lower() in ('1', 'true', 'yes')
+    preparado = await sync_to_async(_snapshot_cached_preparar)(request, proyecto_id, portada_only)
+    if isinstance(preparado, HttpResponseBase):
+        return preparado
+    proyecto, html_out, (ruta_completo, ruta_portada), n_materiales, usuario_id = preparado
+    filename = 'portada_optimizacion_cached.pdf' if portada_only else 'snapshot_optimizacion_cached.pdf'
+
+    def _guardar(pdf_bytes):
+        _guardar_snapshot_pdf(ruta_completo, pdf_bytes)
+        if portada_only:
+            _guardar_snapshot_pdf(ruta_portada, _extraer_portada(pdf_bytes))
+
     t0 = time.time()
-    pdf_bytes = WEASY_HTML(string=html_out).write_pdf()
-    t1 = time.time()
-    logger.info('Snapshot PDF (cached) generado en %.2fs (materiales=%d)', t1 - t0, len(materiales))
-    
-    # Si se solicita solo la portada (primera página), extraerla
+    try:
+        trabajo = computo.enviar(_weasy_pdf, html_out, organizacion_id=proyecto.organizacion_id,
+                                 usuario_id=usuario_id, tipo='pdf_snapshot', al_terminar=_guardar)
+    except computo.Saturado:
+        return _respuesta_computo_saturado()
+    try:
+        pdf_bytes = await computo.esperar_async(trabajo)
+    except TimeoutError:
+        return _respuesta_computo_pendiente(request, trabajo, request.get_full_path())
+    logger.info('Snapshot PDF (cached) generado en %.2fs (materiales=%d)', time.time() - t0, n_materiales)
+
+    ruta = ruta_portada if portada_only else ruta_completo
+    try:
+        return _servir_pdf(request, ruta, filename)
+    except FileNotFoundError:
+        pass
     if portada_only:
-        try:
-            from PyPDF2 import PdfReader, PdfWriter
-            import io
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            if len(reader.pages) > 0:
-                writer = PdfWriter()
-                writer.add_page(reader.pages[0])
-                output_buffer = io.BytesIO()
-                writer.write(output_buffer)
-                pdf_bytes = output_buffer.getvalue()
-        except ImportError:
-            logger.warning('PyPDF2 no disponible, enviando PDF completo')
-        except Exception as e:
-            logger.warning('Error extrayendo primera página: %s', e)
-    
+        pdf_bytes = await sync_to_async(_extraer_portada, thread_sensitive=False)(pdf_bytes)
     resp = HttpResponse(pdf_bytes, content_type='application/pdf')
-    filename = 'portada_optimizacion_cached.pdf' if portada_only else 'snapshot_optimizacion_cached.pdf'
     resp['Content-Disposition'] = f'inline; filename="{filename}"'
     resp['Cache-Control'] = 'no-store'
     return resp
 
-@login_required
-def exportar_pdf_json(request, proyecto_id: int):
+
+@lectura_en_replica
+def _pdf_json_preparar(request, proyecto_id: int):
+    """Parte síncrona de exportar_pdf_json: respuesta de error o ``(proyecto, resultado, usuario_id)``."""
+    proyecto = get_object_or_404(Proyecto.objects.select_related('cliente'), id=proyecto_id)
+    if not proyecto.resultado_optimizacion:
+        return JsonResponse({'success': False, 'message': 'El proyecto no tiene resultado guardado'}, status=400)
+    try:
+        resultado = json.loads(proyecto.resultado_optimizacion)
+    except Exception:
+        # Si ya es dict (guardado sin dumps)
+        resultado = proyecto.resultado_optimizacion if isinstance(proyecto.resultado_optimizacion, dict) else None
+    if not isinstance(resultado, dict):
+        return JsonResponse({'success': False, 'message': 'Resultado inválido o corrupto'}, status=500)
+    return proyecto, resultado, request.user.id
+
+
+async def exportar_pdf_json(request, proyecto_id: int):
     """Genera PDF usando el estilo legacy (ReportLab) pero sin recalcular:
-    toma el `Proyecto.resultado_optimizacion` actual y lo dibuja.
+    toma el `Proyecto.resultado_optimizacion` actual y lo dibuja (en el pool de core.computo).
+    El PDF se escribe en un archivo temporal que se envía por bloques y se borra.
     """
-    proyecto = get_object_or_404(Proyecto, id=proyecto_id)
+    import tempfile
+    from asgiref.sync import sync_to_async
+    from core import computo
+
+    denegado = await _login_requerido(request)
+    if denegado is not None:
+        return denegado
     try:
-        if not proyecto.resultado_optimizacion:
-            return JsonResponse({'success': False, 'message': 'El proyecto no tiene resultado guardado'}, status=400)
+        preparado = await sync_to_async(_pdf_json_preparar)(request, proyecto_id)
+        if isinstance(preparado, HttpResponse):
+            return preparado
+        proyecto, resultado, usuario_id = preparado
+        fd, destino = tempfile.mkstemp(prefix='pdf-json-', suffix='.pdf')
+        os.close(fd)
         try:
-            resultado = json.loads(proyecto.resultado_optimizacion)
+            trabajo = _enviar_pdf_resultado(
+                proyecto, resultado,
+                {'fast': True, 'draw_kerf': False, 'draw_kerf_invisible': False, 'piece_grid': False},
+                destino, organizacion_id=proyecto.organizacion_id, usuario_id=usuario_id, tipo='pdf_json',
+            )
         except Exception:
-            # Si ya es dict (guardado sin dumps)
-            resultado = proyecto.resultado_optimizacion if isinstance(proyecto.resultado_optimizacion, dict) else None
-        if not isinstance(resultado, dict):
-            return JsonResponse({'success': False, 'message': 'Resultado inválido o corrupto'}, status=500)
-
-        pdf_bytes = _pdf_from_result(
-            proyecto,
-            resultado,
-            opts={'fast': True, 'draw_kerf': False, 'draw_kerf_invisible': False, 'piece_grid': False}
-        )
-        resp = HttpResponse(pdf_bytes, content_type='application/pdf')
+            _borrar_archivo(destino)
+            raise
+        try:
+            await computo.esperar_async(trabajo)
+        except TimeoutError:
+            # Sin archivo que servir después: el frontend ya llegó aquí como respaldo del snapshot
+            trabajo.futuro.add_done_callback(lambda _futuro: _borrar_archivo(destino))
+            return JsonResponse({'success': False, 'message': 'La generación del PDF tardó demasiado. Intenta nuevamente.'}, status=504)
+        except Exception:
+            _borrar_archivo(destino)
+            raise
         try:
             folio_txt = str(getattr(proyecto, 'public_id', '') or proyecto.codigo)
         except Exception:
             folio_txt = str(proyecto.id)
-        resp['Content-Disposition'] = f'inline; filename="optimizacion_{folio_txt}.pdf"'
-        resp['Cache-Control'] = 'no-store'
-        return resp
+        return _servir_pdf(request, destino, f"optimizacion_{folio_txt}.pdf", temporal=True)
+    except computo.Saturado:
+        return _respuesta_computo_saturado()
+    except Http404:
+        raise
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Error generando PDF desde JSON: {str(e)}'}, status=500)
 
@@ -2755,7 +3244,7 @@ def guardar_layout_manual(request):
         resultado = mat
 
     proyecto.resultado_optimizacion = json.dumps(resultado, ensure_ascii=False)
-    proyecto.save(update_fields=['resultado_optimizacion'])
+    proyecto.save(update_fields=['resultado_optimizacion', 'fecha_modificacion'])
 
     return JsonResponse({'success': True, 'resultado': resultado})
 
@@ -2785,12 +3274,80 @@ def proyectos_optimizador(request):
     return render(request, 'optimizador/proyectos.html', context)
 
 
-@login_required
-@require_http_methods(["POST"])
-def forzar_optimizacion(request, proyecto_id:int):
-    """Genera y persiste el resultado de optimización desde la configuración del proyecto.
-    Útil cuando el proyecto no tiene resultado guardado aún y se quiere exportar PDF o previsualizar.
-    """
+def _optimizar_desde_config(conf_mat, piezas_in, material):
+    """Optimiza un material de la configuración guardada. ``material`` es un dict con
+    nombre/código/medidas (sin acceso a la BD: corre en el pool de core.computo)."""
+    ancho_tablero = conf_mat.get('ancho_custom') or material['ancho']
+    largo_tablero = conf_mat.get('largo_custom') or material['largo']
+    margen_x = conf_mat.get('margen_x', 0)
+    margen_y = conf_mat.get('margen_y', 0)
+    desperdicio_sierra = conf_mat.get('desperdicio_sierra', 3)
+    tapacanto_codigo = conf_mat.get('tapacanto_codigo', '')
+    tapacanto_nombre = conf_mat.get('tapacanto_nombre', '')
+    engine = OptimizationEngine(ancho_tablero, largo_tablero, margen_x, margen_y, desperdicio_sierra)
+    piezas_proc = []
+    for p in piezas_in:
+        piezas_proc.append({
+            'nombre': p['nombre'],
+            'ancho': p['ancho'],
+            'largo': p['largo'],
+            'cantidad': p.get('cantidad', 1),
+            'veta_libre': p.get('veta_libre', False),
+            'tapacantos': p.get('tapacantos', {}) or {}
+        })
+    r = engine.optimizar_piezas(piezas_proc)
+    r['entrada'] = piezas_proc
+    r['material'] = {
+        'nombre': material['nombre'],
+        'codigo': material['codigo'],
+        'ancho_original': material['ancho'],
+        'largo_original': material['largo'],
+        'ancho_usado': ancho_tablero,
+        'largo_usado': largo_tablero
+    }
+    r['config'] = {'margen_x': margen_x, 'margen_y': margen_y, 'kerf': desperdicio_sierra}
+    r['tapacanto'] = { 'codigo': tapacanto_codigo, 'nombre': tapacanto_nombre }
+    return r
+
+
+def _resultado_desde_config(entradas):
+    """Resultado persistible (con folio e historial) para ``[(conf_mat, piezas, material)]``;
+    None si ningún material produjo resultado. Corre en el pool de core.computo."""
+    materiales = []
+    for conf_mat, piezas_in, material in entradas:
+        r = _optimizar_desde_config(conf_mat, piezas_in, material)
+        if r: materiales.append(r)
+    if not materiales:
+        return None
+
+    total_tableros = sum(len(m.get('tableros', [])) for m in materiales)
+    total_piezas = sum(sum(len(t.get('piezas', [])) for t in m.get('tableros', [])) for m in materiales)
+    eficiencias = [m.get('eficiencia') or m.get('eficiencia_promedio') for m in materiales if m]
+    eficiencia_promedio = sum(e for e in eficiencias if e) / max(1, len([e for e in eficiencias if e]))
+    folio = f"OPT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return {
+        'materiales': materiales,
+        'total_tableros': total_tableros,
+        'total_piezas': total_piezas,
+        'eficiencia_promedio': eficiencia_promedio,
+        'ultimo_folio': folio,
+        'historial': [{
+            'folio': folio,
+            'fecha': datetime.now().isoformat(),
+            'materiales': materiales,
+            'total_tableros': total_tableros,
+            'total_piezas': total_piezas,
+            'eficiencia_promedio': eficiencia_promedio,
+        }]
+    }
+
+
+def _forzar_optimizacion_preparar(request, proyecto_id: int):
+    """Parte síncrona de forzar_optimizacion: respuesta si no hay nada que calcular, o
+    ``(proyecto, entradas, actor, organizacion)`` con los materiales ya leídos de la BD.
+
+    El actor se toma aquí porque el resultado se guarda en el hilo de core.computo, donde
+    no hay request de la que deducirlo."""
     proyecto = get_object_or_404(Proyecto, id=proyecto_id)
     # Si ya tiene resultado válido, no recalcular
     try:
@@ -2808,93 +3365,147 @@ def forzar_optimizacion(request, proyecto_id:int):
             return JsonResponse({'success': False, 'message': 'El proyecto no tiene configuración guardada para optimizar.'}, status=400)
         cfg = json.loads(proyecto.configuracion) if isinstance(proyecto.configuracion, str) else proyecto.configuracion
 
-        def optimizar_desde(conf_mat, piezas_in):
+        def entrada_desde(conf_mat, piezas_in):
             material_id = (conf_mat or {}).get('material_id')
             if not (conf_mat and piezas_in and material_id):
                 return None
             material = get_object_or_404(Material, id=material_id)
-            ancho_tablero = conf_mat.get('ancho_custom') or material.ancho
-            largo_tablero = conf_mat.get('largo_custom') or material.largo
-            margen_x = conf_mat.get('margen_x', 0)
-            margen_y = conf_mat.get('margen_y', 0)
-            desperdicio_sierra = conf_mat.get('desperdicio_sierra', 3)
-            tapacanto_codigo = conf_mat.get('tapacanto_codigo', '')
-            tapacanto_nombre = conf_mat.get('tapacanto_nombre', '')
-            engine = OptimizationEngine(ancho_tablero, largo_tablero, margen_x, margen_y, desperdicio_sierra)
-            piezas_proc = []
-            for p in piezas_in:
-                piezas_proc.append({
-                    'nombre': p['nombre'],
-                    'ancho': p['ancho'],
-                    'largo': p['largo'],
-                    'cantidad': p.get('cantidad', 1),
-                    'veta_libre': p.get('veta_libre', False),
-                    'tapacantos': p.get('tapacantos', {}) or {}
-                })
-            r = engine.optimizar_piezas(piezas_proc)
-            r['entrada'] = piezas_proc
-            r['material'] = {
-                'nombre': material.nombre,
-                'codigo': material.codigo,
-                'ancho_original': material.ancho,
-                'largo_original': material.largo,
-                'ancho_usado': ancho_tablero,
-                'largo_usado': largo_tablero
+            return conf_mat, piezas_in, {
+                'nombre': material.nombre, 'codigo': material.codigo,
+                'ancho': material.ancho, 'largo': material.largo,
             }
-            r['config'] = {'margen_x': margen_x, 'margen_y': margen_y, 'kerf': desperdicio_sierra}
-            r['tapacanto'] = { 'codigo': tapacanto_codigo, 'nombre': tapacanto_nombre }
-            return r
 
-        materiales = []
+        entradas = []
         if isinstance(cfg, dict) and isinstance(cfg.get('materiales'), list):
             for mcfg in cfg['materiales']:
                 conf_mat = mcfg.get('configuracion_material') or mcfg.get('config')
                 piezas_in = mcfg.get('piezas') or mcfg.get('entrada')
-                r = optimizar_desde(conf_mat, piezas_in)
-                if r: materiales.append(r)
+                e = entrada_desde(conf_mat, piezas_in)
+                if e: entradas.append(e)
         else:
             conf_mat = cfg.get('configuracion_material') or cfg.get('config')
             piezas_in = cfg.get('piezas') or cfg.get('entrada')
-            r = optimizar_desde(conf_mat, piezas_in)
-            if r: materiales.append(r)
-
-        if not materiales:
-            return JsonResponse({'success': False, 'message': 'No hay configuración suficiente (material y piezas) para optimizar.'}, status=400)
-
-        total_tableros = sum(len(m.get('tableros', [])) for m in materiales)
-        total_piezas = sum(sum(len(t.get('piezas', [])) for t in m.get('tableros', [])) for m in materiales)
-        eficiencias = [m.get('eficiencia') or m.get('eficiencia_promedio') for m in materiales if m]
-        eficiencia_promedio = sum(e for e in eficiencias if e) / max(1, len([e for e in eficiencias if e]))
-        folio = f"OPT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        resultado_persist = {
-            'materiales': materiales,
-            'total_tableros': total_tableros,
-            'total_piezas': total_piezas,
-            'eficiencia_promedio': eficiencia_promedio,
-            'ultimo_folio': folio,
-            'historial': [{
-                'folio': folio,
-                'fecha': datetime.now().isoformat(),
-                'materiales': materiales,
-                'total_tableros': total_tableros,
-                'total_piezas': total_piezas,
-                'eficiencia_promedio': eficiencia_promedio,
-            }]
-        }
-        proyecto.resultado_optimizacion = json.dumps(resultado_persist, ensure_ascii=False)
-        proyecto.total_materiales = len(materiales)
-        proyecto.total_tableros = total_tableros
-        proyecto.total_piezas = total_piezas
-        proyecto.eficiencia_promedio = eficiencia_promedio
-        proyecto.estado = 'optimizado'
-        proyecto.save()
-
-        return JsonResponse({'success': True, 'message': 'Optimización generada y guardada', 'resumen': {
-            'materiales': len(materiales), 'tableros': total_tableros, 'piezas': total_piezas, 'eficiencia': eficiencia_promedio, 'folio': folio
-        }})
+            e = entrada_desde(conf_mat, piezas_in)
+            if e: entradas.append(e)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error al optimizar: {str(e)}'}, status=500)
+
+    if not entradas:
+        return JsonResponse({'success': False, 'message': 'No hay configuración suficiente (material y piezas) para optimizar.'}, status=400)
+    actor = request.user if request.user.is_authenticated else None
+    perfil = getattr(actor, 'usuarioperfiloptimizador', None) if actor else None
+    return proyecto, entradas, actor, getattr(perfil, 'organizacion', None)
+
+
+# Campos que escribe forzar_optimizacion (fecha_modificacion: auto_now no aplica a update())
+CAMPOS_FORZAR_OPTIMIZACION = (
+    'resultado_optimizacion', 'total_materiales', 'total_tableros', 'total_piezas',
+    'eficiencia_promedio', 'estado',
+)
+
+
+def _guardar_optimizacion_forzada(proyecto, resultado_persist, actor, organizacion):
+    """Persiste solo los campos del resultado (UPDATE sin pisar el resto de la fila, que
+    pudo cambiar mientras se calculaba) y hace a mano lo que harían las señales de save():
+    resumen, evento para el Operador y auditoría con el actor de la request."""
+    from django.db import transaction
+    from core.eventos import publicar_proyecto
+    from core.models import ProyectoResumen
+    antes = {campo: getattr(proyecto, campo) for campo in CAMPOS_FORZAR_OPTIMIZACION}
+    valores = {
+        'resultado_optimizacion': json.dumps(resultado_persist, ensure_ascii=False),
+        'total_materiales': len(resultado_persist['materiales']),
+        'total_tableros': resultado_persist['total_tableros'],
+        'total_piezas': resultado_persist['total_piezas'],
+        'eficiencia_promedio': resultado_persist['eficiencia_promedio'],
+        'estado': 'optimizado',
+    }
+    for campo, valor in valores.items():
+        setattr(proyecto, campo, valor)
+    proyecto.fecha_modificacion = timezone.now()
+    with transaction.atomic():
+        Proyecto.objects.filter(pk=proyecto.pk).update(fecha_modificacion=proyecto.fecha_modificacion, **valores)
+        try:
+            with transaction.atomic():
+                ProyectoResumen.sincronizar(proyecto)
+        except Exception:
+            logger.exception("No se pudo sincronizar el resumen del proyecto %s", proyecto.pk)
+            ProyectoResumen.objects.filter(proyecto_id=proyecto.pk).delete()
+        # Mismo formato que la auditoría de core.signals; la eficiencia (DecimalField) tal
+        # como quedó redondeada en la BD
+        guardada = Proyecto.objects.filter(pk=proyecto.pk).values_list('eficiencia_promedio', flat=True).first()
+        cambios = {'resultado_optimizacion': '(modificado)'}
+        for campo in CAMPOS_FORZAR_OPTIMIZACION[1:]:
+            previo, nuevo = antes[campo], valores[campo]
+            if campo == 'eficiencia_promedio':
+                previo, nuevo = float(previo or 0), float(guardada or 0)
+            if previo != nuevo:
+                cambios[campo] = [previo, nuevo]
+        try:
+            registrar_auditoria(
+                actor=actor,
+                organizacion=organizacion,
+                verb='UPDATE',
+                target_model='Proyecto',
+                target_id=str(proyecto.pk),
+                target_repr=str(proyecto),
+                changes=cambios,
+            )
+        except Exception:
+            pass
+        try:
+            publicar_proyecto(proyecto)
+        except Exception:
+            pass
 
+
+async def forzar_optimizacion(request, proyecto_id:int):
+    """Genera y persiste el resultado de optimización desde la configuración del proyecto.
+    Útil cuando el proyecto no tiene resultado guardado aún y se quiere exportar PDF o previsualizar.
+
+    El motor corre en el pool de core.computo y el resultado se guarda al terminar; si no
+    termina en COMPUTO_ESPERA_SEGUNDOS se responde 202 y el estado del trabajo trae la
+    misma respuesta JSON en ``respuesta``.
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import HttpResponseNotAllowed
+    from core import computo
+
+    denegado = await _login_requerido(request)
+    if denegado is not None:
+        return denegado
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    preparado = await sync_to_async(_forzar_optimizacion_preparar)(request, proyecto_id)
+    if isinstance(preparado, HttpResponse):
+        return preparado
+    proyecto, entradas, actor, organizacion = preparado
+    usuario_id = getattr(actor, 'id', None)
+    sin_materiales = {'success': False, 'message': 'No hay configuración suficiente (material y piezas) para optimizar.'}
+
+    def _guardar(resultado_persist):
+        if resultado_persist is None:
+            return sin_materiales
+        _guardar_optimizacion_forzada(proyecto, resultado_persist, actor, organizacion)
+        return {'success': True, 'message': 'Optimización generada y guardada', 'resumen': {
+            'materiales': proyecto.total_materiales, 'tableros': proyecto.total_tableros,
+            'piezas': proyecto.total_piezas, 'eficiencia': proyecto.eficiencia_promedio,
+            'folio': resultado_persist['ultimo_folio'],
+        }}
+
+    try:
+        trabajo = computo.enviar(_resultado_desde_config, entradas, organizacion_id=proyecto.organizacion_id,
+                                 usuario_id=usuario_id, tipo='optimizacion', al_terminar=_guardar)
+    except computo.Saturado:
+        return _respuesta_computo_saturado()
+    try:
+        await computo.esperar_async(trabajo)
+    except TimeoutError:
+        return _respuesta_computo_pendiente(request, trabajo)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Error al optimizar: {str(e)}'}, status=500)
+    respuesta = trabajo.respuesta or sin_materiales
+    return JsonResponse(respuesta, status=200 if respuesta.get('success') else 400)
 
 def js_test(request):
     """Vista de prueba para JavaScript"""
@@ -2999,8 +3610,8 @@ def crear_cliente_ajax(request):
             )
             # Auditoría: registrar creación de cliente
             try:
-                from core.models import AuditLog
-                AuditLog.objects.create(
+                from core.audit import registrar_auditoria
+                registrar_auditoria(
                     actor=request.user if getattr(request, 'user', None) and request.user.is_authenticated else None,
                     organizacion=org,
                     verb='CREATE',
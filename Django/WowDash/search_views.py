@@ -4,9 +4,11 @@ from django.http import JsonResponse
 from django.db.models import Q
 from django.contrib.auth.models import User
 from core.models import Cliente, Proyecto, UsuarioPerfilOptimizador, Organizacion
+from core.db_router import lectura_en_replica
 import json
 
 @login_required
+@lectura_en_replica
 def global_search(request):
     """Búsqueda global en la aplicación"""
     query = request.GET.get('q', '').strip()
@@ -87,6 +87,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Read-your-writes para la réplica de lectura (no hace nada si no hay DATABASE_REPLICA_URL)
+    'core.middleware.ReplicaStickyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'WowDash.middleware.RequireLoginMiddleware',
@@ -195,6 +197,46 @@ else:
                 }
             }
 
+# Persistencia de conexión DB (se aplica a cada entrada de DATABASES; Django no lee un
+# CONN_MAX_AGE global). Bajo ASGI (render.yaml) cada request síncrona corre en un hilo
+# distinto y una conexión persistente por hilo se queda abierta hasta agotar el servidor:
+# por defecto 0. Bajo WSGI puede subirse con DB_CONN_MAX_AGE (segundos).
+for _db in DATABASES.values():
+    _db['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+    _db['CONN_HEALTH_CHECKS'] = True  # Django >=4.2
+
+# Réplica de solo lectura opcional (core.db_router): DATABASE_REPLICA_URL con el mismo formato que DATABASE_URL.
+# Solo la usan las vistas marcadas con @lectura_en_replica.
+DATABASE_REPLICA_ALIAS = 'replica'
+database_replica_url = os.getenv('DATABASE_REPLICA_URL')
+if database_replica_url and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    parsed_replica = urlparse(database_replica_url)
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': parsed_replica.path.lstrip('/') or DATABASES['default']['NAME'],
+        'USER': parsed_replica.username or DATABASES['default']['USER'],
+        'PASSWORD': parsed_replica.password or DATABASES['default']['PASSWORD'],
+        'HOST': parsed_replica.hostname,
+        'PORT': str(parsed_replica.port or ''),
+        # La réplica comparte datos con default: los tests no deben crear otra BD
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SEGUNDOS = int(os.getenv('DATABASE_REPLICA_STICKY_SEGUNDOS', '10'))
+DATABASE_REPLICA_MAX_LAG_SEGUNDOS = float(os.getenv('DATABASE_REPLICA_MAX_LAG_SEGUNDOS', '10'))
+DATABASE_REPLICA_CHEQUEO_SEGUNDOS = float(os.getenv('DATABASE_REPLICA_CHEQUEO_SEGUNDOS', '5'))
+
+# Cache: por defecto LocMem (por proceso). Con REDIS_URL (requiere el paquete redis) se comparte
+# entre workers y las invalidaciones de core.catalogo / core.auth_utils son inmediatas en todos.
+redis_url = os.getenv('REDIS_URL')
+if redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url,
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -274,7 +316,50 @@ SESSION_SAVE_EVERY_REQUEST = True
 # Media files (user-generated content)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-
-# Persistencia de conexiÃ³n DB: reutiliza conexiones y realiza health checks para evitar errores
-CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '300'))  # segundos
-CONN_HEALTH_CHECKS = True  # Django >=4.2
\ No newline at end of file
+# MEDIA_ROOT está en un disco persistente (sobrevive a los deploys). Sin esto y con el
+# almacenamiento local, manage.py archivar_layouts se niega a mover layouts fuera de la BD.
+ARCHIVO_ALMACENAMIENTO_DURABLE = os.getenv('ARCHIVO_ALMACENAMIENTO_DURABLE', '').lower() in ('1', 'true', 'yes')
+
+# Asignador de IDs (core.secuencias): cantidad de public_id que cada worker reserva de una vez.
+# 1 = ids estrictamente consecutivos; >1 reduce contención a cambio de huecos entre workers.
+SECUENCIA_PUBLIC_ID_BLOQUE = int(os.getenv('SECUENCIA_PUBLIC_ID_BLOQUE', '1'))
+# Auditoría (core.audit): escritura por lotes en un hilo de fondo. False = escritura síncrona.
+AUDITORIA_ASINCRONA = os.getenv('AUDITORIA_ASINCRONA', '1').lower() in ('1', 'true', 'yes')
+AUDITORIA_COLA_MAX = int(os.getenv('AUDITORIA_COLA_MAX', '1000'))
+# Retención de auditoría (manage.py depurar_auditoria): días a conservar el detalle por verbo.
+# None = conservar siempre. Lo depurado queda exportado en MEDIA_ROOT/archivo/auditoria/ y agregado en AuditLogResumen.
+AUDITORIA_RETENCION_DIAS = {
+    'LOGIN': 90,
+    'MOVE': 180,
+    'EDIT': 180,
+    'UPDATE': 365,
+    'BULK': 365,
+}
+AUDITORIA_RETENCION_DIAS_DEFAULT = int(os.getenv('AUDITORIA_RETENCION_DIAS_DEFAULT', '730'))
+# Cache entre requests del perfil/organización de get_auth_context (core.auth_utils).
+# Se invalida al guardar perfil u organización. Solo se usa con un cache compartido (REDIS_URL):
+# con LocMem la invalidación sería por proceso y el rol se lee de la BD en cada request.
+AUTH_CONTEXT_CACHE_SEGUNDOS = int(os.getenv('AUTH_CONTEXT_CACHE_SEGUNDOS', '60'))
+# Impresión de etiquetas vía CUPS (core.impresion): descubrimiento cacheado y cola por impresora.
+IMPRESION_LP_CMD = os.getenv('IMPRESION_LP_CMD', 'lp')
+IMPRESION_LPSTAT_CMD = os.getenv('IMPRESION_LPSTAT_CMD', 'lpstat')
+IMPRESION_DESCUBRIMIENTO_SEGUNDOS = int(os.getenv('IMPRESION_DESCUBRIMIENTO_SEGUNDOS', '60'))
+IMPRESION_VENTANA_SEGUNDOS = float(os.getenv('IMPRESION_VENTANA_SEGUNDOS', '0.3'))
+IMPRESION_REINTENTOS = int(os.getenv('IMPRESION_REINTENTOS', '3'))
+# Avisos a enchapadores (core.notificaciones): bulk_create en un hilo de fondo tras el commit.
+# Con '0' se crean en el mismo proceso al hacer commit (tests, comandos de gestión).
+NOTIFICACIONES_EN_SEGUNDO_PLANO = os.getenv('NOTIFICACIONES_EN_SEGUNDO_PLANO', '1').lower() in ('1', 'true', 'yes')
+# Pool de cómputo (core.computo) para PDF y motor de optimización fuera del event loop.
+# COMPUTO_PROCESOS trabajos a la vez por worker web, como mucho COMPUTO_MAX_POR_ORGANIZACION
+# de una misma organización; con más de COMPUTO_COLA_MAX en espera se responde 503. Si un
+# trabajo no termina en COMPUTO_ESPERA_SEGUNDOS la vista responde 202 y el cliente consulta
+# /api/computo/trabajos/<id>. Con COMPUTO_EN_PROCESOS='0' se usan hilos (desarrollo, tests).
+# Los PDF grandes se dibujan por grupos de materiales en paralelo si una organización puede
+# ocupar más de un cupo. COMPUTO_MAX_PARTES_POR_ORGANIZACION (opcional; vacío = el límite
+# general) sube ese límite solo para las partes, sin tomar nunca el último cupo libre.
+COMPUTO_PROCESOS = int(os.getenv('COMPUTO_PROCESOS', str(min(2, os.cpu_count() or 1))))
+COMPUTO_MAX_POR_ORGANIZACION = int(os.getenv('COMPUTO_MAX_POR_ORGANIZACION', '1'))
+COMPUTO_MAX_PARTES_POR_ORGANIZACION = int(os.getenv('COMPUTO_MAX_PARTES_POR_ORGANIZACION', '0')) or None
+COMPUTO_COLA_MAX = int(os.getenv('COMPUTO_COLA_MAX', '50'))
+COMPUTO_ESPERA_SEGUNDOS = float(os.getenv('COMPUTO_ESPERA_SEGUNDOS', '20'))
+COMPUTO_EN_PROCESOS = os.getenv('COMPUTO_EN_PROCESOS', '1').lower() in ('1', 'true', 'yes')
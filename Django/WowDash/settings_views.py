@@ -145,8 +145,10 @@ def api_label_test_zpl(request):
     return HttpResponse(zpl, content_type='text/plain; charset=utf-8')
 
 
-def _generar_zpl_con_config(cfg, pieza):
-    """Genera ZPL usando la configuración dinámica con posiciones arrastrables."""
+def _generar_zpl_con_config(cfg, pieza, copias=1, guardar_config=True):
+    """Genera ZPL usando la configuración dinámica con posiciones arrastrables.
+    ``guardar_config=False`` omite ^JUS (en un lote basta con guardarla en la primera etiqueta).
+    """
     DPI = 300
     def mm2d(v): return round(v * DPI / 25.4)
     def _z(s, mx): return str(s or '')[:mx].replace('^', '').replace('~', '')
@@ -256,5 +258,7 @@ def _generar_zpl_con_config(cfg, pieza):
         py = pos_y('pie', 88)
         lines.append(f'^FO{px},{py}^CF0,{f_pie}^FD{_z(pie, 30)}^FS')
 
-    lines += ['^JUS', '^PQ1', '^XZ']
+    if guardar_config:
+        lines.append('^JUS')
+    lines += [f'^PQ{copias}', '^XZ']
     return '\n'.join(lines)
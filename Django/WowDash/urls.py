@@ -39,6 +39,7 @@ from WowDash import optimizer_views
 from WowDash import optimizer_autoservicio_clone
 from WowDash import operator_views
 from WowDash import chat_views
+from WowDash import eventos_views
 from WowDash import search_views
 from WowDash import api_views
 from WowDash import configurador_views
@@ -68,6 +69,7 @@ urlpatterns = [
     path('proyectos/asignar-operador/', core_views.asignar_operador, name='asignar_operador'),
     path('api/operador/notificaciones/', core_views.operador_notificaciones_api, name='operador_notificaciones_api'),
     path('api/enchapador/notificaciones/', core_views.enchapador_notificaciones_api, name='enchapador_notificaciones_api'),
+    path('api/eventos', eventos_views.eventos_usuario, name='eventos_usuario'),
 
 # clientes routes
     path('clientes/', core_views.clientes_list, name='clientes_lista'),
@@ -179,6 +181,7 @@ urlpatterns = [
     path('chat/perfil/<int:user_id>/', chat_views.chat_perfil, name='chat_perfil'),
     path('chat/buscar-usuarios/', chat_views.buscar_usuarios, name='buscar_usuarios'),
     path('chat/unread-summary/', chat_views.unread_summary, name='chat_unread_summary'),
+    path('chat/eventos/', eventos_views.eventos_usuario, name='chat_eventos'),
 
 # api minimal
     path('api/auth/login', api_views.auth_login, name='api_auth_login'),
@@ -192,10 +195,14 @@ urlpatterns = [
     path('api/operador/proyectos/<int:proyecto_id>/piezas/marcar-todas', api_views.operador_proyecto_marcar_todas_cortadas_api, name='api_operador_proyecto_marcar_todas'),
     path('api/operador/proyectos/<int:proyecto_id>/piezas-batch', api_views.operador_piezas_batch_api, name='api_operador_piezas_batch'),
     path('api/operador/proyectos/<int:proyecto_id>/piezas/<str:pieza_id>/imprimir-etiqueta', api_views.imprimir_etiqueta_pieza_api, name='api_imprimir_etiqueta_pieza'),
+    path('api/operador/proyectos/<int:proyecto_id>/etiquetas', api_views.imprimir_etiquetas_lote_api, name='api_imprimir_etiquetas_lote'),
     path('api/operador/proyectos/<int:proyecto_id>/piezas/<str:pieza_id>', api_views.operador_pieza_estado_api, name='api_operador_pieza_estado'),
     path('api/operador/proyectos/<int:proyecto_id>/completar', api_views.operador_proyecto_completar_api, name='api_operador_proyecto_completar'),
     path('api/operador/proyectos/<int:proyecto_id>/tablero-completado', api_views.operador_tablero_completado_api, name='api_operador_tablero_completado'),
     path('api/impresoras', api_views.impresoras_list_api, name='api_impresoras_list'),
+    path('api/impresion/trabajos/<str:trabajo_id>', api_views.impresion_trabajo_estado_api, name='api_impresion_trabajo_estado'),
+    path('api/computo/trabajos/<str:trabajo_id>', api_views.computo_trabajo_estado_api, name='api_computo_trabajo_estado'),
+    path('api/computo/metricas', api_views.computo_metricas_api, name='api_computo_metricas'),
     path('api/proyectos/<int:proyecto_id>/resumen', api_views.proyecto_resumen_api, name='api_proyecto_resumen'),
     path('api/proyectos/resumen-batch', api_views.proyectos_resumen_batch_api, name='api_proyectos_resumen_batch'),
 
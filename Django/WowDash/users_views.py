@@ -6,7 +6,8 @@ from django.http import JsonResponse, HttpResponseForbidden
 from django.db.models import Q
 from django.db import transaction
 from django.utils import timezone
-from core.models import UsuarioPerfilOptimizador, AuditLog
+from core.models import UsuarioPerfilOptimizador
+from core.audit import registrar_auditoria
 from core.forms import UsuarioForm, UsuarioPerfilForm
 from core.auth_utils import get_auth_context, is_support, is_org_admin
 
@@ -19,7 +20,7 @@ def _audit(request, verb: str, target_user: User):
         if ctx.get('organization_id'):
             from core.models import Organizacion
             organizacion = Organizacion.objects.filter(id=ctx['organization_id']).first()
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=actor,
             organizacion=organizacion,
             verb=verb,
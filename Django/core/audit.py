@@ -0,0 +1,199 @@
+"""Escritura diferida y por lotes del registro de auditoría (AuditLog).
+
+Las vistas y señales llaman a ``registrar_auditoria(...)`` en lugar de
+``AuditLog.objects.create(...)``:
+
+- Dentro de una request (ver ``core.middleware.RequestUserMiddleware``) las entradas se
+  acumulan en un buffer y se envían juntas al terminar la respuesta. Una entrada
+  registrada dentro de ``atomic()`` entra al buffer recién en el commit: si la transacción
+  se revierte, la entrada se descarta con ella.
+- El envío va a un hilo escritor por proceso con cola acotada (``core.segundo_plano``)
+  que inserta con ``bulk_create``. Si la cola está llena, el llamador escribe el lote él
+  mismo (backpressure): nunca se descartan entradas.
+- Con ``AUDITORIA_ASINCRONA = False`` los lotes se escriben de forma síncrona.
+- ``auditoria_agrupada(...)`` resume en una sola entrada los guardados de una operación
+  masiva (importaciones CSV, cargas de catálogo) en lugar de una entrada por fila.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .segundo_plano import ColaEnSegundoPlano
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _buffers():
+    pila = getattr(_local, 'buffers', None)
+    if pila is None:
+        pila = _local.buffers = []
+    return pila
+
+
+def registrar_auditoria(**campos):
+    """Encola una entrada de auditoría. Acepta los mismos campos que AuditLog."""
+    from core.models import AuditLog
+    entrada = AuditLog(**campos)
+    pila = _buffers()
+    if not pila:
+        _despachar([entrada])
+    elif connection.in_atomic_block:
+        # Solo entra al lote si la transacción (o el savepoint) se confirma
+        buffer = pila[-1]
+        transaction.on_commit(lambda: _agregar(buffer, entrada))
+    else:
+        pila[-1].append(entrada)
+
+
+def _agregar(buffer, entrada):
+    if any(b is buffer for b in _buffers()):
+        buffer.append(entrada)
+    else:
+        # El bloque ya se envió (commit posterior a la request): va sola
+        _despachar([entrada])
+
+
+@contextmanager
+def buffer_auditoria():
+    """Acumula las entradas registradas dentro del bloque y las envía en un solo lote al salir."""
+    pila = _buffers()
+    pila.append([])
+    try:
+        yield pila[-1]
+    finally:
+        entradas = pila.pop()
+        if entradas:
+            _despachar(entradas)
+
+
+# Máximo de ids que se guardan en la entrada resumen de una operación masiva
+MAX_IDS_AGRUPADOS = 100
+
+
+class _Agrupacion:
+    __slots__ = ('descripcion', 'actor', 'organizacion', 'conteos', 'ids', 'total', 'datos')
+
+    def __init__(self, descripcion, actor, organizacion):
+        self.descripcion = descripcion
+        self.actor = actor
+        self.organizacion = organizacion
+        self.conteos = {}
+        self.ids = {}
+        self.total = 0
+        # Metadatos libres de la operación (se copian a changes)
+        self.datos = {}
+
+    def agregar(self, verb, target_model, target_id):
+        self.sumar(verb, target_model, 1, (target_id,))
+
+    def sumar(self, verb, target_model, cantidad, ids=()):
+        """Suma ``cantidad`` operaciones que no pasan por señales (bulk_create, update())."""
+        if not cantidad:
+            return
+        por_modelo = self.conteos.setdefault(target_model, {})
+        por_modelo[verb] = por_modelo.get(verb, 0) + cantidad
+        lista = self.ids.setdefault(target_model, [])
+        for target_id in ids:
+            if len(lista) >= MAX_IDS_AGRUPADOS:
+                break
+            lista.append(str(target_id))
+        self.total += cantidad
+
+    def entrada(self):
+        modelos = sorted(self.conteos)
+        changes = {'operacion': self.descripcion, 'total': self.total, **self.datos}
+        for modelo in modelos:
+            changes[modelo] = dict(self.conteos[modelo])
+            changes[modelo]['ids'] = self.ids[modelo]
+            changes[modelo]['ids_truncados'] = sum(self.conteos[modelo].values()) > len(self.ids[modelo])
+        return dict(
+            actor=self.actor,
+            organizacion=self.organizacion,
+            verb='BULK',
+            target_model=','.join(modelos)[:120],
+            target_id=str(self.total),
+            target_repr=self.descripcion,
+            changes=changes,
+        )
+
+
+def agrupacion_activa():
+    """Devuelve la operación masiva en curso en este hilo (o None)."""
+    return getattr(_local, 'agrupacion', None)
+
+
+@contextmanager
+def auditoria_agrupada(descripcion, actor=None, organizacion=None):
+    """Durante el bloque, las señales de auditoría no crean una entrada por objeto:
+    acumulan conteos e ids y al salir se registra una única entrada ``BULK``.
+    Los bloques anidados se suman al externo.
+    """
+    if agrupacion_activa() is not None:
+        yield agrupacion_activa()
+        return
+    grupo = _local.agrupacion = _Agrupacion(descripcion, actor, organizacion)
+    try:
+        yield grupo
+    finally:
+        _local.agrupacion = None
+        if grupo.total or grupo.datos:
+            try:
+                registrar_auditoria(**grupo.entrada())
+            except Exception:
+                logger.exception("No se pudo registrar la auditoría agrupada de %s", descripcion)
+
+
+def _despachar(entradas):
+    # Si hay una transacción abierta, esperar al commit (si se revierte, la auditoría también)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _enviar(entradas))
+    else:
+        _enviar(entradas)
+
+
+def _enviar(entradas):
+    if not getattr(settings, 'AUDITORIA_ASINCRONA', True):
+        _escribir(entradas)
+        return
+    _escritor.enviar(entradas)
+
+
+def _escribir(entradas):
+    from core.models import AuditLog
+    try:
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(entradas, batch_size=500)
+        return
+    except Exception:
+        logger.warning("Falló el lote de %s entradas de auditoría; se reintenta fila por fila",
+                       len(entradas), exc_info=True)
+    # El lote junta entradas de requests distintas: una fila inválida no debe perder las demás
+    for entrada in entradas:
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create([entrada])
+        except Exception:
+            # Silenciar errores de auditoría para no romper la operación principal
+            logger.exception("No se pudo escribir la entrada de auditoría %s %s:%s",
+                             entrada.verb, entrada.target_model, entrada.target_id)
+
+
+def _juntar(lote, extra):
+    lote.extend(extra)
+    return lote
+
+
+_escritor = ColaEnSegundoPlano(
+    'auditoria-escritor', _escribir,
+    maximo=lambda: getattr(settings, 'AUDITORIA_COLA_MAX', 1000), combinar=_juntar,
+)
+
+
+def vaciar_auditoria(timeout=None):
+    """Espera a que el escritor termine de insertar lo encolado (tests, apagado del proceso)."""
+    _escritor.vaciar(timeout)
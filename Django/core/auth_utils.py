@@ -7,6 +7,8 @@ import hashlib
 from django.conf import settings
 from django.utils import timezone
 
+from .cache_utils import cache_compartido
+
 
 def _b64url_encode(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
@@ -70,21 +72,113 @@ def get_token_claims(request) -> Optional[Dict[str, Any]]:
     return jwt_decode(token)
 
 
-def get_auth_context(request) -> Dict[str, Any]:
-    """Obtiene contexto de autenticación unificado desde JWT o sesión.
-    Retorna: {
-      'user_id', 'username', 'organization_id', 'organization_is_general', 'role',
-      'is_support', 'organization' (obj o None), 'perfil' (obj o None)
-    }
+# ── Cache del contexto de autenticación ─────────────────────────────────────
+# Por request: el contexto se calcula una vez y se guarda en la request.
+# Entre requests: perfil + organización por usuario (y organización por id para JWT)
+# en el cache de Django, validados contra tokens de versión que se renuevan al guardar
+# UsuarioPerfilOptimizador u Organizacion (ver core.signals). Solo con un cache
+# compartido: con LocMem la invalidación no llegaría a los otros workers y un usuario
+# degradado o desactivado conservaría su rol ahí; en ese caso se consulta la BD.
+_ATTR_REQUEST = '_auth_context_base'
+
+
+def _clave_version(tipo: str, obj_id) -> str:
+    return f"authctx:v:{tipo}:{obj_id}"
+
+
+def invalidar_contexto(tipo: str, obj_id) -> None:
+    """Renueva el token de versión de un usuario ('user') u organización ('org')."""
+    from django.core.cache import cache
+    import uuid
+    try:
+        cache.set(_clave_version(tipo, obj_id), uuid.uuid4().hex, None)
+    except Exception:
+        pass
+
+
+def _timeout_cache() -> int:
+    return int(getattr(settings, 'AUTH_CONTEXT_CACHE_SEGUNDOS', 60))
+
+
+def _org_cacheada(org_id):
+    """Organizacion por id (ruta JWT), cacheada entre requests."""
+    from django.core.cache import cache
+    from core.models import Organizacion
+    if not cache_compartido():
+        return Organizacion.objects.filter(id=org_id).first()
+    clave = f"authctx:org:{org_id}"
+    clave_v = _clave_version('org', org_id)
+    try:
+        valores = cache.get_many([clave, clave_v])
+    except Exception:
+        valores = {}
+    entrada = valores.get(clave)
+    if entrada and entrada[0] == valores.get(clave_v):
+        return entrada[1]
+    org = Organizacion.objects.filter(id=org_id).first()
+    try:
+        cache.set(clave, (valores.get(clave_v), org), _timeout_cache())
+    except Exception:
+        pass
+    return org
+
+
+def _perfil_cacheado(user):
+    """(perfil, organizacion) del usuario de sesión, cacheados entre requests.
+    Al reutilizarlo se deja en la caché de relaciones del user para que
+    ``user.usuarioperfiloptimizador`` tampoco consulte la BD.
     """
-    from core.models import UsuarioPerfilOptimizador, Organizacion
+    from django.core.cache import cache
+    from core.models import UsuarioPerfilOptimizador
+    compartido = cache_compartido()
+    clave = f"authctx:user:{user.id}"
+    clave_v = _clave_version('user', user.id)
+    try:
+        valores = cache.get_many([clave, clave_v]) if compartido else {}
+    except Exception:
+        valores = {}
+    entrada = valores.get(clave)
+    if entrada and entrada[0] == valores.get(clave_v):
+        org_id, version_org, perfil = entrada[1], entrada[2], entrada[3]
+        if org_id is None or cache.get(_clave_version('org', org_id)) == version_org:
+            if perfil is not None:
+                rel = UsuarioPerfilOptimizador._meta.get_field('user')
+                rel.remote_field.set_cached_value(user, perfil)
+                rel.set_cached_value(perfil, user)
+            return perfil, (perfil.organizacion if perfil else None)
+
+    try:
+        perfil = UsuarioPerfilOptimizador.objects.select_related('organizacion').get(user_id=user.id)
+    except UsuarioPerfilOptimizador.DoesNotExist:
+        perfil = None
+    org = perfil.organizacion if perfil else None
+    org_id = getattr(org, 'id', None)
+    if compartido:
+        try:
+            version_org = cache.get(_clave_version('org', org_id)) if org_id else None
+            cache.set(clave, (valores.get(clave_v), org_id, version_org, perfil), _timeout_cache())
+        except Exception:
+            pass
+    if perfil is not None:
+        rel = UsuarioPerfilOptimizador._meta.get_field('user')
+        rel.remote_field.set_cached_value(user, perfil)
+        rel.set_cached_value(perfil, user)
+    return perfil, org
+
+
+def get_perfil_usuario(user):
+    """Perfil del usuario de sesión (cacheado entre requests) o None."""
+    return _perfil_cacheado(user)[0]
+
+
+def _contexto_base(request) -> Dict[str, Any]:
     claims = get_token_claims(request)
     if claims:
         org_id = claims.get('organization_id')
         org = None
         try:
             if org_id:
-                org = Organizacion.objects.filter(id=org_id).first()
+                org = _org_cacheada(org_id)
         except Exception:
             org = None
         is_general = bool(claims.get('organization_is_general') or (org.is_general if org else False))
@@ -97,6 +191,7 @@ def get_auth_context(request) -> Dict[str, Any]:
             'is_support': is_general,
             'organization': org,
             'perfil': None,
+            '_jwt': True,
         }
     # Fallback sesión
     user = getattr(request, 'user', None)
@@ -106,19 +201,12 @@ def get_auth_context(request) -> Dict[str, Any]:
     is_general = False
     if user and user.is_authenticated:
         try:
-            perfil = user.usuarioperfiloptimizador
-            org = perfil.organizacion
-            role = perfil.rol
+            perfil, org = _perfil_cacheado(user)
+            role = perfil.rol if perfil else None
             is_general = bool(org.is_general) if org else False
         except Exception:
             perfil = None
 
-    # Si el super_admin tiene un rol activo en sesión, usarlo
-    if role == 'super_admin' and hasattr(request, 'session'):
-        rol_activo = request.session.get('superadmin_rol_activo')
-        if rol_activo:
-            role = rol_activo
-
     return {
         'user_id': getattr(user, 'id', None),
         'username': getattr(user, 'username', None),
@@ -128,9 +216,37 @@ def get_auth_context(request) -> Dict[str, Any]:
         'is_support': bool(perfil and perfil.rol == 'super_admin'),
         'organization': org,
         'perfil': perfil,
+        '_jwt': False,
     }
 
 
+def get_auth_context(request) -> Dict[str, Any]:
+    """Obtiene contexto de autenticación unificado desde JWT o sesión.
+    Retorna: {
+      'user_id', 'username', 'organization_id', 'organization_is_general', 'role',
+      'is_support', 'organization' (obj o None), 'perfil' (obj o None)
+    }
+    Se calcula una vez por request (y perfil/organización se cachean entre requests).
+    """
+    base = getattr(request, _ATTR_REQUEST, None)
+    if base is None:
+        base = _contexto_base(request)
+        try:
+            setattr(request, _ATTR_REQUEST, base)
+        except Exception:
+            pass
+    ctx = {k: v for k, v in base.items() if k != '_jwt'}
+
+    # Si el super_admin tiene un rol activo en sesión, usarlo (se lee en cada llamada:
+    # puede cambiar dentro de la misma request)
+    if not base['_jwt'] and ctx['role'] == 'super_admin' and hasattr(request, 'session'):
+        rol_activo = request.session.get('superadmin_rol_activo')
+        if rol_activo:
+            ctx['role'] = rol_activo
+
+    return ctx
+
+
 def is_support(ctx: Dict[str, Any]) -> bool:
     return bool(ctx.get('organization_is_general') or ctx.get('is_support') or ctx.get('role') == 'super_admin')
 
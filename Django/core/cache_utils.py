@@ -0,0 +1,19 @@
+"""Utilidades sobre el cache de Django.
+
+Con el cache LocMem por defecto cada worker tiene su propio cache: una invalidación hecha
+en un proceso no llega a los demás. Lo que no tolera datos viejos (permisos, payloads
+grandes por proyecto) se cachea solo si ``cache_compartido()``; con ``REDIS_URL`` lo es.
+"""
+from django.conf import settings
+
+# Backends que viven dentro de cada proceso
+_BACKENDS_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_compartido() -> bool:
+    """True si el cache ``default`` es compartido entre procesos (Redis, Memcached, BD, archivos)."""
+    backend = (getattr(settings, 'CACHES', None) or {}).get('default', {}).get('BACKEND', '')
+    return bool(backend) and backend not in _BACKENDS_LOCALES
@@ -0,0 +1,113 @@
+"""Cache versionado del catálogo (Material / Tapacanto) por organización.
+
+- Cada organización tiene un token de versión en el cache de Django; las listas se
+  guardan bajo una clave que incluye ese token, así que renovar el token invalida
+  todo lo cacheado de la organización sin tener que borrar claves.
+- El token se renueva en post_save/post_delete de Material y Tapacanto (core.signals)
+  y, para escrituras que no pasan por señales (bulk_create, update()), llamando a
+  ``invalidar_catalogo(org_id)`` explícitamente.
+- Con un cache compartido (``REDIS_URL``) el token vive en el cache sin expiración y se
+  renueva solo al escribir. Con el cache LocMem por defecto cada worker tendría su propio
+  token, así que la versión es un contador en la tabla ``Secuencia`` (``catalogo:<org>``)
+  que se incrementa al escribir: todos los workers ven la misma versión de inmediato.
+- ``etag_catalogo`` deriva un ETag de la versión para responder 304 a clientes al día.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+
+from .cache_utils import cache_compartido
+
+# Clave de "todas las organizaciones" (super admin / soporte)
+TODAS = 'todas'
+# Las listas de versiones viejas dejan de leerse; que expiren solas
+TIMEOUT_DATOS = 24 * 3600
+
+
+def _org_clave(org_id):
+    return TODAS if org_id is None else str(org_id)
+
+
+def _clave_version(org_id) -> str:
+    return f"catalogo:v:{_org_clave(org_id)}"
+
+
+def _contador_version(org_id) -> str:
+    return f"catalogo:{_org_clave(org_id)}"
+
+
+def version_catalogo(org_id) -> str:
+    if not cache_compartido():
+        from core.secuencias import valor_contador
+        return str(valor_contador(_contador_version(org_id)))
+    clave = _clave_version(org_id)
+    version = cache.get(clave)
+    if version is None:
+        # add() no pisa un token creado en paralelo por otro proceso
+        nuevo = uuid.uuid4().hex
+        cache.add(clave, nuevo, None)
+        version = cache.get(clave) or nuevo
+    return version
+
+
+def _renovar_version(org_id) -> None:
+    orgs = {_org_clave(org_id): org_id, TODAS: None}
+    try:
+        if cache_compartido():
+            cache.set_many({_clave_version(o): uuid.uuid4().hex for o in orgs.values()}, None)
+        else:
+            from core.secuencias import incrementar_contador
+            for o in orgs.values():
+                incrementar_contador(_contador_version(o))
+    except Exception:
+        pass
+
+
+def invalidar_catalogo(org_id) -> None:
+    """Renueva la versión del catálogo de la organización (y la vista global).
+
+    Dentro de una transacción se difiere al commit: renovar antes permitiría que otra
+    request cachee bajo la versión nueva los datos todavía sin confirmar."""
+    transaction.on_commit(lambda: _renovar_version(org_id))
+
+
+def _modelo(tipo):
+    from core.models import Material, Tapacanto
+    return Material if tipo == 'material' else Tapacanto
+
+
+def catalogo_org(tipo: str, org_id=None) -> list:
+    """Lista de instancias (activas e inactivas, por nombre) de ``tipo`` ('material' o
+    'tapacanto') de la organización; ``org_id=None`` = todas las organizaciones."""
+    clave = f"catalogo:{tipo}:{_org_clave(org_id)}:{version_catalogo(org_id)}"
+    datos = cache.get(clave)
+    if datos is None:
+        qs = _modelo(tipo).objects.order_by('nombre')
+        if org_id is not None:
+            qs = qs.filter(organizacion_id=org_id)
+        datos = list(qs)
+        cache.set(clave, datos, TIMEOUT_DATOS)
+    return datos
+
+
+def payload_cacheado(nombre: str, org_id, construir):
+    """Cachea ``construir()`` (p.ej. el JSON de un endpoint) bajo la versión actual del catálogo."""
+    clave = f"catalogo:payload:{nombre}:{_org_clave(org_id)}:{version_catalogo(org_id)}"
+    datos = cache.get(clave)
+    if datos is None:
+        datos = construir()
+        cache.set(clave, datos, TIMEOUT_DATOS)
+    return datos
+
+
+def etag_catalogo(org_id, *extra) -> str:
+    base = ":".join([_org_clave(org_id), version_catalogo(org_id), *map(str, extra)])
+    return 'W/"cat-' + hashlib.md5(base.encode('utf-8')).hexdigest() + '"'
+
+
+def no_modificado(request, etag):
+    """HttpResponseNotModified si el cliente ya tiene ``etag`` (If-None-Match), si no None."""
+    return get_conditional_response(request, etag=etag)
@@ -0,0 +1,441 @@
+"""Pool acotado de procesos para trabajo de CPU (PDF, motor de optimización).
+
+- ``enviar(funcion, *args, organizacion_id=..., al_terminar=...)`` deja el trabajo en una
+  cola y devuelve un ``Trabajo``. Como mucho ``COMPUTO_PROCESOS`` trabajos corren a la vez
+  y cada organización ocupa como mucho ``COMPUTO_MAX_POR_ORGANIZACION`` de esos cupos; los
+  demás esperan sin bloquear ningún hilo. Si ya hay ``COMPUTO_COLA_MAX`` trabajos en espera
+  se lanza ``Saturado`` (la vista responde 503 con ``Retry-After``).
+- ``enviar_partes(funcion, lista_args, combinar, ...)`` reparte un trabajo en partes que
+  corren en paralelo (cada una ocupa un cupo) y luego ``combinar(resultados)`` en el pool;
+  p. ej. un PDF por material que después se une en un solo documento. Las partes cuentan
+  contra el límite de la organización; ``COMPUTO_MAX_PARTES_POR_ORGANIZACION`` (opcional)
+  lo sube solo para ellas, pero lo que excede el límite general nunca toma el último cupo
+  libre: siempre queda uno para las demás organizaciones.
+- ``funcion`` corre en otro proceso: debe ser de nivel de módulo y recibir datos simples
+  (dicts, ``SimpleNamespace``), nunca instancias de modelos ni conexiones. Los procesos se
+  crean con ``spawn`` e inicializan Django, así que no heredan conexiones del padre.
+- ``al_terminar(resultado)`` corre en el proceso web, en un hilo de resultados, y persiste
+  lo calculado (archivo, BD). Así el trabajo se guarda aunque la request ya haya respondido
+  202; lo que devuelva (un dict pequeño) queda en el estado del trabajo.
+- ``await esperar_async(trabajo, segundos)`` (vistas async) o ``esperar(...)`` devuelven el
+  resultado o lanzan ``TimeoutError``; el trabajo sigue en curso y se consulta con
+  ``estado_trabajo(id)`` (en el cache de Django, como ``core.impresion``).
+- ``metricas()`` expone la profundidad de la cola, los cupos ocupados por organización y los
+  tiempos medios de espera y de cálculo del proceso actual.
+- Con ``COMPUTO_EN_PROCESOS = False`` se usa un pool de hilos con los mismos límites
+  (desarrollo, tests).
+"""
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+MAX_TRABAJOS_EN_MEMORIA = 500
+TIMEOUT_ESTADO = 3600
+
+
+class Saturado(Exception):
+    """La cola de trabajos de cómputo está llena."""
+
+
+def _cfg(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _max_procesos() -> int:
+    return max(1, int(_cfg('COMPUTO_PROCESOS', min(2, os.cpu_count() or 1))))
+
+
+def _max_por_organizacion() -> int:
+    return max(1, int(_cfg('COMPUTO_MAX_POR_ORGANIZACION', 1)))
+
+
+def _max_partes_por_organizacion() -> int:
+    limite = _cfg('COMPUTO_MAX_PARTES_POR_ORGANIZACION', None) or _max_por_organizacion()
+    return max(_max_por_organizacion(), int(limite))
+
+
+# ── Estado del proceso web ──────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_pool = None
+_pendientes = deque()
+_en_curso = {}          # organizacion_id -> trabajos corriendo
+_trabajos = {}
+_contadores = {'completados': 0, 'errores': 0, 'rechazados': 0, 'espera_total': 0.0, 'calculo_total': 0.0}
+
+_cola_resultados = None
+_hilo_resultados = None
+_hilo_lock = threading.Lock()
+
+
+# Índice de la unidad que combina los resultados de las partes (enviar_partes)
+COMBINAR = -1
+
+
+class Trabajo:
+    __slots__ = ('id', 'tipo', 'partes', 'resultados', 'faltan', 'combinar', 'organizacion_id',
+                 'usuario_id', 'al_terminar', 'estado', 'error', 'respuesta', 'creado', 'iniciado',
+                 'terminado', 'futuro')
+
+    def __init__(self, partes, combinar, tipo, organizacion_id, usuario_id, al_terminar):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo or getattr(partes[0][0], '__name__', 'computo')
+        # Unidades que corren en el pool: [(funcion, args)], más ``combinar`` al final si hay varias
+        self.partes = partes
+        self.resultados = [None] * len(partes)
+        self.faltan = len(partes)
+        self.combinar = combinar
+        self.organizacion_id = organizacion_id
+        self.usuario_id = usuario_id
+        self.al_terminar = al_terminar
+        self.estado = PENDIENTE
+        self.error = None
+        self.respuesta = None
+        self.creado = time.time()
+        self.iniciado = self.terminado = None
+        # Se resuelve cuando el resultado ya está persistido (después de al_terminar)
+        self.futuro = Future()
+
+    def resumen(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'usuario_id': self.usuario_id,
+            'organizacion_id': self.organizacion_id,
+            'estado': self.estado,
+            'error': self.error,
+            'respuesta': self.respuesta,
+            'creado': self.creado,
+            'iniciado': self.iniciado,
+            'terminado': self.terminado,
+        }
+
+
+def _clave_estado(trabajo_id):
+    return f"computo:trabajo:{trabajo_id}"
+
+
+def _actualizar(trabajo, estado, error=None):
+    trabajo.estado = estado
+    trabajo.error = error
+    if estado in (COMPLETADO, ERROR):
+        trabajo.terminado = time.time()
+        # Ya no hacen falta los datos de entrada ni los parciales en memoria
+        trabajo.partes = trabajo.resultados = None
+        if trabajo.iniciado is not None:
+            _contadores['espera_total'] += trabajo.iniciado - trabajo.creado
+            _contadores['calculo_total'] += trabajo.terminado - trabajo.iniciado
+    try:
+        cache.set(_clave_estado(trabajo.id), trabajo.resumen(), TIMEOUT_ESTADO)
+    except Exception:
+        pass
+
+
+def _registrar(trabajo):
+    _trabajos[trabajo.id] = trabajo
+    if len(_trabajos) > MAX_TRABAJOS_EN_MEMORIA:
+        # Descartar los más antiguos ya terminados (el dict conserva el orden de inserción)
+        terminados = [t.id for t in _trabajos.values() if t.estado in (COMPLETADO, ERROR)]
+        for tid in terminados[:len(_trabajos) - MAX_TRABAJOS_EN_MEMORIA]:
+            _trabajos.pop(tid, None)
+
+
+# ── Pool de procesos ────────────────────────────────────────────────────────
+
+def _inicializar_proceso(settings_module):
+    """Arranque de cada proceso del pool: Django configurado, sin conexiones abiertas."""
+    if settings_module:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        if _cfg('COMPUTO_EN_PROCESOS', True):
+            import multiprocessing
+            _pool = ProcessPoolExecutor(
+                max_workers=_max_procesos(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_proceso,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),),
+            )
+        else:
+            _pool = ThreadPoolExecutor(max_workers=_max_procesos(), thread_name_prefix='computo')
+    return _pool
+
+
+def _reiniciar_pool(pool):
+    """Un proceso murió (p. ej. sin memoria): el pool queda inutilizable y se crea otro."""
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    try:
+        pool.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+
+
+def _despachar():
+    """Pasa al pool las unidades en espera que caben en los cupos libres (llamar con _lock)."""
+    global _pool
+    limite_org = _max_por_organizacion()
+    limite_partes = _max_partes_por_organizacion()
+    libres = _max_procesos() - sum(_en_curso.values())
+    if libres <= 0 or not _pendientes:
+        return
+    restantes = deque()
+    while _pendientes:
+        trabajo, indice = _pendientes.popleft()
+        if trabajo.estado == ERROR:
+            # Otra parte del trabajo ya falló
+            continue
+        limite = limite_partes if len(trabajo.partes) > 1 else limite_org
+        ocupados = _en_curso.get(trabajo.organizacion_id, 0)
+        # Por encima del límite general una parte no toma el último cupo libre
+        if libres <= 0 or ocupados >= limite or (ocupados >= limite_org and libres <= 1):
+            restantes.append((trabajo, indice))
+            continue
+        funcion, args = (trabajo.combinar, (trabajo.resultados,)) if indice == COMBINAR else trabajo.partes[indice]
+        pool = _obtener_pool()
+        try:
+            futuro = pool.submit(funcion, *args)
+        except Exception as e:
+            # Pool roto o cerrándose: el trabajo falla y se recrea el pool para los siguientes
+            logger.warning("No se pudo iniciar el trabajo de cómputo %s: %s", trabajo.tipo, e)
+            _fallar(trabajo, e)
+            if _pool is pool:
+                _pool = None
+            continue
+        libres -= 1
+        _en_curso[trabajo.organizacion_id] = _en_curso.get(trabajo.organizacion_id, 0) + 1
+        if trabajo.iniciado is None:
+            trabajo.iniciado = time.time()
+            _actualizar(trabajo, EN_CURSO)
+        futuro.add_done_callback(lambda f, t=trabajo, i=indice, p=pool: _calculo_terminado(t, i, p, f))
+    _pendientes.extend(restantes)
+
+
+def _fallar(trabajo, error):
+    """Marca el trabajo con error y despierta a quien lo espera (llamar con _lock)."""
+    _contadores['errores'] += 1
+    _actualizar(trabajo, ERROR, str(error)[:500] or error.__class__.__name__)
+    if not trabajo.futuro.done():
+        trabajo.futuro.set_exception(error)
+
+
+def _calculo_terminado(trabajo, indice, pool, futuro):
+    # Corre en un hilo del pool: solo se encola, la persistencia va en el hilo de resultados
+    _obtener_cola_resultados().put((trabajo, indice, pool, futuro))
+
+
+# ── Hilo de resultados ──────────────────────────────────────────────────────
+
+def _obtener_cola_resultados():
+    global _cola_resultados, _hilo_resultados
+    if _hilo_resultados is not None and _hilo_resultados.is_alive():
+        return _cola_resultados
+    # Lock propio: el callback puede correr dentro de _despachar (con _lock tomado)
+    with _hilo_lock:
+        if _hilo_resultados is None or not _hilo_resultados.is_alive():
+            _cola_resultados = queue.Queue()
+            _hilo_resultados = threading.Thread(target=_bucle_resultados, args=(_cola_resultados,),
+                                                name='computo-resultados', daemon=True)
+            _hilo_resultados.start()
+    return _cola_resultados
+
+
+def _bucle_resultados(cola):
+    while True:
+        trabajo, indice, pool, futuro = cola.get()
+        try:
+            _procesar_resultado(trabajo, indice, pool, futuro)
+        except Exception:
+            logger.exception("Error inesperado cerrando el trabajo de cómputo %s", trabajo.tipo)
+        finally:
+            cola.task_done()
+
+
+def _procesar_resultado(trabajo, indice, pool, futuro):
+    from concurrent.futures.process import BrokenProcessPool
+    error = RuntimeError('Trabajo cancelado') if futuro.cancelled() else futuro.exception()
+    if isinstance(error, BrokenProcessPool):
+        _reiniciar_pool(pool)
+    final = False
+    with _lock:
+        _en_curso[trabajo.organizacion_id] -= 1
+        if not _en_curso[trabajo.organizacion_id]:
+            del _en_curso[trabajo.organizacion_id]
+        if trabajo.estado == ERROR:
+            pass  # ya falló por otra parte; el resultado se descarta
+        elif error is not None:
+            _fallar(trabajo, error)
+        elif indice == COMBINAR:
+            final = True
+        else:
+            trabajo.resultados[indice] = futuro.result()
+            trabajo.faltan -= 1
+            if trabajo.faltan == 0:
+                if trabajo.combinar is None:
+                    final = True
+                else:
+                    # Adelante en la cola: el trabajo ya tiene todas sus partes
+                    _pendientes.appendleft((trabajo, COMBINAR))
+        # El cupo queda libre antes de persistir: la siguiente unidad arranca ya
+        _despachar()
+    if not final:
+        return
+    resultado = futuro.result() if indice == COMBINAR else trabajo.resultados[0]
+    close_old_connections()
+    try:
+        if trabajo.al_terminar is not None:
+            trabajo.respuesta = trabajo.al_terminar(resultado)
+    except Exception as e:
+        logger.exception("No se pudo guardar el resultado del trabajo de cómputo %s", trabajo.tipo)
+        error = e
+    finally:
+        close_old_connections()
+    with _lock:
+        if error is not None:
+            _fallar(trabajo, error)
+            return
+        _contadores['completados'] += 1
+        _actualizar(trabajo, COMPLETADO)
+    trabajo.futuro.set_result(resultado)
+
+
+# ── API ─────────────────────────────────────────────────────────────────────
+
+def _encolar(trabajo):
+    with _lock:
+        en_espera = len({t.id for t, _ in _pendientes})
+        if en_espera >= int(_cfg('COMPUTO_COLA_MAX', 50)):
+            _contadores['rechazados'] += 1
+            raise Saturado(f"{en_espera} trabajos en espera")
+        _registrar(trabajo)
+        _actualizar(trabajo, PENDIENTE)
+        _pendientes.extend((trabajo, i) for i in range(len(trabajo.partes)))
+        _despachar()
+    return trabajo
+
+
+def enviar(funcion, *args, organizacion_id=None, usuario_id=None, tipo='', al_terminar=None) -> Trabajo:
+    """Encola ``funcion(*args)`` en el pool. Lanza ``Saturado`` si la cola está llena."""
+    return _encolar(Trabajo([(funcion, args)], None, tipo, organizacion_id, usuario_id, al_terminar))
+
+
+def enviar_partes(funcion, lista_args, combinar, *, organizacion_id=None, usuario_id=None, tipo='',
+                  al_terminar=None) -> Trabajo:
+    """Como ``enviar``, pero ``funcion(*args)`` corre en paralelo para cada ``args`` de
+    ``lista_args`` (dentro de los cupos de la organización) y, cuando terminan todas,
+    ``combinar(resultados)`` (en el orden de ``lista_args``) da el resultado del trabajo.
+    ``combinar`` también corre en el pool. Si una parte falla, falla el trabajo."""
+    partes = [(funcion, tuple(args)) for args in lista_args]
+    if not partes:
+        raise ValueError('enviar_partes necesita al menos una parte')
+    return _encolar(Trabajo(partes, combinar, tipo, organizacion_id, usuario_id, al_terminar))
+
+
+def paralelismo() -> int:
+    """Cuántas partes de un trabajo de ``enviar_partes`` pueden correr a la vez (1: no conviene partirlo)."""
+    limite_org = _max_por_organizacion()
+    # Lo que excede el límite general deja siempre un cupo libre
+    return min(_max_procesos(), _max_partes_por_organizacion(), max(limite_org, _max_procesos() - 1))
+
+
+def esperar(trabajo: Trabajo, segundos=None):
+    """Resultado del trabajo; ``TimeoutError`` si no termina en ``segundos`` (sigue en curso)."""
+    if segundos is None:
+        segundos = float(_cfg('COMPUTO_ESPERA_SEGUNDOS', 20))
+    return trabajo.futuro.result(timeout=segundos)
+
+
+async def esperar_async(trabajo: Trabajo, segundos=None):
+    """Como ``esperar`` pero sin ocupar un hilo; cancelar la espera no cancela el trabajo."""
+    if segundos is None:
+        segundos = float(_cfg('COMPUTO_ESPERA_SEGUNDOS', 20))
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(trabajo.futuro)), segundos)
+
+
+def estado_trabajo(trabajo_id):
+    """Resumen del trabajo o None si no se conoce (expirado u otro proceso sin cache compartido)."""
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo is not None:
+            return trabajo.resumen()
+    try:
+        return cache.get(_clave_estado(trabajo_id))
+    except Exception:
+        return None
+
+
+def metricas() -> dict:
+    """Cola (en unidades: partes o trabajos simples), cupos ocupados y tiempos medios del
+    proceso actual."""
+    with _lock:
+        terminados = _contadores['completados'] + _contadores['errores']
+        por_org = {}
+        for trabajo, _ in _pendientes:
+            por_org.setdefault(trabajo.organizacion_id, {'en_curso': 0, 'en_cola': 0})['en_cola'] += 1
+        for org_id, n in _en_curso.items():
+            por_org.setdefault(org_id, {'en_curso': 0, 'en_cola': 0})['en_curso'] = n
+        return {
+            'procesos': _max_procesos(),
+            'max_por_organizacion': _max_por_organizacion(),
+            'max_partes_por_organizacion': _max_partes_por_organizacion(),
+            'en_curso': sum(_en_curso.values()),
+            'en_cola': len(_pendientes),
+            'cola_max': int(_cfg('COMPUTO_COLA_MAX', 50)),
+            'por_organizacion': {str(k): v for k, v in por_org.items()},
+            'completados': _contadores['completados'],
+            'errores': _contadores['errores'],
+            'rechazados': _contadores['rechazados'],
+            'espera_media_s': round(_contadores['espera_total'] / terminados, 3) if terminados else 0,
+            'calculo_medio_s': round(_contadores['calculo_total'] / terminados, 3) if terminados else 0,
+        }
+
+
+def vaciar_computo(timeout=None):
+    """Espera a que terminen los trabajos en curso y en cola (tests, apagado del proceso)."""
+    limite = None if timeout is None else time.monotonic() + timeout
+    while True:
+        with _lock:
+            activos = [t.futuro for t in _trabajos.values() if t.estado in (PENDIENTE, EN_CURSO)]
+        if not activos:
+            return
+        restante = None if limite is None else limite - time.monotonic()
+        if restante is not None and restante <= 0:
+            return
+        try:
+            activos[0].exception(timeout=restante)
+        except Exception:
+            pass
+
+
+def _apagar():
+    vaciar_computo(10)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_apagar)
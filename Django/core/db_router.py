@@ -0,0 +1,131 @@
+"""Router de base de datos con réplica de solo lectura opcional.
+
+- Si ``DATABASES`` no tiene el alias de réplica (``DATABASE_REPLICA_ALIAS``, por defecto
+  ``'replica'``), el router no hace nada y todo va a ``default``.
+- Solo se leen de la réplica las vistas decoradas con ``@lectura_en_replica`` o el código
+  dentro de ``with usar_replica():``. Todo lo demás (y toda escritura) va a ``default``.
+- Read-your-writes: tras una escritura, el resto de la request lee de ``default`` y
+  ``ReplicaStickyMiddleware`` deja una cookie para que la misma sesión siga leyendo del
+  primario durante ``DATABASE_REPLICA_STICKY_SEGUNDOS``.
+- Si la réplica lleva más de ``DATABASE_REPLICA_MAX_LAG_SEGUNDOS`` de retraso (o no
+  responde), se lee del primario. El retraso se mide como mucho cada
+  ``DATABASE_REPLICA_CHEQUEO_SEGUNDOS`` por proceso.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+COOKIE_STICKY = 'db_primario'
+
+_local = threading.local()
+_estado_lock = threading.Lock()
+# Último chequeo de retraso de la réplica: (timestamp, sana)
+_estado_replica = {'chequeado': 0.0, 'sana': True}
+
+
+def alias_replica():
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def usar_replica():
+    """Las lecturas dentro del bloque pueden ir a la réplica (si existe y está al día)."""
+    previo = getattr(_local, 'replica', False)
+    _local.replica = True
+    try:
+        yield
+    finally:
+        _local.replica = previo
+
+
+def lectura_en_replica(view_func):
+    """Decorador para vistas de solo lectura pesadas (listados, resúmenes, exportaciones)."""
+    @functools.wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        with usar_replica():
+            return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+def marcar_escritura():
+    _local.escribio = True
+
+
+def fijar_primario(valor: bool):
+    """La request actual lee siempre del primario (cookie de stickiness presente)."""
+    _local.primario = valor
+    _local.escribio = False
+
+
+def hubo_escritura() -> bool:
+    return getattr(_local, 'escribio', False)
+
+
+def _medir_retraso(alias) -> float:
+    conn = connections[alias]
+    if conn.vendor != 'postgresql':
+        return 0.0
+    with conn.cursor() as cursor:
+        # Sin WAL pendiente de aplicar el retraso es 0 aunque no haya transacciones recientes
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        row = cursor.fetchone()
+    return float(row[0] or 0)
+
+
+def replica_sana(alias) -> bool:
+    intervalo = float(getattr(settings, 'DATABASE_REPLICA_CHEQUEO_SEGUNDOS', 5))
+    ahora = time.monotonic()
+    if ahora - _estado_replica['chequeado'] < intervalo:
+        return _estado_replica['sana']
+    with _estado_lock:
+        if ahora - _estado_replica['chequeado'] < intervalo:
+            return _estado_replica['sana']
+        max_lag = float(getattr(settings, 'DATABASE_REPLICA_MAX_LAG_SEGUNDOS', 10))
+        try:
+            sana = _medir_retraso(alias) <= max_lag
+        except Exception:
+            logger.warning("Réplica %s no disponible; se lee del primario", alias, exc_info=True)
+            sana = False
+        _estado_replica.update(chequeado=time.monotonic(), sana=sana)
+        return sana
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not getattr(_local, 'replica', False):
+            return None
+        if getattr(_local, 'primario', False) or getattr(_local, 'escribio', False):
+            return None
+        alias = alias_replica()
+        if alias is None:
+            return None
+        # Dentro de una transacción en default, leer de la misma conexión
+        if connections['default'].in_atomic_block:
+            return None
+        if not replica_sana(alias):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        marcar_escritura()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y primario tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == alias_replica():
+            return False
+        return None
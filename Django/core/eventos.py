@@ -0,0 +1,271 @@
+"""Pub/sub de eventos para vistas de streaming (SSE) sin consultar la BD en cada ciclo.
+
+- ``publicar(canales, datos)`` entrega el evento a los suscriptores del proceso y, con
+  PostgreSQL, lo difunde al resto de procesos con ``pg_notify``. Dentro de una transacción
+  se difiere al commit (un cambio revertido no se anuncia).
+- Cada proceso con suscriptores mantiene un hilo con una conexión dedicada en ``LISTEN``
+  que reparte las notificaciones de los demás procesos. Sin PostgreSQL (o con
+  ``EVENTOS_BACKEND = 'local'``) los eventos solo llegan dentro del mismo proceso.
+- ``suscribir(canales)`` es un context manager async que devuelve una ``asyncio.Queue``
+  ligada al event loop actual; los eventos llegan como ``(canal, datos)``.
+- ``liberar_conexion`` envuelve los helpers síncronos de los streams para que no retengan
+  una conexión a la BD mientras el stream espera eventos.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Canal de PostgreSQL por el que viajan todos los eventos (el canal lógico va en el payload)
+CANAL_PG = 'optimizador_eventos'
+# Identifica a este proceso para no repartir dos veces sus propios eventos
+# (con el pid: los workers creados con fork tras importar el módulo comparten _ORIGEN)
+_ORIGEN = uuid.uuid4().hex
+# pg_notify rechaza payloads de 8000 bytes o más; margen para no rozar el límite
+MAX_PAYLOAD_BYTES = 7900
+
+
+def _origen() -> str:
+    return f"{_ORIGEN}-{os.getpid()}"
+
+
+_lock = threading.Lock()
+_suscriptores = {}
+_oyente = None
+
+
+def _usar_postgres() -> bool:
+    backend = getattr(settings, 'EVENTOS_BACKEND', 'auto')
+    if backend == 'local':
+        return False
+    return connections['default'].vendor == 'postgresql'
+
+
+def _repartir(canales, datos):
+    with _lock:
+        destinos = {}
+        for canal in canales:
+            for entrada in _suscriptores.get(canal, ()):
+                # Un suscriptor de varios canales recibe el evento una sola vez
+                destinos.setdefault(entrada, canal)
+    for (loop, cola), canal in destinos.items():
+        try:
+            loop.call_soon_threadsafe(cola.put_nowait, (canal, datos))
+        except RuntimeError:
+            # El loop del suscriptor ya se cerró; se limpia al salir de suscribir()
+            pass
+
+
+def _payload(canales, datos) -> str:
+    return json.dumps({'o': _origen(), 'c': canales, 'd': datos}, default=str)
+
+
+def _notificar(canales, datos, ligero=None):
+    _repartir(canales, datos)
+    if not _usar_postgres():
+        return
+    payload = _payload(canales, datos)
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES and ligero is not None:
+        # Los demás procesos reciben solo los ids; el cliente pide el resto por HTTP
+        payload = _payload(canales, ligero)
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+        logger.warning("Evento de %s bytes demasiado grande para pg_notify (%s)", len(payload.encode('utf-8')), canales)
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CANAL_PG, payload])
+    except Exception:
+        logger.warning("No se pudo difundir el evento %s", canales, exc_info=True)
+
+
+def publicar(canales, datos: dict, ligero: dict = None) -> None:
+    """Anuncia ``datos`` (JSON serializable) a los suscriptores de ``canales`` (un nombre o
+    una lista). Si el JSON supera ``MAX_PAYLOAD_BYTES``, a los demás procesos se les
+    difunde ``ligero`` (la variante con solo ids) en su lugar."""
+    canales = [canales] if isinstance(canales, str) else list(canales)
+    transaction.on_commit(lambda: _notificar(canales, datos, ligero))
+
+
+def liberar_conexion(funcion):
+    """Decorador para los helpers síncronos (``sync_to_async``) de un stream SSE: cierra las
+    conexiones a la BD del hilo al terminar. Bajo ASGI ``close_old_connections`` corre recién
+    al cerrar la respuesta, así que sin esto cada stream abierto retendría una conexión
+    durante toda su duración."""
+    @functools.wraps(funcion)
+    def envuelta(*args, **kwargs):
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            for conexion in connections.all(initialized_only=True):
+                if not conexion.in_atomic_block:
+                    conexion.close()
+    return envuelta
+
+
+class suscribir:
+    """Suscribe el event loop actual a ``canales`` mientras dure el bloque ``async with``.
+
+    Es una clase y no un ``@asynccontextmanager``: si el generador del stream se finaliza
+    por el recolector (cliente desconectado), no hay un segundo generador que cerrar.
+    """
+
+    def __init__(self, canales):
+        self.canales = list(canales)
+        self.entrada = None
+
+    async def __aenter__(self):
+        cola = asyncio.Queue()
+        self.entrada = (asyncio.get_running_loop(), cola)
+        with _lock:
+            for canal in self.canales:
+                _suscriptores.setdefault(canal, set()).add(self.entrada)
+        if _usar_postgres():
+            _asegurar_oyente()
+        return cola
+
+    async def __aexit__(self, *exc):
+        with _lock:
+            for canal in self.canales:
+                subs = _suscriptores.get(canal)
+                if subs is not None:
+                    subs.discard(self.entrada)
+                    if not subs:
+                        del _suscriptores[canal]
+        return False
+
+
+def _asegurar_oyente():
+    global _oyente
+    with _lock:
+        if _oyente is not None and _oyente.is_alive():
+            return
+        _oyente = threading.Thread(target=_bucle_oyente, name='eventos-listen', daemon=True)
+        _oyente.start()
+
+
+def _conectar_listen():
+    import psycopg2
+    params = connections['default'].get_connection_params()
+    conn = psycopg2.connect(**params)
+    conn.set_session(autocommit=True)
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {CANAL_PG}")
+    return conn
+
+
+def _bucle_oyente():
+    espera = 1
+    while True:
+        conn = None
+        try:
+            conn = _conectar_listen()
+            espera = 1
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    aviso = conn.notifies.pop(0)
+                    try:
+                        evento = json.loads(aviso.payload)
+                    except ValueError:
+                        continue
+                    if evento.get('o') != _origen():
+                        _repartir(evento.get('c') or [], evento.get('d'))
+        except Exception:
+            logger.warning("Conexión LISTEN de eventos caída; reintentando en %ss", espera, exc_info=True)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(espera)
+        espera = min(espera * 2, 30)
+
+
+# ── Canales de proyectos ────────────────────────────────────────────────────
+
+CANAL_PROYECTOS_TODAS = 'proyectos:todas'
+
+
+def canal_proyectos(org_id) -> str:
+    return CANAL_PROYECTOS_TODAS if org_id is None else f'proyectos:org:{org_id}'
+
+
+def publicar_proyecto(proyecto, eliminado=False, organizacion_anterior=None) -> None:
+    """Anuncia el estado visible de un proyecto (estado, operador, organización).
+
+    Si el proyecto cambió de organización (``organizacion_anterior``) también se anuncia en
+    el canal de la anterior, para que sus listados lo quiten."""
+    datos = {
+        'id': proyecto.pk,
+        'estado': proyecto.estado,
+        'operador_id': proyecto.operador_id,
+        'organizacion_id': proyecto.organizacion_id,
+        'eliminado': eliminado,
+    }
+    canales = [canal_proyectos(proyecto.organizacion_id), CANAL_PROYECTOS_TODAS]
+    if organizacion_anterior is not None and organizacion_anterior != proyecto.organizacion_id:
+        canales.append(canal_proyectos(organizacion_anterior))
+    publicar(canales, datos)
+
+
+# ── Canales por usuario ─────────────────────────────────────────────────────
+
+def canal_notificaciones(user_id) -> str:
+    """Notificaciones persistentes de operador/enchapador (core.notificaciones)."""
+    return f'notificaciones:usuario:{user_id}'
+
+
+# ── Canales de chat ─────────────────────────────────────────────────────────
+
+def canal_chat(user_id) -> str:
+    return f'chat:usuario:{user_id}'
+
+
+def publicar_mensaje(mensaje, participantes_ids) -> None:
+    """Anuncia un mensaje nuevo a los participantes de su conversación.
+
+    Si el evento no cabe en pg_notify viaja sin ``mensaje`` (solo ``mensaje_id``) y el
+    cliente lo pide a obtener_mensajes."""
+    conversacion = mensaje.conversacion
+    ligero = {
+        'tipo': 'mensaje',
+        'conversacion_id': conversacion.pk,
+        'organizacion_id': conversacion.organizacion_id,
+        'mensaje': None,
+        'mensaje_id': mensaje.pk,
+        'autor_id': mensaje.autor_id,
+    }
+    autor = mensaje.autor
+    datos = dict(ligero, mensaje={
+        'id': mensaje.pk,
+        'contenido': mensaje.contenido,
+        'autor': autor.get_full_name() or autor.username,
+        'autor_id': autor.pk,
+        'enviado_en': mensaje.enviado_en.strftime('%H:%M'),
+        'fecha_completa': mensaje.enviado_en.strftime('%d/%m/%Y %H:%M'),
+    })
+    publicar([canal_chat(uid) for uid in participantes_ids], datos, ligero)
+
+
+def publicar_leidos(conversacion, participantes_ids, lector_id) -> None:
+    """Anuncia que ``lector_id`` avanzó su marca de lectura en la conversación."""
+    datos = {
+        'tipo': 'leido',
+        'conversacion_id': conversacion.pk,
+        'organizacion_id': conversacion.organizacion_id,
+        'lector_id': lector_id,
+    }
+    publicar([canal_chat(uid) for uid in participantes_ids], datos)
@@ -0,0 +1,209 @@
+import base64
+import json
+import zlib
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# Prefijo que identifica un valor comprimido dentro de la columna JSON.
+# El número de versión va ligado al diccionario zlib: nunca modificar un diccionario
+# existente, agregar uno nuevo con otra versión.
+_PREFIJO = 'zj'
+_VERSION_ACTUAL = 1
+
+# Diccionario de claves/valores frecuentes en los layouts del optimizador.
+# zlib lo usa como "preset dictionary", así incluso valores medianos comprimen bien.
+_DICCIONARIOS = {
+    1: (
+        b'{"materiales":[{"material":{"nombre":"codigo":"tapacanto":{"tableros":[{"piezas":[{'
+        b'"nombre":"id_unico":"x":"y":"ancho":"largo":"rotada":false,"rotada":true,'
+        b'"estado":"pendiente","estado":"cortada","veta_libre":true,"veta_libre":false,'
+        b'"tapacantos":{"arriba":false,"abajo":false,"izquierda":false,"derecha":false},'
+        b'"arriba":true,"abajo":true,"izquierda":true,"derecha":true,'
+        b'"indiceUnidad":"totalUnidades":"veta":"horizontal","vertical",'
+        b'"eficiencia_tablero":"config":{"kerf":"margen_x":"margen_y":"margenes":'
+        b'"desperdicio_sierra":"tablero_ancho_original":"tablero_largo_original":'
+        b'"tablero_ancho_efectivo":"tablero_largo_efectivo":"entrada":"historial":'
+        b'"total_piezas":"total_tableros":"eficiencia":null,'
+    ),
+}
+
+# Valores más pequeños que esto se guardan como JSON normal (legibles en la BD)
+UMBRAL_COMPRESION_BYTES = 1024
+
+
+def _json_compacto(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _comprimir_bytes(raw: bytes, version: int = _VERSION_ACTUAL) -> bytes:
+    comp = zlib.compressobj(level=6, zdict=_DICCIONARIOS[version])
+    return comp.compress(raw) + comp.flush()
+
+
+def _descomprimir_bytes(data: bytes, version: int) -> bytes:
+    decomp = zlib.decompressobj(zdict=_DICCIONARIOS[version])
+    return decomp.decompress(data) + decomp.flush()
+
+
+def comprimir_json(value, raw: bytes = None) -> str:
+    """Serializa ``value`` en JSON compacto y lo comprime con zlib + diccionario."""
+    if raw is None:
+        raw = _json_compacto(value)
+    data = _comprimir_bytes(raw)
+    return f"{_PREFIJO}{_VERSION_ACTUAL}:" + base64.b64encode(data).decode('ascii')
+
+
+def descomprimir_json(texto: str):
+    cabecera, _, cuerpo = texto.partition(':')
+    version = int(cabecera[len(_PREFIJO):])
+    raw = _descomprimir_bytes(base64.b64decode(cuerpo), version)
+    return json.loads(raw.decode('utf-8'))
+
+
+def _tiene_prefijo(value, prefijo: str) -> bool:
+    if not isinstance(value, str) or not value.startswith(prefijo):
+        return False
+    version = value.split(':', 1)[0][len(prefijo):]
+    return version.isdigit() and int(version) in _DICCIONARIOS
+
+
+def es_comprimido(value) -> bool:
+    return _tiene_prefijo(value, _PREFIJO)
+
+
+# ── Archivo frío ────────────────────────────────────────────────────────────
+# Un valor archivado se mueve a un archivo comprimido en MEDIA_ROOT (default_storage)
+# y en la columna queda solo un puntero "za<version>:<ruta>".
+_PREFIJO_ARCHIVO = 'za'
+
+
+def es_archivado(value) -> bool:
+    return _tiene_prefijo(value, _PREFIJO_ARCHIVO)
+
+
+def archivar_json(value, ruta: str) -> str:
+    """Escribe ``value`` comprimido en ``ruta`` (default_storage) y devuelve el puntero."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    value = cargar_json(value)
+    data = f"{_PREFIJO}{_VERSION_ACTUAL}\n".encode('ascii') + _comprimir_bytes(_json_compacto(value))
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    ruta_real = default_storage.save(ruta, ContentFile(data))
+    return f"{_PREFIJO_ARCHIVO}{_VERSION_ACTUAL}:{ruta_real}"
+
+
+def almacenamiento_durable() -> bool:
+    """True si default_storage sobrevive a un redeploy: un backend remoto (S3, etc.) o un
+    FileSystemStorage en un disco montado declarado con ``ARCHIVO_ALMACENAMIENTO_DURABLE``."""
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage, storages
+    if not isinstance(storages['default'], FileSystemStorage):
+        return True
+    return bool(getattr(settings, 'ARCHIVO_ALMACENAMIENTO_DURABLE', False))
+
+
+def ruta_archivo(puntero: str) -> str:
+    return puntero.split(':', 1)[1]
+
+
+def leer_archivado(puntero: str):
+    from django.core.files.storage import default_storage
+    with default_storage.open(ruta_archivo(puntero), 'rb') as fh:
+        data = fh.read()
+    cabecera, _, cuerpo = data.partition(b'\n')
+    version = int(cabecera.decode('ascii')[len(_PREFIJO):])
+    return json.loads(_descomprimir_bytes(cuerpo, version).decode('utf-8'))
+
+
+class JSONComprimido:
+    """Valor comprimido leído de la BD y aún no descomprimido.
+    Se descomprime al acceder al atributo del modelo (ver ``_JSONComprimidoDescriptor``)
+    o explícitamente con ``cargar()`` cuando llega vía ``values()``.
+    """
+    __slots__ = ('texto',)
+
+    def __init__(self, texto: str):
+        self.texto = texto
+
+    def cargar(self):
+        return descomprimir_json(self.texto)
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {len(self.texto)} bytes>"
+
+
+class JSONArchivado(JSONComprimido):
+    """Puntero a un valor movido al archivo frío; ``cargar()`` lo rehidrata desde disco."""
+    __slots__ = ()
+
+    def cargar(self):
+        return leer_archivado(self.texto)
+
+    @property
+    def ruta(self) -> str:
+        return ruta_archivo(self.texto)
+
+
+def cargar_json(value):
+    """Devuelve el valor Python real, descomprimiendo (o rehidratando) si hace falta."""
+    if isinstance(value, JSONComprimido):
+        return value.cargar()
+    return value
+
+
+class _JSONComprimidoDescriptor(DeferredAttribute):
+    # Descriptor de datos (define __set__) para que __get__ se ejecute aunque el
+    # valor ya esté en instance.__dict__.
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is not None and isinstance(value, JSONComprimido):
+            value = value.cargar()
+            instance.__dict__[self.field.attname] = value
+            # Recordar qué objeto salió de descomprimir: quien compare por identidad (la
+            # auditoría de core.signals) distingue una lectura de una reasignación
+            instance.__dict__.setdefault('_json_descomprimidos', {})[self.field.attname] = value
+        return value
+
+
+class CompressedJSONField(models.JSONField):
+    """JSONField que guarda los valores grandes comprimidos (zlib + diccionario de claves).
+
+    - Compatible con filas existentes: lo que no lleva el prefijo se lee como JSON normal.
+    - Misma columna que JSONField (sin cambio de esquema).
+    - Descompresión perezosa: solo al acceder al atributo; si el valor no se toca,
+      un ``save()`` reescribe los bytes comprimidos tal cual.
+    - Valores archivados (``archivar_json``) se rehidratan desde MEDIA_ROOT al acceder.
+    """
+    descriptor_class = _JSONComprimidoDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        if es_comprimido(value):
+            return JSONComprimido(value)
+        if es_archivado(value):
+            return JSONArchivado(value)
+        return value
+
+    def pre_save(self, model_instance, add):
+        # Evitar descomprimir/recomprimir (o rehidratar) un valor que nunca se leyó
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, JSONComprimido):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, JSONComprimido):
+            value = value.texto
+        elif value is not None and not hasattr(value, 'resolve_expression'):
+            raw = _json_compacto(value)
+            if len(raw) >= UMBRAL_COMPRESION_BYTES:
+                value = comprimir_json(value, raw)
+        return super().get_db_prep_save(value, connection)
@@ -0,0 +1,271 @@
+"""Servicio de impresión de etiquetas ZPL vía CUPS.
+
+- ``listar_impresoras()`` devuelve la lista de impresoras (``lpstat -p`` / ``lpstat -d``)
+  cacheada en el proceso. Cuando caduca (``IMPRESION_DESCUBRIMIENTO_SEGUNDOS``) se refresca
+  en un hilo de fondo y mientras tanto se sirve la lista anterior, así un CUPS lento no
+  bloquea a los workers web.
+- ``encolar_impresion(zpl, impresora)`` deja el trabajo en la cola de la impresora y
+  vuelve de inmediato. Un hilo por impresora junta los trabajos que llegan dentro de
+  ``IMPRESION_VENTANA_SEGUNDOS`` y los envía en una sola llamada a ``lp -o raw``, con
+  ``IMPRESION_REINTENTOS`` reintentos y espera creciente si ``lp`` falla.
+- ``estado_trabajo(id)`` consulta el estado (pendiente / enviando / completado / error).
+  El estado se guarda también en el cache de Django: con ``REDIS_URL`` se puede consultar
+  desde cualquier worker; con LocMem, solo desde el que aceptó el trabajo.
+- Los comandos son configurables (``IMPRESION_LP_CMD``, ``IMPRESION_LPSTAT_CMD``), lo que
+  permite probar con un ``lp`` falso.
+"""
+import logging
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = 'pendiente'
+ENVIANDO = 'enviando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+# Trabajos recientes que se conservan en memoria para consultar su estado
+MAX_TRABAJOS_EN_MEMORIA = 1000
+TIMEOUT_ESTADO = 3600
+
+_impresoras_lock = threading.Lock()
+_impresoras = {'impresoras': [], 'default': '', 'actualizado': 0.0, 'error': None}
+_refrescando = threading.Event()
+_primera_carga = threading.Event()
+
+_colas_lock = threading.Lock()
+_colas = {}
+_trabajos_lock = threading.Lock()
+_trabajos = {}
+
+
+def _cfg(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+# ── Descubrimiento de impresoras ────────────────────────────────────────────
+
+def _ejecutar_lpstat(*args):
+    timeout = float(_cfg('IMPRESION_LPSTAT_TIMEOUT', 5))
+    return subprocess.run([_cfg('IMPRESION_LPSTAT_CMD', 'lpstat'), *args],
+                          capture_output=True, text=True, timeout=timeout).stdout
+
+
+def _descubrir():
+    printers = []
+    for line in _ejecutar_lpstat('-p').splitlines():
+        # formato: "printer NOMBRE is idle..." o "la impresora NOMBRE está ..." según el idioma
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == 'printer':
+            printers.append(parts[1])
+        elif len(parts) >= 3:
+            printers.append(parts[2])
+    default_name = ''
+    for line in _ejecutar_lpstat('-d').splitlines():
+        if ':' in line:
+            default_name = line.split(':', 1)[-1].strip()
+            break
+    return printers, default_name
+
+
+def _refrescar():
+    try:
+        printers, default_name = _descubrir()
+        with _impresoras_lock:
+            _impresoras.update(impresoras=printers, default=default_name, actualizado=time.time(), error=None)
+    except Exception as e:
+        logger.warning("No se pudo consultar las impresoras CUPS: %s", e)
+        with _impresoras_lock:
+            # Conservar la última lista buena; reintentar en el próximo ciclo
+            _impresoras.update(actualizado=time.time(), error=str(e))
+    finally:
+        _refrescando.clear()
+        _primera_carga.set()
+
+
+def refrescar_impresoras(esperar=False):
+    """Lanza un refresco en segundo plano (si no hay uno en curso)."""
+    if not _refrescando.is_set():
+        _refrescando.set()
+        hilo = threading.Thread(target=_refrescar, name='impresion-descubrimiento', daemon=True)
+        hilo.start()
+        if esperar:
+            hilo.join()
+
+
+def listar_impresoras():
+    """Lista cacheada de impresoras: ``{'impresoras', 'default', 'actualizado', 'error'}``."""
+    caducidad = float(_cfg('IMPRESION_DESCUBRIMIENTO_SEGUNDOS', 60))
+    with _impresoras_lock:
+        vencida = time.time() - _impresoras['actualizado'] > caducidad
+    if vencida:
+        refrescar_impresoras()
+    if not _primera_carga.is_set():
+        # Primera consulta del proceso: esperar un poco al descubrimiento inicial
+        _primera_carga.wait(float(_cfg('IMPRESION_ESPERA_INICIAL_SEGUNDOS', 2)))
+    with _impresoras_lock:
+        return dict(_impresoras, impresoras=list(_impresoras['impresoras']))
+
+
+# ── Cola de trabajos ────────────────────────────────────────────────────────
+
+class _Trabajo:
+    __slots__ = ('id', 'impresora', 'datos', 'usuario_id', 'estado', 'intentos', 'error', 'creado', 'actualizado')
+
+    def __init__(self, datos, impresora, usuario_id):
+        self.id = uuid.uuid4().hex
+        self.impresora = impresora
+        self.datos = datos
+        self.usuario_id = usuario_id
+        self.estado = PENDIENTE
+        self.intentos = 0
+        self.error = None
+        self.creado = self.actualizado = time.time()
+
+    def resumen(self):
+        return {
+            'id': self.id,
+            'impresora': self.impresora or '',
+            'usuario_id': self.usuario_id,
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'error': self.error,
+            'creado': self.creado,
+            'actualizado': self.actualizado,
+        }
+
+
+def _clave_estado(trabajo_id):
+    return f"impresion:trabajo:{trabajo_id}"
+
+
+def _actualizar(trabajo, estado, error=None):
+    trabajo.estado = estado
+    trabajo.error = error
+    trabajo.actualizado = time.time()
+    if estado in (COMPLETADO, ERROR):
+        # Ya no hace falta el ZPL en memoria
+        trabajo.datos = None
+    try:
+        cache.set(_clave_estado(trabajo.id), trabajo.resumen(), TIMEOUT_ESTADO)
+    except Exception:
+        pass
+
+
+def _registrar(trabajo):
+    with _trabajos_lock:
+        _trabajos[trabajo.id] = trabajo
+        if len(_trabajos) > MAX_TRABAJOS_EN_MEMORIA:
+            # Descartar los más antiguos ya terminados (el dict conserva el orden de inserción)
+            for tid in [t.id for t in _trabajos.values() if t.estado in (COMPLETADO, ERROR)][:len(_trabajos) - MAX_TRABAJOS_EN_MEMORIA]:
+                _trabajos.pop(tid, None)
+
+
+def encolar_impresion(datos: str, impresora=None, usuario_id=None) -> str:
+    """Encola ZPL para ``impresora`` (None = la predeterminada de CUPS). Devuelve el id del trabajo."""
+    trabajo = _Trabajo(datos, (impresora or '').strip() or None, usuario_id)
+    _registrar(trabajo)
+    _actualizar(trabajo, PENDIENTE)
+    _obtener_cola(trabajo.impresora).put(trabajo)
+    return trabajo.id
+
+
+def estado_trabajo(trabajo_id):
+    """Resumen del trabajo o None si no se conoce (expirado u otro proceso sin cache compartido)."""
+    with _trabajos_lock:
+        trabajo = _trabajos.get(trabajo_id)
+    if trabajo is not None:
+        return trabajo.resumen()
+    try:
+        return cache.get(_clave_estado(trabajo_id))
+    except Exception:
+        return None
+
+
+def _obtener_cola(impresora):
+    with _colas_lock:
+        entrada = _colas.get(impresora)
+        if entrada is None or not entrada[1].is_alive():
+            cola = queue.Queue()
+            hilo = threading.Thread(target=_bucle_impresora, args=(impresora, cola),
+                                    name=f"impresion-{impresora or 'default'}", daemon=True)
+            hilo.start()
+            entrada = _colas[impresora] = (cola, hilo)
+    return entrada[0]
+
+
+def _enviar_lp(impresora, datos: bytes):
+    cmd = [_cfg('IMPRESION_LP_CMD', 'lp')]
+    if impresora:
+        cmd += ['-d', impresora]
+    cmd += ['-o', 'raw']
+    timeout = float(_cfg('IMPRESION_LP_TIMEOUT', 30))
+    result = subprocess.run(cmd, input=datos, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr or result.stdout or b'').decode('utf-8', 'replace').strip()
+                           or f"lp terminó con código {result.returncode}")
+
+
+def _bucle_impresora(impresora, cola):
+    ventana = float(_cfg('IMPRESION_VENTANA_SEGUNDOS', 0.3))
+    max_lote = int(_cfg('IMPRESION_MAX_LOTE', 200))
+    while True:
+        lote = [cola.get()]
+        # Juntar los trabajos que lleguen en la ventana: una sola llamada a lp por ráfaga
+        limite = time.monotonic() + ventana
+        while len(lote) < max_lote:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(cola.get(timeout=restante) if restante > 0 else cola.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _procesar_lote(impresora, lote)
+        except Exception:
+            logger.exception("Error inesperado imprimiendo un lote en %s", impresora or 'default')
+        finally:
+            for _ in lote:
+                cola.task_done()
+
+
+def _procesar_lote(impresora, lote):
+    reintentos = int(_cfg('IMPRESION_REINTENTOS', 3))
+    espera = float(_cfg('IMPRESION_ESPERA_REINTENTO_SEGUNDOS', 1))
+    datos = '\n'.join(t.datos for t in lote).encode('utf-8')
+    for t in lote:
+        _actualizar(t, ENVIANDO)
+    for intento in range(1, reintentos + 2):
+        for t in lote:
+            t.intentos = intento
+        try:
+            _enviar_lp(impresora, datos)
+        except Exception as e:
+            if intento > reintentos:
+                logger.warning("Impresión fallida en %s tras %s intentos: %s", impresora or 'default', intento, e)
+                for t in lote:
+                    _actualizar(t, ERROR, str(e)[:500])
+                return
+            time.sleep(espera * 2 ** (intento - 1))
+            continue
+        for t in lote:
+            _actualizar(t, COMPLETADO)
+        return
+
+
+def vaciar_impresion(timeout=None):
+    """Espera a que se procesen los trabajos encolados (tests, apagado del proceso)."""
+    with _colas_lock:
+        colas = [c for c, hilo in _colas.values() if hilo.is_alive()]
+    limite = None if timeout is None else time.monotonic() + timeout
+    for cola in colas:
+        while cola.unfinished_tasks:
+            if limite is not None and time.monotonic() > limite:
+                return
+            time.sleep(0.05)
@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.fields import almacenamiento_durable, archivar_json, cargar_json, leer_archivado, JSONArchivado
+from core.models import Proyecto
+
+ESTADOS_ARCHIVABLES = ('completado', 'cancelado')
+CAMPOS = ('resultado_optimizacion', 'configuracion')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve el layout (resultado_optimizacion y configuracion) de proyectos completados o cancelados\n"
+        "hace más de N días a archivos comprimidos en MEDIA_ROOT/archivo/proyectos/, dejando un puntero\n"
+        "en la fila. El acceso posterior rehidrata el valor desde disco de forma transparente.\n"
+        "Pensado para ejecutarse de forma programada (cron). Requiere almacenamiento durable\n"
+        "(S3 o MEDIA_ROOT en un disco persistente con ARCHIVO_ALMACENAMIENTO_DURABLE=1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=180, help="Antigüedad mínima desde la última modificación (por defecto 180)")
+        parser.add_argument("--estados", default=",".join(ESTADOS_ARCHIVABLES), help="Estados a archivar, separados por coma")
+        parser.add_argument("--limite", type=int, default=0, help="Máximo de proyectos a procesar (0 = sin límite)")
+        parser.add_argument("--dry-run", action="store_true", help="Muestra qué se archivaría sin escribir nada")
+        parser.add_argument("--restaurar", type=int, metavar="PROYECTO_ID", help="Devuelve a la BD el layout archivado de un proyecto")
+
+    def handle(self, *args, **opts):
+        if opts.get("restaurar"):
+            return self._restaurar(opts["restaurar"], opts["dry_run"])
+
+        dias = opts["dias"]
+        if dias < 0:
+            raise CommandError("--dias debe ser >= 0")
+        estados = [e.strip() for e in opts["estados"].split(",") if e.strip()]
+        validos = {c[0] for c in Proyecto.ESTADOS}
+        invalidos = [e for e in estados if e not in validos]
+        if invalidos:
+            raise CommandError(f"Estados inválidos: {', '.join(invalidos)}")
+
+        if not opts["dry_run"] and not almacenamiento_durable():
+            raise CommandError(
+                "El almacenamiento de archivos no es durable: los layouts archivados se perderían en el "
+                "próximo deploy. Configure un backend remoto (S3) o monte MEDIA_ROOT en un disco "
+                "persistente y defina ARCHIVO_ALMACENAMIENTO_DURABLE=1."
+            )
+
+        corte = timezone.now() - timedelta(days=dias)
+        qs = (
+            Proyecto.objects
+            .filter(estado__in=estados, fecha_modificacion__lt=corte)
+            .exclude(resultado_optimizacion__isnull=True, configuracion__isnull=True)
+            .only('id', 'organizacion_id', 'fecha_modificacion', *CAMPOS)
+            .order_by('id')
+        )
+        if opts["limite"]:
+            qs = qs[:opts["limite"]]
+
+        archivados = 0
+        omitidos = 0
+        for p in qs.iterator(chunk_size=50):
+            cambios = {}
+            verificado = True
+            for campo in CAMPOS:
+                crudo = p.__dict__.get(campo)
+                if crudo is None or isinstance(crudo, JSONArchivado):
+                    continue
+                if opts["dry_run"]:
+                    cambios[campo] = None
+                    continue
+                ruta = f"archivo/proyectos/{p.organizacion_id}/{p.id}-{campo}.zj"
+                valor = cargar_json(crudo)
+                puntero = archivar_json(valor, ruta)
+                cambios[campo] = JSONArchivado(puntero)
+                # Releer antes de reemplazar la copia de la BD: si el archivo no es idéntico,
+                # el proyecto se deja como estaba
+                try:
+                    verificado = leer_archivado(puntero) == valor
+                except Exception:
+                    verificado = False
+                if not verificado:
+                    self.stderr.write(f"Proyecto {p.id}: el archivo de {campo} no coincide con la BD; se omite")
+                    break
+            if not cambios:
+                omitidos += 1
+                continue
+            if opts["dry_run"]:
+                self.stdout.write(f"[dry-run] Proyecto {p.id}: {', '.join(cambios)}")
+                archivados += 1
+                continue
+            n = 0
+            if verificado:
+                # update() condicionado a fecha_modificacion: si el proyecto cambió mientras
+                # se escribía el archivo, no se pisa el valor nuevo (se reintentará otro día)
+                n = Proyecto.objects.filter(id=p.id, fecha_modificacion=p.fecha_modificacion).update(**cambios)
+            if n:
+                archivados += 1
+            else:
+                # Ningún puntero quedó en la BD: los archivos recién escritos sobran
+                for puntero in cambios.values():
+                    default_storage.delete(puntero.ruta)
+                omitidos += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Proyectos archivados: {archivados} (omitidos: {omitidos})"))
+
+    def _restaurar(self, proyecto_id, dry_run):
+        try:
+            p = Proyecto.objects.only('id', *CAMPOS).get(id=proyecto_id)
+        except Proyecto.DoesNotExist:
+            raise CommandError(f"Proyecto {proyecto_id} no existe")
+        cambios = {}
+        rutas = []
+        for campo in CAMPOS:
+            crudo = p.__dict__.get(campo)
+            if isinstance(crudo, JSONArchivado):
+                cambios[campo] = crudo.cargar()
+                rutas.append(crudo.ruta)
+        if not cambios:
+            self.stdout.write(f"Proyecto {proyecto_id} no tiene layout archivado")
+            return
+        if not dry_run:
+            for campo, valor in cambios.items():
+                setattr(p, campo, valor)
+            p.save(update_fields=list(cambios))
+            for ruta in rutas:
+                default_storage.delete(ruta)
+        self.stdout.write(self.style.SUCCESS(f"Proyecto {proyecto_id} restaurado: {', '.join(cambios)}"))
@@ -0,0 +1,133 @@
+import gzip
+import json
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.fields import almacenamiento_durable
+from core.models import AuditLog, AuditLogResumen
+
+CAMPOS_EXPORT = (
+    'id', 'created_at', 'actor_id', 'organizacion_id', 'verb',
+    'target_model', 'target_id', 'target_repr', 'changes',
+)
+
+
+def politicas_retencion():
+    """Días de retención por verbo según settings. None = conservar siempre."""
+    por_defecto = getattr(settings, 'AUDITORIA_RETENCION_DIAS_DEFAULT', None)
+    politicas = {verb: por_defecto for verb, _ in AuditLog.VERBS}
+    politicas.update(getattr(settings, 'AUDITORIA_RETENCION_DIAS', {}) or {})
+    return politicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Depura AuditLog según la retención por verbo (settings.AUDITORIA_RETENCION_DIAS).\n"
+        "Por cada lote de filas vencidas: exporta el detalle a MEDIA_ROOT/archivo/auditoria/<AAAA-MM>/\n"
+        "(JSON Lines comprimido con gzip, un directorio por mes), acumula los conteos diarios en\n"
+        "AuditLogResumen y elimina las filas. Trabaja en lotes cortos para no bloquear la tabla.\n"
+        "Pensado para ejecutarse de forma programada (cron). Requiere almacenamiento durable\n"
+        "(ver archivar_layouts) salvo con --sin-exportar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000, help="Filas por lote (por defecto 5000)")
+        parser.add_argument("--verbos", default="", help="Limitar a estos verbos, separados por coma")
+        parser.add_argument("--sin-exportar", action="store_true", help="No escribir el detalle a disco antes de borrar")
+        parser.add_argument("--dry-run", action="store_true", help="Muestra cuántas filas se depurarían sin modificar nada")
+
+    def handle(self, *args, **opts):
+        lote = opts["lote"]
+        if lote <= 0:
+            raise CommandError("--lote debe ser > 0")
+        politicas = politicas_retencion()
+        verbos = [v.strip().upper() for v in opts["verbos"].split(",") if v.strip()]
+        invalidos = [v for v in verbos if v not in politicas]
+        if invalidos:
+            raise CommandError(f"Verbos inválidos: {', '.join(invalidos)}")
+        if not opts["dry_run"] and not opts["sin_exportar"] and not almacenamiento_durable():
+            raise CommandError(
+                "El almacenamiento de archivos no es durable: el detalle exportado se perdería en el "
+                "próximo deploy y las filas ya estarían borradas. Configure un backend remoto (S3) o "
+                "monte MEDIA_ROOT en un disco persistente y defina ARCHIVO_ALMACENAMIENTO_DURABLE=1, "
+                "o use --sin-exportar para descartar el detalle a propósito."
+            )
+
+        ahora = timezone.now()
+        total = 0
+        for verb, dias in sorted(politicas.items()):
+            if verbos and verb not in verbos:
+                continue
+            if dias is None:
+                continue
+            corte = ahora - timedelta(days=int(dias))
+            qs = AuditLog.objects.filter(verb=verb, created_at__lt=corte)
+            if opts["dry_run"]:
+                n = qs.count()
+                self.stdout.write(f"[dry-run] {verb}: {n} filas anteriores a {corte:%Y-%m-%d} ({dias} días)")
+                total += n
+                continue
+            n = self._depurar(qs, lote, exportar=not opts["sin_exportar"])
+            if n:
+                self.stdout.write(f"{verb}: {n} filas depuradas (retención {dias} días)")
+            total += n
+
+        if opts["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"[dry-run] Se depurarían {total} filas"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Auditoría depurada: {total} filas"))
+
+    def _depurar(self, qs, lote, exportar):
+        total = 0
+        while True:
+            filas = list(qs.order_by('id').values(*CAMPOS_EXPORT)[:lote])
+            if not filas:
+                return total
+            if exportar:
+                # _exportar lanza CommandError si no puede verificar el archivo: no se borra nada
+                self._exportar(filas)
+            ids = [f['id'] for f in filas]
+            with transaction.atomic():
+                self._acumular_resumen(filas)
+                AuditLog.objects.filter(id__in=ids).delete()
+            total += len(filas)
+
+    def _exportar(self, filas):
+        # Un archivo por mes y lote; el nombre depende de los ids, así reintentar
+        # un lote que no alcanzó a borrarse sobrescribe el mismo archivo
+        por_mes = defaultdict(list)
+        for f in filas:
+            por_mes[f['created_at'].strftime('%Y-%m')].append(f)
+        for mes, grupo in por_mes.items():
+            ruta = f"archivo/auditoria/{mes}/auditlog-{grupo[0]['verb'].lower()}-{grupo[0]['id']}-{grupo[-1]['id']}.jsonl.gz"
+            contenido = "\n".join(json.dumps(f, cls=DjangoJSONEncoder, ensure_ascii=False) for f in grupo) + "\n"
+            if default_storage.exists(ruta):
+                default_storage.delete(ruta)
+            ruta_real = default_storage.save(ruta, ContentFile(gzip.compress(contenido.encode('utf-8'))))
+            # Releer lo escrito antes de borrar las filas (como archivar_layouts)
+            try:
+                with default_storage.open(ruta_real, 'rb') as fh:
+                    verificado = gzip.decompress(fh.read()).decode('utf-8') == contenido
+            except Exception:
+                verificado = False
+            if not verificado:
+                raise CommandError(f"No se pudo verificar la exportación {ruta_real}; no se borraron esas filas")
+
+    def _acumular_resumen(self, filas):
+        conteos = Counter(
+            (timezone.localtime(f['created_at']).date(), f['organizacion_id'], f['verb'], f['target_model'])
+            for f in filas
+        )
+        for (fecha, org_id, verb, target_model), n in conteos.items():
+            clave = dict(fecha=fecha, organizacion_id=org_id, verb=verb, target_model=target_model)
+            if not AuditLogResumen.objects.filter(**clave).update(total=F('total') + n):
+                AuditLogResumen.objects.create(total=n, **clave)
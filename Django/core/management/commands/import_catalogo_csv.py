@@ -1,14 +1,24 @@
 import csv
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal, InvalidOperation
 
+from django.core.exceptions import ValidationError
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import models, transaction
 from contextlib import nullcontext
 
+from core.audit import auditoria_agrupada
+from core.catalogo import invalidar_catalogo
 from core.models import Material, Tapacanto, Organizacion
 
 
+CAMPOS_MATERIAL = ["nombre", "tipo", "espesor", "ancho", "largo", "precio_m2", "stock", "proveedor", "activo"]
+CAMPOS_TAPACANTO = ["nombre", "color", "ancho", "espesor", "precio_metro", "stock_metros", "proveedor", "activo"]
+
+
 def parse_decimal(value: str, default=None):
     if value is None:
         return default
@@ -35,6 +45,120 @@ def parse_int(value: str, default=None):
         return default
 
 
+def _ajustar_a_modelo(model, datos):
+    """Valida ``datos`` contra los campos del modelo (max_length, max_digits, rango de
+    enteros) y redondea los decimales a ``decimal_places`` como haría la BD: una fila que
+    la BD rechazaría se reporta aquí y no aborta el lote."""
+    for nombre, valor in datos.items():
+        if valor is None:
+            continue
+        campo = model._meta.get_field(nombre)
+        if isinstance(campo, models.DecimalField):
+            try:
+                valor = datos[nombre] = valor.quantize(Decimal(1).scaleb(-campo.decimal_places))
+            except InvalidOperation:
+                raise ValueError(f"{nombre} fuera de rango: {valor}")
+        try:
+            for validador in campo.validators:
+                validador(valor)
+        except ValidationError as e:
+            raise ValueError(f"{nombre}: {' '.join(e.messages)}")
+
+
+def validar_fila(tipo, row):
+    """Valida una fila del CSV y devuelve (codigo, defaults) sin organización.
+    No toca la BD, así puede ejecutarse en un proceso del pool (--workers).
+    """
+    if tipo == "material":
+        tipos = getattr(Material, "TIPOS_MATERIAL", [])
+        allowed_tipos = {k for k, _ in tipos}
+        codigo = (row.get("codigo") or "").strip()
+        nombre = (row.get("nombre") or "").strip()
+        tipo_val = (row.get("tipo") or "").strip().lower()
+        if allowed_tipos and tipo_val not in allowed_tipos:
+            # intentar mapear por etiqueta humana
+            etiqueta_map = {v.lower(): k for k, v in tipos}
+            tipo_val = etiqueta_map.get(tipo_val, tipo_val)
+        if allowed_tipos and tipo_val not in allowed_tipos:
+            raise ValueError(f"tipo inválido: {row.get('tipo')!r}")
+        espesor = parse_decimal(row.get("espesor"))
+        ancho = parse_int(row.get("ancho"))
+        largo = parse_int(row.get("largo"))
+        precio_m2 = parse_decimal(row.get("precio_m2"))
+        stock = parse_int(row.get("stock"), 0) or 0
+        proveedor = (row.get("proveedor") or "").strip() or None
+
+        if not codigo or not nombre:
+            raise ValueError("codigo y nombre son requeridos")
+        if not espesor or not ancho or not largo or not precio_m2:
+            raise ValueError("espesor, ancho, largo y precio_m2 son requeridos y numéricos")
+        if ancho <= 0 or largo <= 0:
+            raise ValueError("ancho y largo deben ser positivos")
+        # Misma normalización que Material.save() (bulk_create no pasa por save)
+        if largo > ancho:
+            ancho, largo = largo, ancho
+
+        defaults = {
+            "nombre": nombre,
+            "tipo": tipo_val,
+            "espesor": espesor,
+            "ancho": ancho,
+            "largo": largo,
+            "precio_m2": precio_m2,
+            "stock": stock,
+            "proveedor": proveedor,
+            "activo": True,
+        }
+        _ajustar_a_modelo(Material, {"codigo": codigo})
+        _ajustar_a_modelo(Material, defaults)
+        return codigo, defaults
+
+    # tapacanto
+    codigo = (row.get("codigo") or "").strip()
+    nombre = (row.get("nombre") or "").strip()
+    color = (row.get("color") or "").strip()
+    ancho = parse_decimal(row.get("ancho"))
+    espesor = parse_decimal(row.get("espesor"))
+    precio_metro = parse_decimal(row.get("precio_metro"))
+    stock_metros = parse_int(row.get("stock_metros"), 0) or 0
+    proveedor = (row.get("proveedor") or "").strip() or None
+
+    if not codigo or not nombre:
+        raise ValueError("codigo y nombre son requeridos")
+    if not color:
+        raise ValueError("color es requerido")
+    if not ancho or not espesor or not precio_metro:
+        raise ValueError("ancho, espesor y precio_metro son requeridos y numéricos")
+
+    defaults = {
+        "nombre": nombre,
+        "color": color,
+        "ancho": ancho,
+        "espesor": espesor,
+        "precio_metro": precio_metro,
+        "stock_metros": stock_metros,
+        "proveedor": proveedor,
+        "activo": True,
+    }
+    _ajustar_a_modelo(Tapacanto, {"codigo": codigo})
+    _ajustar_a_modelo(Tapacanto, defaults)
+    return codigo, defaults
+
+
+def _validar_lote(tipo, filas):
+    """Valida un lote [(linea, row)] → [(linea, org_codigo, org_nombre, codigo, defaults, error)]."""
+    resultado = []
+    for i, row in filas:
+        org_codigo = (row.get("organizacion_codigo") or "").strip() or None
+        org_nombre = (row.get("organizacion_nombre") or "").strip() or None
+        try:
+            codigo, defaults = validar_fila(tipo, row)
+            resultado.append((i, org_codigo, org_nombre, codigo, defaults, None))
+        except Exception as e:
+            resultado.append((i, org_codigo, org_nombre, None, None, str(e)))
+    return resultado
+
+
 class Command(BaseCommand):
     help = (
         "Importa un catálogo desde CSV: materiales o tapacantos, scoping por organización.\n\n"
@@ -43,7 +167,10 @@ class Command(BaseCommand):
         "  tipo ∈ {melamina, mdf, osb, terciado, aglomerado, otro}.\n"
         "- tapacanto: codigo,nombre,color,ancho,espesor,precio_metro,stock_metros,proveedor,(opcional)organizacion_codigo,organizacion_nombre\n\n"
         "Si no vienen columnas de organización, use --org-codigo o --org-nombre.\n"
-        "Upsert por (codigo, organizacion). Use --create-only para no actualizar existentes."
+        "Upsert por (codigo, organizacion). Use --create-only para no actualizar existentes.\n\n"
+        "Modo por lotes (--chunk N): confirma cada N filas con bulk upsert y guarda un checkpoint;\n"
+        "si la importación se interrumpe, --resume continúa desde la última fila confirmada.\n"
+        "--workers N valida los lotes en N procesos en paralelo."
     )
 
     def add_arguments(self, parser):
@@ -54,6 +181,10 @@ class Command(BaseCommand):
         parser.add_argument("--delimiter", default=",", help="Delimitador CSV (por defecto ,)")
         parser.add_argument("--dry-run", action="store_true", help="Valida sin guardar cambios")
         parser.add_argument("--create-only", action="store_true", help="Solo crea, no actualiza existentes")
+        parser.add_argument("--chunk", type=int, default=0, help="Filas por lote en modo por lotes (0 = una sola transacción, fila a fila)")
+        parser.add_argument("--resume", action="store_true", help="Continúa desde el checkpoint de una importación por lotes interrumpida")
+        parser.add_argument("--checkpoint", help="Ruta del archivo de checkpoint (por defecto <file>.checkpoint.json)")
+        parser.add_argument("--workers", type=int, default=1, help="Procesos para validar lotes en paralelo (solo con --chunk)")
 
     def handle(self, *args, **opts):
         tipo = opts["tipo"]
@@ -63,13 +194,24 @@ class Command(BaseCommand):
         create_only = opts["create_only"]
         org_codigo_def = (opts.get("org_codigo") or "").strip() or None
         org_nombre_def = (opts.get("org_nombre") or "").strip() or None
+        chunk = opts["chunk"]
+
+        if chunk < 0:
+            raise CommandError("--chunk debe ser >= 0")
+        if (opts["resume"] or opts["workers"] > 1) and not chunk:
+            raise CommandError("--resume y --workers requieren --chunk")
 
         if not org_codigo_def and not org_nombre_def:
             self.stdout.write("Nota: No se especificó organización por defecto; se esperará por fila en CSV si vienen columnas organizacion_codigo/organizacion_nombre.")
 
+        # Cache de organizaciones: (codigo, nombre) → Organizacion | None
+        self._orgs = {}
+        self._org_codigo_def = org_codigo_def
+        self._org_nombre_def = org_nombre_def
+
         # Validar archivo
         try:
-            f = open(path, "r", encoding="utf-8")
+            f = open(path, "r", encoding="utf-8", newline="")
         except OSError as e:
             raise CommandError(f"No se pudo abrir el archivo CSV: {e}")
 
@@ -80,11 +222,12 @@ class Command(BaseCommand):
             else:
                 required = ["codigo", "nombre", "color", "ancho", "espesor", "precio_metro", "stock_metros"]
 
-            missing = [h for h in required if h not in reader.fieldnames]
+            missing = [h for h in required if h not in (reader.fieldnames or [])]
             if missing:
                 raise CommandError(f"Faltan columnas requeridas en CSV: {', '.join(missing)}")
 
-            allowed_tipos = {k for k, _ in getattr(Material, "TIPOS_MATERIAL", [])}
+            if chunk:
+                return self._importar_por_lotes(reader, tipo, path, opts)
 
             created = 0
             updated = 0
@@ -93,115 +236,37 @@ class Command(BaseCommand):
 
             # Usar una transacción si no es dry-run
             context = transaction.atomic() if not dry_run else nullcontext()
+            model = Material if tipo == "material" else Tapacanto
 
-            with context:
+            # Una sola entrada de auditoría para toda la carga (no una por fila)
+            with context, auditoria_agrupada(f"Importación de catálogo ({tipo}) desde {path}"):
                 for i, row in enumerate(reader, start=2):  # start=2 por encabezado
                     # Resolver organización
-                    org_codigo = (row.get("organizacion_codigo") or org_codigo_def or "").strip() or None
-                    org_nombre = (row.get("organizacion_nombre") or org_nombre_def or "").strip() or None
-                    org = None
-                    if org_codigo:
-                        org = Organizacion.objects.filter(codigo=org_codigo).first()
-                    if not org and org_nombre:
-                        org = Organizacion.objects.filter(nombre=org_nombre).first()
+                    org_codigo = (row.get("organizacion_codigo") or "").strip() or None
+                    org_nombre = (row.get("organizacion_nombre") or "").strip() or None
+                    org = self._resolver_org(org_codigo, org_nombre)
                     if not org:
-                        self.stderr.write(f"[L{i}] Organización no encontrada (codigo={org_codigo!r}, nombre={org_nombre!r}). Fila omitida.")
+                        self.stderr.write(f"[L{i}] Organización no encontrada (codigo={org_codigo or org_codigo_def!r}, nombre={org_nombre or org_nombre_def!r}). Fila omitida.")
                         skipped += 1
                         continue
 
                     try:
-                        if tipo == "material":
-                            codigo = (row.get("codigo") or "").strip()
-                            nombre = (row.get("nombre") or "").strip()
-                            tipo_val = (row.get("tipo") or "").strip().lower()
-                            if allowed_tipos and tipo_val not in allowed_tipos:
-                                # intentar mapear por etiqueta humana
-                                etiqueta_map = {v.lower(): k for k, v in getattr(Material, "TIPOS_MATERIAL", [])}
-                                tipo_val = etiqueta_map.get(tipo_val, tipo_val)
-                            if allowed_tipos and tipo_val not in allowed_tipos:
-                                raise ValueError(f"tipo inválido: {row.get('tipo')!r}")
-                            espesor = parse_decimal(row.get("espesor"))
-                            ancho = parse_int(row.get("ancho"))
-                            largo = parse_int(row.get("largo"))
-                            precio_m2 = parse_decimal(row.get("precio_m2"))
-                            stock = parse_int(row.get("stock"), 0) or 0
-                            proveedor = (row.get("proveedor") or "").strip() or None
-
-                            if not codigo or not nombre:
-                                raise ValueError("codigo y nombre son requeridos")
-                            if not espesor or not ancho or not largo or not precio_m2:
-                                raise ValueError("espesor, ancho, largo y precio_m2 son requeridos y numéricos")
-                            if ancho <= 0 or largo <= 0:
-                                raise ValueError("ancho y largo deben ser positivos")
-
-                            # upsert por (codigo, organizacion)
-                            defaults = {
-                                "nombre": nombre,
-                                "tipo": tipo_val,
-                                "espesor": espesor,
-                                "ancho": ancho,
-                                "largo": largo,
-                                "precio_m2": precio_m2,
-                                "stock": stock,
-                                "proveedor": proveedor,
-                                "organizacion": org,
-                                "activo": True,
-                            }
-                            obj, was_created = Material.objects.get_or_create(
-                                codigo=codigo, organizacion=org, defaults=defaults
-                            )
-                            if was_created:
-                                created += 1
+                        codigo, defaults = validar_fila(tipo, row)
+                        defaults["organizacion"] = org
+                        # upsert por (codigo, organizacion)
+                        obj, was_created = model.objects.get_or_create(
+                            codigo=codigo, organizacion=org, defaults=defaults
+                        )
+                        if was_created:
+                            created += 1
+                        else:
+                            if create_only:
+                                skipped += 1
                             else:
-                                if create_only:
-                                    skipped += 1
-                                else:
-                                    for k, v in defaults.items():
-                                        setattr(obj, k, v)
-                                    obj.save()
-                                    updated += 1
-
-                        else:  # tapacanto
-                            codigo = (row.get("codigo") or "").strip()
-                            nombre = (row.get("nombre") or "").strip()
-                            color = (row.get("color") or "").strip()
-                            ancho = parse_decimal(row.get("ancho"))
-                            espesor = parse_decimal(row.get("espesor"))
-                            precio_metro = parse_decimal(row.get("precio_metro"))
-                            stock_metros = parse_int(row.get("stock_metros"), 0) or 0
-                            proveedor = (row.get("proveedor") or "").strip() or None
-
-                            if not codigo or not nombre:
-                                raise ValueError("codigo y nombre son requeridos")
-                            if not color:
-                                raise ValueError("color es requerido")
-                            if not ancho or not espesor or not precio_metro:
-                                raise ValueError("ancho, espesor y precio_metro son requeridos y numéricos")
-
-                            defaults = {
-                                "nombre": nombre,
-                                "color": color,
-                                "ancho": ancho,
-                                "espesor": espesor,
-                                "precio_metro": precio_metro,
-                                "stock_metros": stock_metros,
-                                "proveedor": proveedor,
-                                "organizacion": org,
-                                "activo": True,
-                            }
-                            obj, was_created = Tapacanto.objects.get_or_create(
-                                codigo=codigo, organizacion=org, defaults=defaults
-                            )
-                            if was_created:
-                                created += 1
-                            else:
-                                if create_only:
-                                    skipped += 1
-                                else:
-                                    for k, v in defaults.items():
-                                        setattr(obj, k, v)
-                                    obj.save()
-                                    updated += 1
+                                for k, v in defaults.items():
+                                    setattr(obj, k, v)
+                                obj.save()
+                                updated += 1
 
                     except Exception as e:
                         errors += 1
@@ -218,3 +283,217 @@ class Command(BaseCommand):
                 f"Importación finalizada: created={created}, updated={updated}, skipped={skipped}, errors={errors}"
             )
         )
+
+    def _resolver_org(self, org_codigo, org_nombre):
+        org_codigo = org_codigo or self._org_codigo_def
+        org_nombre = org_nombre or self._org_nombre_def
+        clave = (org_codigo, org_nombre)
+        if clave not in self._orgs:
+            org = None
+            if org_codigo:
+                org = Organizacion.objects.filter(codigo=org_codigo).first()
+            if not org and org_nombre:
+                org = Organizacion.objects.filter(nombre=org_nombre).first()
+            self._orgs[clave] = org
+        return self._orgs[clave]
+
+    # ── Modo por lotes ──────────────────────────────────────────────────────
+
+    def _importar_por_lotes(self, reader, tipo, path, opts):
+        chunk = opts["chunk"]
+        dry_run = opts["dry_run"]
+        workers = max(1, opts["workers"])
+        ruta_checkpoint = opts.get("checkpoint") or f"{path}.checkpoint.json"
+        firma = self._firma_archivo(path, tipo)
+
+        totales = {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
+        ultima_linea = 1
+        if opts["resume"]:
+            cp = self._leer_checkpoint(ruta_checkpoint)
+            if cp is None:
+                self.stdout.write("No hay checkpoint previo; se importa desde el inicio.")
+            elif cp.get("firma") != firma:
+                raise CommandError(
+                    f"El archivo cambió desde el checkpoint {ruta_checkpoint}; elimínelo para importar desde cero"
+                )
+            else:
+                ultima_linea = int(cp.get("linea") or 1)
+                totales.update(cp.get("totales") or {})
+                self.stdout.write(f"Reanudando después de la línea {ultima_linea}")
+
+        def lotes():
+            lote = []
+            for i, row in enumerate(reader, start=2):  # start=2 por encabezado
+                if i <= ultima_linea:
+                    continue
+                lote.append((i, row))
+                if len(lote) >= chunk:
+                    yield lote
+                    lote = []
+            if lote:
+                yield lote
+
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # map() respeta el orden de los lotes: los checkpoints siguen siendo monótonos.
+            # Se consume de a `workers` lotes para no leer el archivo completo a memoria.
+            validados = self._map_acotado(pool, tipo, lotes(), workers * 2)
+        else:
+            pool = None
+            validados = (_validar_lote(tipo, lote) for lote in lotes())
+
+        model = Material if tipo == "material" else Tapacanto
+        campos = CAMPOS_MATERIAL if tipo == "material" else CAMPOS_TAPACANTO
+        try:
+            with auditoria_agrupada(f"Importación de catálogo ({tipo}) desde {path}") as grupo:
+                for filas in validados:
+                    conteo = self._aplicar_lote(model, campos, filas, opts["create_only"], dry_run, grupo)
+                    for k, v in conteo.items():
+                        totales[k] += v
+                    ultima_linea = filas[-1][0]
+                    if not dry_run:
+                        self._guardar_checkpoint(ruta_checkpoint, firma, ultima_linea, totales)
+                    self.stdout.write(f"  … línea {ultima_linea}: created={totales['created']}, updated={totales['updated']}")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        resumen = (
+            f"created={totales['created']}, updated={totales['updated']}, "
+            f"skipped={totales['skipped']}, errors={totales['errors']}"
+        )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Dry-run: {resumen} (no se guardaron cambios)"))
+            return
+        # Importación completa: el checkpoint ya no sirve
+        if os.path.exists(ruta_checkpoint):
+            os.remove(ruta_checkpoint)
+        self.stdout.write(self.style.SUCCESS(f"Importación finalizada: {resumen}"))
+
+    @staticmethod
+    def _map_acotado(pool, tipo, lotes, en_vuelo):
+        pendientes = []
+        for lote in lotes:
+            pendientes.append(pool.submit(_validar_lote, tipo, lote))
+            if len(pendientes) >= en_vuelo:
+                yield pendientes.pop(0).result()
+        for fut in pendientes:
+            yield fut.result()
+
+    def _aplicar_lote(self, model, campos, filas, create_only, dry_run, grupo):
+        conteo = {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
+        # Agrupar por organización; dentro de cada una gana la última fila de cada código
+        por_org = {}
+        validas = []
+        for i, org_codigo, org_nombre, codigo, defaults, error in filas:
+            if error:
+                conteo["errors"] += 1
+                self.stderr.write(f"[L{i}] Error: {error}")
+                continue
+            org = self._resolver_org(org_codigo, org_nombre)
+            if not org:
+                conteo["skipped"] += 1
+                self.stderr.write(f"[L{i}] Organización no encontrada (codigo={org_codigo or self._org_codigo_def!r}, nombre={org_nombre or self._org_nombre_def!r}). Fila omitida.")
+                continue
+            filas_org = por_org.setdefault(org.id, (org, {}, []))
+            filas_org[1][codigo] = defaults
+            filas_org[2].append(codigo)
+            validas.append((i, org, codigo, defaults))
+
+        previo = dict(conteo)
+        try:
+            with (transaction.atomic() if not dry_run else nullcontext()):
+                sumas = self._upsert_masivo(model, campos, por_org, create_only, dry_run, conteo)
+        except Exception as e:
+            if dry_run or not validas:
+                raise
+            # Una fila que pasó la validación igual puede fallar en la BD: el lote se
+            # reintenta fila a fila y solo esas filas se reportan (el checkpoint avanza)
+            self.stderr.write(f"[L{validas[0][0]}-L{validas[-1][0]}] Lote rechazado por la BD ({e}); se reintenta fila a fila")
+            conteo = previo
+            self._aplicar_filas(model, validas, create_only, conteo)
+            return conteo
+        # Auditoría y cache solo de lo confirmado
+        for org, verbo, codigos in sumas:
+            grupo.sumar(verbo, model.__name__, len(codigos), codigos)
+        for org_id in {org.id for org, _, _ in sumas}:
+            invalidar_catalogo(org_id)
+        return conteo
+
+    @staticmethod
+    def _upsert_masivo(model, campos, por_org, create_only, dry_run, conteo):
+        """Bulk upsert por organización; devuelve ``[(org, verbo, codigos)]`` para auditar."""
+        sumas = []
+        for org, ultimas, codigos in por_org.values():
+            existentes = set(
+                model.objects.filter(organizacion=org, codigo__in=list(ultimas)).values_list("codigo", flat=True)
+            )
+            nuevos = [c for c in ultimas if c not in existentes]
+            if create_only:
+                # Repeticiones en el archivo de un código nuevo también se omiten
+                conteo["created"] += len(nuevos)
+                conteo["skipped"] += len(codigos) - len(nuevos)
+                objs = [model(codigo=c, organizacion=org, **ultimas[c]) for c in nuevos]
+                if objs and not dry_run:
+                    model.objects.bulk_create(objs, ignore_conflicts=True)
+                    sumas.append((org, "CREATE", nuevos))
+                continue
+            conteo["created"] += len(nuevos)
+            conteo["updated"] += len(codigos) - len(nuevos)
+            if dry_run:
+                continue
+            model.objects.bulk_create(
+                [model(codigo=c, organizacion=org, **d) for c, d in ultimas.items()],
+                update_conflicts=True,
+                unique_fields=["codigo", "organizacion"],
+                update_fields=campos,
+            )
+            # bulk_create no dispara señales: auditoría y catálogo cacheado a mano
+            sumas.append((org, "CREATE", nuevos))
+            sumas.append((org, "UPDATE", [c for c in ultimas if c in existentes]))
+        return sumas
+
+    def _aplicar_filas(self, model, filas, create_only, conteo):
+        """Respaldo fila a fila (como el modo sin --chunk): cada fila en su savepoint; las
+        señales auditan y limpian el catálogo cacheado."""
+        with transaction.atomic():
+            for i, org, codigo, defaults in filas:
+                try:
+                    with transaction.atomic():
+                        obj, creado = model.objects.get_or_create(codigo=codigo, organizacion=org, defaults=defaults)
+                        if creado:
+                            conteo["created"] += 1
+                        elif create_only:
+                            conteo["skipped"] += 1
+                        else:
+                            for k, v in defaults.items():
+                                setattr(obj, k, v)
+                            obj.save()
+                            conteo["updated"] += 1
+                except Exception as e:
+                    conteo["errors"] += 1
+                    self.stderr.write(f"[L{i}] Error: {e}")
+
+    @staticmethod
+    def _firma_archivo(path, tipo):
+        st = os.stat(path)
+        return {"archivo": os.path.abspath(path), "tipo": tipo, "tamano": st.st_size, "mtime": int(st.st_mtime)}
+
+    @staticmethod
+    def _leer_checkpoint(ruta):
+        try:
+            with open(ruta, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Checkpoint ilegible {ruta}: {e}")
+
+    @staticmethod
+    def _guardar_checkpoint(ruta, firma, linea, totales):
+        # Escritura atómica: nunca queda un checkpoint a medio escribir
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"firma": firma, "linea": linea, "totales": totales}, fh)
+        os.replace(tmp, ruta)
+
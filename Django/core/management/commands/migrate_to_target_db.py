@@ -2,17 +2,92 @@ import io
 import os
 import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urlparse, parse_qs
 
+from django.apps import apps as django_apps
 from django.conf import settings
-from django.core.management import BaseCommand, call_command
-from django.db import connections
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connections, transaction
+from django.db.models import Max
+
+from core.secuencias import sincronizar_public_id
+
+
+def _seleccionar_modelos(excludes, only_models):
+    """Devuelve (incluidos, excluidos) entre los modelos concretos administrados por Django,
+    incluidas las tablas intermedias M2M automáticas."""
+    excl = {e.lower() for e in excludes}
+    solo = {m.lower() for m in only_models}
+    incluidos, excluidos = [], set()
+    for model in django_apps.get_models(include_auto_created=True):
+        opts = model._meta
+        if opts.proxy or not opts.managed:
+            continue
+        label = opts.label_lower
+        if opts.auto_created:
+            # La tabla M2M sigue a su modelo propietario
+            propietario = opts.auto_created._meta
+            fuera = propietario.app_label in excl or propietario.label_lower in excl or (solo and propietario.label_lower not in solo)
+        else:
+            fuera = opts.app_label in excl or label in excl or (solo and label not in solo)
+        if fuera:
+            excluidos.add(model)
+        else:
+            incluidos.append(model)
+    if solo:
+        conocidos = {m._meta.label_lower for m in incluidos}
+        faltan = solo - conocidos
+        if faltan:
+            raise CommandError(f"Modelos desconocidos en --only: {', '.join(sorted(faltan))}")
+    return incluidos, excluidos
+
+
+def _niveles_por_dependencia(modelos):
+    """Agrupa los modelos en niveles: cada nivel solo tiene FKs hacia niveles anteriores
+    (o hacia sí mismo). Los ciclos restantes se rompen copiándolos juntos al final."""
+    pendientes = set(modelos)
+    deps = {
+        m: {
+            f.remote_field.model for f in m._meta.concrete_fields
+            if f.is_relation and f.remote_field.model in pendientes and f.remote_field.model is not m
+        }
+        for m in modelos
+    }
+    niveles = []
+    while pendientes:
+        nivel = [m for m in pendientes if not (deps[m] & pendientes)]
+        if not nivel:
+            nivel = list(pendientes)
+        nivel.sort(key=lambda m: m._meta.label)
+        niveles.append(nivel)
+        pendientes -= set(nivel)
+    return niveles
+
+
+@contextmanager
+def _sin_auto_now(modelos):
+    """bulk_create llama a pre_save: desactivar auto_now/auto_now_add para copiar las fechas originales."""
+    tocados = []
+    for model in modelos:
+        for f in model._meta.concrete_fields:
+            if getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False):
+                tocados.append((f, f.auto_now, f.auto_now_add))
+                f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in tocados:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
 
 
 class Command(BaseCommand):
     help = (
-        "Migra datos desde la BD 'default' a una BD 'target' usando dumpdata/loaddata. "
-        "La BD 'target' se toma de --target o de la variable TARGET_DATABASE_URL."
+        "Migra datos desde la BD 'default' a una BD 'target'. Por defecto copia tabla por tabla en "
+        "lotes ordenados por PK (memoria acotada, reanudable con --resume); --modo fixture usa "
+        "dumpdata/loaddata. La BD 'target' se toma de --target o de la variable TARGET_DATABASE_URL."
     )
 
     def add_arguments(self, parser):
@@ -68,6 +143,29 @@ class Command(BaseCommand):
             action="store_true",
             help="No realiza dump/loaddata; solo aplica migraciones y ajusta secuencias en target.",
         )
+        parser.add_argument(
+            "--modo",
+            choices=["stream", "fixture"],
+            default="stream",
+            help="stream: copia por lotes tabla a tabla (por defecto). fixture: dumpdata/loaddata completo en memoria.",
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=500,
+            help="Filas por lote en modo stream (por defecto 500; bajar si hay layouts muy grandes).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Tablas independientes copiadas en paralelo en modo stream (por defecto 1).",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Modo stream: continúa una copia interrumpida desde el mayor PK ya presente en target.",
+        )
         parser.add_argument(
             "--flush-target",
             action="store_true",
@@ -130,57 +228,21 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS("Migraciones aplicadas en target"))
 
         # Si se solicita, limpiar la BD de destino antes de cargar datos
-        if options.get("flush_target") and not options.get("dry_run") and not options.get("skip_load"):
+        if options.get("flush_target") and not options.get("dry_run") and not options.get("skip_load") and not options.get("resume"):
             self.stdout.write(self.style.WARNING("Realizando flush en la BD target (eliminará todos los datos administrados) ..."))
             call_command("flush", database="target", interactive=False, verbosity=1)
             self.stdout.write(self.style.SUCCESS("Flush en target completado"))
 
         if not options["skip_load"]:
-            # Generar dump desde default
-            if options.get("include_all"):
-                excludes = []
-            else:
-                excludes = options["excludes_override"] if options.get("excludes_override") else options["exclude"]
-            only_models = options.get("only_models") or []
-            if excludes:
-                self.stdout.write(f"Excluyendo: {', '.join(excludes)}")
-            if only_models:
-                self.stdout.write(f"Incluyendo sólo modelos: {', '.join(only_models)}")
-            buf = io.StringIO()
-            dump_kwargs = dict(
-                natural_foreign=True,
-                natural_primary=True,
-                exclude=excludes,
-                stdout=buf,
-                indent=2,
-            )
-            # Si se especificó sólo modelos, se pasan como args posicionales
-            if only_models:
-                call_command("dumpdata", *only_models, **dump_kwargs)
+            if options["modo"] == "fixture":
+                cargado = self._cargar_fixture(options)
             else:
-                call_command("dumpdata", **dump_kwargs)
-            data = buf.getvalue()
-            if not data.strip().startswith("["):
-                self.stderr.write(self.style.ERROR("Dump inesperado o vacío."))
-                sys.exit(1)
-
-            with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as tmp:
-                tmp.write(data)
-                tmp_path = tmp.name
-            self.stdout.write(f"Dump temporal: {tmp_path}")
-
-            if options["dry_run"]:
-                self.stdout.write(self.style.WARNING("DRY-RUN: no se cargarán datos en target."))
+                cargado = self._copiar_streaming(options)
+            if not cargado:
                 return
 
-            # Cargar en target
-            self.stdout.write("Cargando datos en target (loaddata)...")
-            call_command("loaddata", tmp_path, database="target", verbosity=1)
-            self.stdout.write(self.style.SUCCESS("Datos cargados en target"))
-
         # Reset de secuencias para apps relevantes
         self.stdout.write("Reiniciando secuencias en target...")
-        from django.apps import apps as django_apps
         app_labels = [app.label for app in django_apps.get_app_configs()]
         sql_buf = io.StringIO()
         call_command("sqlsequencereset", *app_labels, database="target", stdout=sql_buf)
@@ -194,4 +256,173 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS("Secuencias ajustadas en target"))
             except Exception as e:
                 self.stdout.write(self.style.WARNING(f"No se pudo ajustar secuencias: {e}"))
+        # sqlsequencereset solo cubre los id serial/identity; la secuencia de public_id
+        # (core.secuencias) se adelanta aparte hasta MAX(public_id) del destino
+        try:
+            sincronizar_public_id(using="target")
+            self.stdout.write(self.style.SUCCESS("Secuencia de public_id ajustada en target"))
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"No se pudo ajustar la secuencia de public_id: {e}"))
         self.stdout.write(self.style.SUCCESS("Migración de datos COMPLETADA"))
+
+    def _exclusiones(self, options):
+        if options.get("include_all"):
+            excludes = []
+        else:
+            excludes = options["excludes_override"] if options.get("excludes_override") else options["exclude"]
+        only_models = options.get("only_models") or []
+        if excludes:
+            self.stdout.write(f"Excluyendo: {', '.join(excludes)}")
+        if only_models:
+            self.stdout.write(f"Incluyendo sólo modelos: {', '.join(only_models)}")
+        return excludes, only_models
+
+    # ── Modo streaming ──────────────────────────────────────────────────────
+
+    def _copiar_streaming(self, options):
+        """Copia tabla por tabla en lotes ordenados por PK (memoria acotada).
+
+        - Orden por dependencias de FK: cada nivel solo depende de niveles anteriores
+          y sus tablas se copian en paralelo (--workers).
+        - Tablas excluidas con natural key (contenttypes, permisos) no se copian: las
+          FKs hacia ellas se remapean a los ids que ya existen en target.
+        - --resume continúa cada tabla desde el mayor PK presente en target (cada lote
+          se inserta en su propia transacción, así ese valor es un punto de corte exacto).
+        """
+        excludes, only_models = self._exclusiones(options)
+        incluidos, excluidos = _seleccionar_modelos(excludes, only_models)
+        niveles = _niveles_por_dependencia(incluidos)
+        chunk = options["chunk"]
+        if chunk <= 0:
+            raise CommandError("--chunk debe ser > 0")
+        workers = max(1, options["workers"])
+
+        if options["dry_run"]:
+            for n, nivel in enumerate(niveles, start=1):
+                self.stdout.write(f"Nivel {n}: " + ", ".join(
+                    f"{m._meta.label} ({m._base_manager.using('default').count()})" for m in nivel
+                ))
+            self.stdout.write(self.style.WARNING("DRY-RUN: no se copiarán datos a target."))
+            return False
+
+        remapeos = self._remapeos_naturales(incluidos, excluidos)
+        self._lock_salida = threading.Lock()
+        with _sin_auto_now(incluidos):
+            for n, nivel in enumerate(niveles, start=1):
+                self.stdout.write(f"Nivel {n}/{len(niveles)}: {len(nivel)} tabla(s)")
+                if workers == 1 or len(nivel) == 1:
+                    for model in nivel:
+                        self._copiar_modelo(model, chunk, options["resume"], remapeos)
+                    continue
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futuros = [
+                        pool.submit(self._copiar_modelo_en_hilo, model, chunk, options["resume"], remapeos)
+                        for model in nivel
+                    ]
+                    for fut in futuros:
+                        fut.result()
+        self.stdout.write(self.style.SUCCESS("Datos copiados en target"))
+        return True
+
+    def _copiar_modelo_en_hilo(self, model, chunk, resume, remapeos):
+        try:
+            return self._copiar_modelo(model, chunk, resume, remapeos)
+        finally:
+            # Las conexiones de Django son por hilo
+            connections.close_all()
+
+    def _copiar_modelo(self, model, chunk, resume, remapeos):
+        pk = model._meta.pk
+        origen = model._base_manager.using("default")
+        destino = model._base_manager.using("target")
+        ultimo = None
+        if resume:
+            ultimo = destino.aggregate(m=Max(pk.attname))["m"]
+        fk_remapear = [
+            (f.attname, remapeos[f.remote_field.model])
+            for f in model._meta.concrete_fields
+            if f.is_relation and f.remote_field.model in remapeos
+        ]
+        copiadas = 0
+        while True:
+            qs = origen.order_by(pk.attname)
+            if ultimo is not None:
+                qs = qs.filter(**{f"{pk.attname}__gt": ultimo})
+            lote = list(qs[:chunk])
+            if not lote:
+                break
+            for obj in lote:
+                for attname, mapa in fk_remapear:
+                    valor = getattr(obj, attname)
+                    if valor is not None:
+                        setattr(obj, attname, mapa.get(valor, valor))
+            with transaction.atomic(using="target"):
+                destino.bulk_create(lote, batch_size=chunk)
+            ultimo = getattr(lote[-1], pk.attname)
+            copiadas += len(lote)
+            del lote
+        with self._lock_salida:
+            self.stdout.write(f"  {model._meta.label}: {copiadas} fila(s)")
+        return copiadas
+
+    def _remapeos_naturales(self, incluidos, excluidos):
+        """{modelo_excluido: {pk_origen: pk_target}} para los modelos excluidos
+        referenciados por FK que tienen natural key (ContentType, Permission)."""
+        referenciados = {
+            f.remote_field.model
+            for m in incluidos for f in m._meta.concrete_fields
+            if f.is_relation and f.remote_field.model in excluidos
+        }
+        remapeos = {}
+        for model in referenciados:
+            if not hasattr(model, "natural_key") or not hasattr(model._default_manager, "get_by_natural_key"):
+                self.stdout.write(self.style.WARNING(
+                    f"{model._meta.label} está excluido y no tiene natural key: sus FKs se copian sin remapear"
+                ))
+                continue
+            mapa = {}
+            manager_target = model._default_manager.db_manager("target")
+            for obj in model._default_manager.using("default").iterator():
+                try:
+                    mapa[obj.pk] = manager_target.get_by_natural_key(*obj.natural_key()).pk
+                except model.DoesNotExist:
+                    pass
+            remapeos[model] = mapa
+        return remapeos
+
+    def _cargar_fixture(self, options):
+        """Modo clásico: dumpdata completo en memoria + loaddata en target."""
+        # Generar dump desde default
+        excludes, only_models = self._exclusiones(options)
+        buf = io.StringIO()
+        dump_kwargs = dict(
+            natural_foreign=True,
+            natural_primary=True,
+            exclude=excludes,
+            stdout=buf,
+            indent=2,
+        )
+        # Si se especificó sólo modelos, se pasan como args posicionales
+        if only_models:
+            call_command("dumpdata", *only_models, **dump_kwargs)
+        else:
+            call_command("dumpdata", **dump_kwargs)
+        data = buf.getvalue()
+        if not data.strip().startswith("["):
+            self.stderr.write(self.style.ERROR("Dump inesperado o vacío."))
+            sys.exit(1)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as tmp:
+            tmp.write(data)
+            tmp_path = tmp.name
+        self.stdout.write(f"Dump temporal: {tmp_path}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("DRY-RUN: no se cargarán datos en target."))
+            return False
+
+        # Cargar en target
+        self.stdout.write("Cargando datos en target (loaddata)...")
+        call_command("loaddata", tmp_path, database="target", verbosity=1)
+        self.stdout.write(self.style.SUCCESS("Datos cargados en target"))
+        return True
@@ -10,6 +10,7 @@ from core.models import (
     Conversacion,
     Mensaje,
     MensajeLeido,
+    LecturaConversacion,
 )
 
 
@@ -28,6 +29,7 @@ class Command(BaseCommand):
             "Conversaciones": Conversacion.objects.count(),
             "Mensajes": Mensaje.objects.count(),
             "MensajesLeidos": MensajeLeido.objects.count(),
+            "LecturasConversacion": LecturaConversacion.objects.count(),
         }
         for label, value in counts.items():
             self.stdout.write(f"{label}: {value}")
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from core.models import Organizacion, UsuarioPerfilOptimizador, Material, Tapacanto, Cliente, Proyecto
+from core.secuencias import siguiente_public_id
 from django.utils import timezone
 from django.utils.text import slugify
 from django.conf import settings
@@ -188,8 +189,6 @@ class Command(BaseCommand):
             tap_default = Tapacanto.objects.filter(organizacion=org, activo=True).order_by('id').first()
 
             # Crear 15 proyectos por organización (uno por cliente)
-            public_id_seed = (Proyecto.objects.exclude(public_id__isnull=True).order_by('-public_id').first().public_id + 1) if Proyecto.objects.exclude(public_id__isnull=True).exists() else 100
-
             for pidx, cli in enumerate(clientes, start=1):
                 codigo = f"PROJ-{code}-{pidx:03d}"
                 nombre_proy = f"Muebles Demo {pidx:02d}"
@@ -276,8 +275,7 @@ class Command(BaseCommand):
                             proyecto.eficiencia_promedio = resultado_persist['eficiencia_promedio']
                             proyecto.estado = 'optimizado'
                             # Asignar un public_id global incremental
-                            proyecto.public_id = public_id_seed
-                            public_id_seed += 1
+                            proyecto.public_id = siguiente_public_id()
                             proyecto.save()
 
                             # Generar PDF del layout
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.secuencias import sincronizar_public_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Adelanta el contador de Proyecto.public_id hasta el máximo existente.\n"
+        "Ejecutar tras un loaddata o una copia de datos para que no se entreguen ids repetidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Alias de la BD (por defecto 'default')")
+
+    def handle(self, *args, **options):
+        sincronizar_public_id(using=options["database"])
+        self.stdout.write(self.style.SUCCESS(f"Secuencia de public_id sincronizada en '{options['database']}'"))
@@ -22,7 +22,8 @@ class RequestUserMiddleware:
     """Middleware minimal que guarda la request actual en una variable thread-local.
 
     Esto permite que señales y otros hooks accedan al usuario que originó la petición
-    sin requerir modificar todas las llamadas manualmente.
+    sin requerir modificar todas las llamadas manualmente. También abre el buffer de
+    auditoría de la request (ver core.audit).
     """
 
     def __init__(self, get_response):
@@ -35,7 +36,10 @@ class RequestUserMiddleware:
         except Exception:
             pass
 
-        response = self.get_response(request)
+        # Las entradas de auditoría de la request se insertan en un solo lote al terminar
+        from .audit import buffer_auditoria
+        with buffer_auditoria():
+            response = self.get_response(request)
 
         # Intentamos limpiar la referencia para evitar fugas de memoria en servidores persistentes
         try:
@@ -57,3 +61,33 @@ class AutoServicioIsolationMiddleware:
     def __call__(self, request):
         # Middleware desactivado - permitir acceso completo
         return self.get_response(request)
+
+
+class ReplicaStickyMiddleware:
+    """Read-your-writes para el router de réplica (ver core.db_router).
+
+    Si la request escribió en la BD, deja una cookie corta para que las siguientes
+    requests de la misma sesión lean del primario mientras la réplica se pone al día.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from django.conf import settings
+        from .db_router import COOKIE_STICKY, alias_replica, fijar_primario, hubo_escritura
+        if alias_replica() is None:
+            return self.get_response(request)
+
+        fijar_primario(bool(request.COOKIES.get(COOKIE_STICKY)))
+        try:
+            response = self.get_response(request)
+            if hubo_escritura():
+                response.set_cookie(
+                    COOKIE_STICKY, '1',
+                    max_age=int(getattr(settings, 'DATABASE_REPLICA_STICKY_SEGUNDOS', 10)),
+                    httponly=True, samesite='Lax',
+                )
+        finally:
+            fijar_primario(False)
+        return response
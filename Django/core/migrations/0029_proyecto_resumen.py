@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_rename_subordinador_to_subordinado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProyectoResumen',
+            fields=[
+                ('proyecto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='core.proyecto', verbose_name='Proyecto')),
+                ('total_tableros', models.IntegerField(default=0, verbose_name='Total de Tableros')),
+                ('total_piezas', models.IntegerField(default=0, verbose_name='Total de Piezas')),
+                ('total_piezas_cortadas', models.IntegerField(default=0, verbose_name='Piezas Cortadas')),
+                ('total_cortes', models.IntegerField(default=0, verbose_name='Total de Cortes')),
+                ('metros_tapacanto', models.FloatField(default=0, verbose_name='Metros de Tapacanto')),
+                ('tiene_tapacanto', models.BooleanField(default=False, verbose_name='Tiene Tapacanto')),
+                ('pct_avance', models.FloatField(default=0, verbose_name='Avance (%)')),
+                ('materiales', models.JSONField(blank=True, default=list, verbose_name='Resumen por Material')),
+                ('actualizado_en', models.DateTimeField(auto_now=True, verbose_name='Actualizado en')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Proyecto',
+                'verbose_name_plural': 'Resúmenes de Proyecto',
+            },
+        ),
+        migrations.AlterField(
+            model_name='usuarioperfiloptimizador',
+            name='rol',
+            field=models.CharField(choices=[('super_admin', 'Super Administrador'), ('org_admin', 'Administrador de Organización'), ('vendedor', 'Vendedor'), ('subordinado', 'Subordinado'), ('operador', 'Operador'), ('enchapador', 'Enchapador'), ('supervisor', 'Supervisor'), ('autoservicio', 'Autoservicio')], default='vendedor', max_length=20, verbose_name='Rol'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:37
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_proyecto_resumen'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='proyecto',
+            name='configuracion',
+            field=core.fields.CompressedJSONField(blank=True, null=True, verbose_name='Configuración del Proyecto'),
+        ),
+        migrations.AlterField(
+            model_name='proyecto',
+            name='resultado_optimizacion',
+            field=core.fields.CompressedJSONField(blank=True, null=True, verbose_name='Resultado de Optimización'),
+        ),
+    ]
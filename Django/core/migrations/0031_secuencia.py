@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:39
+
+from django.db import migrations, models
+
+
+PUBLIC_ID_SEQ = 'core_proyecto_public_id_seq'
+
+
+def crear_sequence_public_id(apps, schema_editor):
+    """En PostgreSQL, crear la SEQUENCE nativa de public_id a partir del máximo actual."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Proyecto = apps.get_model('core', 'Proyecto')
+    ultimo = Proyecto.objects.aggregate(m=models.Max('public_id'))['m'] or 0
+    inicio = max(ultimo + 1, 100)
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {PUBLIC_ID_SEQ} START WITH {int(inicio)}")
+
+
+def eliminar_sequence_public_id(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {PUBLIC_ID_SEQ}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_compressed_json_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Último valor asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+            },
+        ),
+        migrations.RunPython(crear_sequence_public_id, eliminar_sequence_public_id),
+    ]
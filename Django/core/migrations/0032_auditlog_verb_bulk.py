@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_secuencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='verb',
+            field=models.CharField(choices=[('LOGIN', 'LOGIN'), ('CREATE', 'CREATE'), ('UPDATE', 'UPDATE'), ('DELETE', 'DELETE'), ('RUN_OPT', 'RUN_OPT'), ('MOVE', 'MOVE'), ('EDIT', 'EDIT'), ('BULK', 'BULK')], max_length=20, verbose_name='Acción'),
+        ),
+    ]
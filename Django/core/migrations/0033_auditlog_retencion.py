@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_auditlog_verb_bulk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('verb', models.CharField(choices=[('LOGIN', 'LOGIN'), ('CREATE', 'CREATE'), ('UPDATE', 'UPDATE'), ('DELETE', 'DELETE'), ('RUN_OPT', 'RUN_OPT'), ('MOVE', 'MOVE'), ('EDIT', 'EDIT'), ('BULK', 'BULK')], max_length=20, verbose_name='Acción')),
+                ('target_model', models.CharField(max_length=120, verbose_name='Modelo')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Resumen de auditoría',
+                'verbose_name_plural': 'Resúmenes de auditoría',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['verb', 'created_at'], name='audit_verb_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='auditlogresumen',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogresumen',
+            index=models.Index(fields=['organizacion', 'fecha'], name='audit_resumen_org_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditlogresumen',
+            constraint=models.UniqueConstraint(fields=('fecha', 'organizacion', 'verb', 'target_model'), name='audit_resumen_unico'),
+        ),
+    ]
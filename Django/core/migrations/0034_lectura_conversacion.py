@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_lecturas(apps, schema_editor):
+    MensajeLeido = apps.get_model('core', 'MensajeLeido')
+    LecturaConversacion = apps.get_model('core', 'LecturaConversacion')
+    # Marca inicial: el mayor mensaje con fila de lectura por usuario y conversación
+    marcas = (MensajeLeido.objects.values('usuario_id', 'mensaje__conversacion_id')
+              .annotate(ultimo=models.Max('mensaje_id')).order_by())
+    LecturaConversacion.objects.bulk_create([
+        LecturaConversacion(usuario_id=m['usuario_id'], conversacion_id=m['mensaje__conversacion_id'],
+                            ultimo_leido_id=m['ultimo'])
+        for m in marcas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0033_auditlog_retencion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaConversacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_leido_id', models.BigIntegerField(default=0, verbose_name='Último mensaje leído')),
+                ('actualizado_en', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Actualizado en')),
+            ],
+            options={
+                'verbose_name': 'Lectura de conversación',
+                'verbose_name_plural': 'Lecturas de conversación',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['conversacion', 'id'], name='mensaje_conv_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='lecturaconversacion',
+            name='conversacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas', to='core.conversacion', verbose_name='Conversación'),
+        ),
+        migrations.AddField(
+            model_name='lecturaconversacion',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_chat', to=settings.AUTH_USER_MODEL, verbose_name='Usuario'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='lecturaconversacion',
+            unique_together={('usuario', 'conversacion')},
+        ),
+        migrations.RunPython(backfill_lecturas, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .fields import CompressedJSONField
+
 class Organizacion(models.Model):
     """Modelo para organizaciones/empresas del sistema"""
     codigo = models.CharField(max_length=20, unique=True, verbose_name="Código")
@@ -192,8 +194,9 @@ class Proyecto(models.Model):
     correlativo = models.IntegerField(default=0, verbose_name="Correlativo")
     version = models.IntegerField(default=0, verbose_name="Versión")
     # Nuevos campos para el optimizador
-    configuracion = models.JSONField(blank=True, null=True, verbose_name="Configuración del Proyecto")
-    resultado_optimizacion = models.JSONField(blank=True, null=True, verbose_name="Resultado de Optimización")
+    # Campos grandes: se guardan comprimidos (ver core.fields.CompressedJSONField)
+    configuracion = CompressedJSONField(blank=True, null=True, verbose_name="Configuración del Proyecto")
+    resultado_optimizacion = CompressedJSONField(blank=True, null=True, verbose_name="Resultado de Optimización")
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuario", related_name="proyectos_optimizador")
     creado_por = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Creado por")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
@@ -232,6 +235,57 @@ class Proyecto(models.Model):
             # Fallback robusto
             return f"{self.correlativo}-{self.version}"
 
+
+class ProyectoResumen(models.Model):
+    """Resumen denormalizado de un proyecto (tableros, piezas, cortes, tapacanto, avance).
+    Se recalcula al guardar resultado_optimizacion (layout o estados de pieza), de modo que
+    los endpoints de resumen son una lectura indexada independiente del tamaño del proyecto.
+    """
+    proyecto = models.OneToOneField(Proyecto, on_delete=models.CASCADE, primary_key=True, related_name='resumen', verbose_name="Proyecto")
+    total_tableros = models.IntegerField(default=0, verbose_name="Total de Tableros")
+    total_piezas = models.IntegerField(default=0, verbose_name="Total de Piezas")
+    total_piezas_cortadas = models.IntegerField(default=0, verbose_name="Piezas Cortadas")
+    total_cortes = models.IntegerField(default=0, verbose_name="Total de Cortes")
+    metros_tapacanto = models.FloatField(default=0, verbose_name="Metros de Tapacanto")
+    tiene_tapacanto = models.BooleanField(default=False, verbose_name="Tiene Tapacanto")
+    # Avance sobre las piezas (sin aplicar el estado del proyecto, que se evalúa al leer)
+    pct_avance = models.FloatField(default=0, verbose_name="Avance (%)")
+    materiales = models.JSONField(default=list, blank=True, verbose_name="Resumen por Material")
+    actualizado_en = models.DateTimeField(auto_now=True, verbose_name="Actualizado en")
+
+    class Meta:
+        verbose_name = "Resumen de Proyecto"
+        verbose_name_plural = "Resúmenes de Proyecto"
+
+    def __str__(self):
+        return f"Resumen {self.proyecto_id}: {self.total_tableros} tableros / {self.total_piezas} piezas"
+
+    @classmethod
+    def sincronizar(cls, proyecto, resultado=None):
+        """Recalcula y persiste el resumen a partir del layout del proyecto."""
+        from .resumen_utils import calcular_resumen
+        if resultado is None:
+            resultado = proyecto.resultado_optimizacion
+        datos = calcular_resumen(resultado)
+        resumen, _ = cls.objects.update_or_create(proyecto_id=proyecto.pk, defaults=datos)
+        return resumen
+
+
+class Secuencia(models.Model):
+    """Contador con incremento atómico para asignar IDs (public_id, correlativo por cliente).
+    Ver core.secuencias para el asignador; en PostgreSQL public_id usa además una SEQUENCE nativa.
+    """
+    nombre = models.CharField(max_length=100, unique=True, verbose_name="Nombre")
+    valor = models.BigIntegerField(default=0, verbose_name="Último valor asignado")
+
+    class Meta:
+        verbose_name = "Secuencia"
+        verbose_name_plural = "Secuencias"
+
+    def __str__(self):
+        return f"{self.nombre} = {self.valor}"
+
+
 class MaterialProyecto(models.Model):
     """Modelo para materiales utilizados en cada proyecto"""
     proyecto = models.ForeignKey(Proyecto, on_delete=models.CASCADE, related_name='materiales_utilizados')
@@ -341,25 +395,27 @@ class Conversacion(models.Model):
         return self.mensajes.order_by('-enviado_en').first()
     
     def mensajes_no_leidos(self, usuario):
-        """Cuenta los mensajes no leídos para un usuario específico"""
-        return self.mensajes.exclude(autor=usuario).filter(leido=False).count()
+        """Cuenta los mensajes no leídos para un usuario específico (posteriores a su marca de lectura)"""
+        lectura = self.lecturas.filter(usuario=usuario).values_list('ultimo_leido_id', flat=True).first()
+        return self.mensajes.exclude(autor=usuario).filter(id__gt=lectura or 0).count()
     
     def otros_participantes(self, usuario_actual):
         """Obtiene los participantes excepto el usuario actual"""
         return self.participantes.exclude(id=usuario_actual.id)
     
     def nombre_display(self, usuario_actual):
-        """Obtiene el nombre para mostrar en la interfaz"""
+        """Obtiene el nombre para mostrar en la interfaz.
+        Sin consultas si los participantes vienen con prefetch_related; si no, una sola."""
         if self.nombre:
             return self.nombre
-        elif self.es_grupal:
-            return f"Grupo ({self.participantes.count()} miembros)"
-        else:
-            otros = self.otros_participantes(usuario_actual)
-            if otros.exists():
-                otro_usuario = otros.first()
-                return otro_usuario.get_full_name() or otro_usuario.username
-            return "Conversación vacía"
+        participantes = list(self.participantes.all())
+        if self.es_grupal:
+            return f"Grupo ({len(participantes)} miembros)"
+        otros = [u for u in participantes if u.id != usuario_actual.id]
+        if otros:
+            otro_usuario = otros[0]
+            return otro_usuario.get_full_name() or otro_usuario.username
+        return "Conversación vacía"
     
     @property
     def fecha_actualizacion(self):
@@ -373,6 +429,7 @@ class Mensaje(models.Model):
     autor = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Autor")
     contenido = models.TextField(verbose_name="Contenido")
     enviado_en = models.DateTimeField(auto_now_add=True, verbose_name="Enviado en")
+    # Obsoleto: era un indicador global (incorrecto en grupos); la lectura es por usuario en LecturaConversacion
     leido = models.BooleanField(default=False, verbose_name="Leído")
     editado = models.BooleanField(default=False, verbose_name="Editado")
     editado_en = models.DateTimeField(blank=True, null=True, verbose_name="Editado en")
@@ -384,6 +441,10 @@ class Mensaje(models.Model):
         verbose_name = "Mensaje"
         verbose_name_plural = "Mensajes"
         ordering = ['enviado_en']
+        indexes = [
+            # Conteo de no leídos: rango id > marca de lectura dentro de la conversación
+            models.Index(fields=["conversacion", "id"], name="mensaje_conv_id_idx"),
+        ]
     
     def __str__(self):
         return f"{self.autor.get_full_name() or self.autor.username}: {self.contenido[:50]}..."
@@ -411,7 +472,9 @@ class Mensaje(models.Model):
 
 
 class MensajeLeido(models.Model):
-    """Modelo para trackear qué mensajes ha leído cada usuario"""
+    """Modelo para trackear qué mensajes ha leído cada usuario.
+    Histórico: la lectura se registra ahora con LecturaConversacion (una fila por
+    usuario y conversación) y ya no se crean filas nuevas."""
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuario")
     mensaje = models.ForeignKey(Mensaje, on_delete=models.CASCADE, verbose_name="Mensaje")
     leido_en = models.DateTimeField(auto_now_add=True, verbose_name="Leído en")
@@ -425,6 +488,40 @@ class MensajeLeido(models.Model):
         return f"{self.usuario.username} leyó mensaje {self.mensaje.id}"
 
 
+class LecturaConversacion(models.Model):
+    """Marca de lectura de un usuario en una conversación: el id del último mensaje leído.
+    Los mensajes ajenos con id mayor son los no leídos; marcar como leído es un solo UPDATE."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="lecturas_chat", verbose_name="Usuario")
+    conversacion = models.ForeignKey(Conversacion, on_delete=models.CASCADE, related_name="lecturas", verbose_name="Conversación")
+    ultimo_leido_id = models.BigIntegerField(default=0, verbose_name="Último mensaje leído")
+    actualizado_en = models.DateTimeField(default=timezone.now, verbose_name="Actualizado en")
+
+    class Meta:
+        verbose_name = "Lectura de conversación"
+        verbose_name_plural = "Lecturas de conversación"
+        unique_together = ['usuario', 'conversacion']
+
+    def __str__(self):
+        return f"{self.usuario.username} leyó {self.conversacion_id} hasta {self.ultimo_leido_id}"
+
+    @classmethod
+    def marcar(cls, usuario_id, conversacion_id, mensaje_id) -> bool:
+        """Avanza la marca hasta ``mensaje_id`` (nunca retrocede). True si avanzó.
+        Caso habitual: un UPDATE; la primera lectura de la conversación inserta la fila."""
+        ahora = timezone.now()
+        filtro = {'usuario_id': usuario_id, 'conversacion_id': conversacion_id}
+        if cls.objects.filter(ultimo_leido_id__lt=mensaje_id, **filtro).update(
+                ultimo_leido_id=mensaje_id, actualizado_en=ahora):
+            return True
+        _, creada = cls.objects.get_or_create(
+            defaults={'ultimo_leido_id': mensaje_id, 'actualizado_en': ahora}, **filtro)
+        if creada:
+            return True
+        # La fila ya existía (con una marca igual o mayor) o la creó otra petición a la vez
+        return bool(cls.objects.filter(ultimo_leido_id__lt=mensaje_id, **filtro).update(
+            ultimo_leido_id=mensaje_id, actualizado_en=ahora))
+
+
 class AuditLog(models.Model):
     """Registro de auditoría de acciones del sistema"""
     VERBS = [
@@ -435,6 +532,7 @@ class AuditLog(models.Model):
         ("RUN_OPT", "RUN_OPT"),
         ("MOVE", "MOVE"),
         ("EDIT", "EDIT"),
+        ("BULK", "BULK"),
     ]
     actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Actor")
     organizacion = models.ForeignKey(Organizacion, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Organización")
@@ -452,12 +550,39 @@ class AuditLog(models.Model):
         indexes = [
             models.Index(fields=["organizacion", "created_at"], name="audit_org_fecha_idx"),
             models.Index(fields=["actor", "created_at"], name="audit_actor_fecha_idx"),
+            # Barrido de retención por verbo y antigüedad (manage.py depurar_auditoria)
+            models.Index(fields=["verb", "created_at"], name="audit_verb_fecha_idx"),
         ]
 
     def __str__(self):
         return f"{self.verb} {self.target_model}({self.target_id}) por {self.actor_id or 'sistema'}"
 
 
+class AuditLogResumen(models.Model):
+    """Conteos diarios de entradas de AuditLog ya depuradas (ver manage.py depurar_auditoria).
+    Conserva la actividad histórica agregada cuando el detalle se elimina de la tabla principal.
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    organizacion = models.ForeignKey(Organizacion, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Organización")
+    verb = models.CharField(max_length=20, choices=AuditLog.VERBS, verbose_name="Acción")
+    target_model = models.CharField(max_length=120, verbose_name="Modelo")
+    total = models.PositiveIntegerField(default=0, verbose_name="Total")
+
+    class Meta:
+        verbose_name = "Resumen de auditoría"
+        verbose_name_plural = "Resúmenes de auditoría"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "organizacion", "verb", "target_model"], name="audit_resumen_unico"),
+        ]
+        indexes = [
+            models.Index(fields=["organizacion", "fecha"], name="audit_resumen_org_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.verb} {self.target_model}: {self.total}"
+
+
 class OptimizationRun(models.Model):
     """Ejecución del optimizador asociada a un proyecto"""
     organizacion = models.ForeignKey(Organizacion, on_delete=models.CASCADE, verbose_name="Organización")
@@ -0,0 +1,147 @@
+"""Notificaciones persistentes de operador y enchapador.
+
+- ``notificar_operador(proyecto, operador_id)`` crea la notificación del operador asignado.
+- ``notificar_enchapadores(proyecto)`` avisa a todos los enchapadores de la organización
+  con un solo ``bulk_create``. Se ejecuta tras el commit en un hilo de fondo por proceso
+  (como la auditoría, ``NOTIFICACIONES_EN_SEGUNDO_PLANO``), así que completar un proyecto
+  no espera a la cantidad de enchapadores de la organización.
+- Tras escribir las filas se publica un evento en el canal de cada destinatario
+  (``core.eventos``); el stream unificado (/api/eventos) lo entrega sin polling.
+- ``pendientes(user_id, cursor)`` lee las notificaciones a entregar: las no leídas, o las
+  posteriores al cursor ``"<id operador>.<id enchapador>"`` cuando el cliente reconecta.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .eventos import canal_notificaciones, publicar
+from .segundo_plano import ColaEnSegundoPlano
+
+logger = logging.getLogger(__name__)
+
+OPERADOR = 'operador'
+ENCHAPADOR = 'enchapador'
+COLA_MAX = 1000
+
+
+def _ejecutar(tarea):
+    funcion, args = tarea
+    try:
+        funcion(*args)
+    except Exception:
+        # Una notificación fallida no debe romper la operación que la originó
+        logger.exception("No se pudieron enviar notificaciones (%s)", getattr(funcion, '__name__', funcion))
+
+
+_hilo = ColaEnSegundoPlano('notificaciones', _ejecutar, maximo=COLA_MAX)
+
+
+def _encolar(funcion, args):
+    if not getattr(settings, 'NOTIFICACIONES_EN_SEGUNDO_PLANO', True):
+        _ejecutar((funcion, args))
+        return
+    _hilo.enviar((funcion, args))
+
+
+def _en_segundo_plano(funcion, *args):
+    # Si hay una transacción abierta, esperar al commit (si se revierte, no se notifica)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _encolar(funcion, args))
+    else:
+        _encolar(funcion, args)
+
+
+def vaciar_notificaciones(timeout=None):
+    """Espera a que se procesen las notificaciones encoladas (tests, apagado del proceso)."""
+    _hilo.vaciar(timeout)
+
+
+def _anunciar(clase, destinatarios, proyecto_id, proyecto_nombre):
+    if destinatarios:
+        publicar([canal_notificaciones(uid) for uid in destinatarios], {
+            'tipo': 'notificacion',
+            'clase': clase,
+            'proyecto_id': proyecto_id,
+            'proyecto_nombre': proyecto_nombre,
+        })
+
+
+def notificar_operador(proyecto, operador_id) -> None:
+    """Notificación persistente para el operador asignado a ``proyecto``."""
+    from .models import NotificacionOperador
+    NotificacionOperador.objects.create(
+        destinatario_id=operador_id,
+        proyecto_nombre=proyecto.nombre or '',
+        proyecto_id=proyecto.id,
+    )
+    _anunciar(OPERADOR, [operador_id], proyecto.id, proyecto.nombre or '')
+
+
+def _crear_notificaciones_enchapadores(organizacion_id, proyecto_id, proyecto_nombre):
+    from .models import NotificacionEnchapador, UsuarioPerfilOptimizador
+    destinatarios = list(UsuarioPerfilOptimizador.objects.filter(
+        rol='enchapador', organizacion_id=organizacion_id,
+    ).values_list('user_id', flat=True))
+    if not destinatarios:
+        return
+    NotificacionEnchapador.objects.bulk_create([
+        NotificacionEnchapador(destinatario_id=uid, proyecto_nombre=proyecto_nombre, proyecto_id=proyecto_id)
+        for uid in destinatarios
+    ], batch_size=500)
+    _anunciar(ENCHAPADOR, destinatarios, proyecto_id, proyecto_nombre)
+
+
+def notificar_enchapadores(proyecto) -> None:
+    """Avisa a los enchapadores de la organización que ``proyecto`` está listo para enchapado."""
+    _en_segundo_plano(_crear_notificaciones_enchapadores,
+                      proyecto.organizacion_id, proyecto.id, proyecto.nombre or '')
+
+
+# ── Lectura para el stream unificado ────────────────────────────────────────
+
+def parsear_cursor(valor):
+    """``"<op>.<ench>"`` → (op, ench); None si no es un cursor válido."""
+    try:
+        op, ench = (valor or '').split('.', 1)
+        return int(op), int(ench)
+    except (TypeError, ValueError):
+        return None
+
+
+def formatear_cursor(cursor) -> str:
+    return f'{cursor[0]}.{cursor[1]}'
+
+
+def _serializar(n):
+    return {
+        'id': n.id,
+        'proyecto_nombre': n.proyecto_nombre,
+        'proyecto_id': n.proyecto_id,
+        'fecha': n.fecha.isoformat(),
+    }
+
+
+def pendientes(user_id, cursor=None):
+    """Notificaciones a entregar y el cursor nuevo: ``({'operador': [...], 'enchapador': [...]}, cursor)``.
+
+    Sin cursor se entregan las no leídas; con cursor, también las ya marcadas que son
+    posteriores (se perdieron durante una reconexión). Las entregadas quedan leídas, igual
+    que con las APIs de polling.
+    """
+    from .models import NotificacionEnchapador, NotificacionOperador
+    resultado = {}
+    nuevo = list(cursor or (0, 0))
+    for pos, (clase, modelo) in enumerate(((OPERADOR, NotificacionOperador), (ENCHAPADOR, NotificacionEnchapador))):
+        qs = modelo.objects.filter(destinatario_id=user_id)
+        qs = qs.filter(id__gt=cursor[pos]) if cursor else qs.filter(leida=False)
+        filas = list(qs.order_by('id')[:100])
+        resultado[clase] = [_serializar(n) for n in filas]
+        if filas:
+            nuevo[pos] = max(nuevo[pos], filas[-1].id)
+            modelo.objects.filter(id__in=[n.id for n in filas if not n.leida]).update(leida=True)
+        elif not cursor:
+            # Sin pendientes: el cursor parte del último id existente
+            ultimo = modelo.objects.filter(destinatario_id=user_id).order_by('-id').values_list('id', flat=True).first()
+            nuevo[pos] = ultimo or 0
+    return resultado, tuple(nuevo)
@@ -0,0 +1,152 @@
+import json
+from typing import Any, Dict, Optional
+
+from .fields import cargar_json
+
+# Estados de proyecto en los que las piezas aún no tienen avance real
+ESTADOS_SIN_AVANCE = ('borrador', 'optimizado', 'aprobado', 'asignado', 'enchapado_pendiente')
+
+
+def parse_resultado(raw) -> Dict[str, Any]:
+    """Normaliza resultado_optimizacion (dict, string JSON o doblemente serializado) a dict."""
+    raw = cargar_json(raw)
+    if not raw:
+        return {}
+    if isinstance(raw, dict):
+        return raw
+    try:
+        parsed = json.loads(raw)
+        if isinstance(parsed, str):
+            parsed = json.loads(parsed)
+        return parsed if isinstance(parsed, dict) else {}
+    except Exception:
+        return {}
+
+
+def calcular_resumen(resultado) -> Dict[str, Any]:
+    """Recorre todas las piezas del layout y devuelve los totales del resumen.
+
+    Es el cálculo costoso (O(piezas)); se ejecuta al escribir el layout y su
+    resultado se persiste en ProyectoResumen. El ajuste por estado del proyecto
+    se aplica al leer (ver ``resumen_payload``).
+    """
+    resultado = parse_resultado(resultado)
+    materiales_raw = resultado.get('materiales') or []
+
+    total_piezas_global = 0
+    total_piezas_cortadas = 0
+    total_tableros = 0
+    total_cortes = 0
+    metros_tapacanto = 0.0
+    tiene_tapacanto = False
+    materiales_resumen = []
+
+    for mat in materiales_raw:
+        mat_info = mat.get('material') or {}
+        mat_nombre = mat_info.get('nombre') or mat_info.get('codigo') or mat.get('nombre') or '—'
+        tap_info = mat.get('tapacanto') or {}
+        tap_nombre = (tap_info.get('nombre') or tap_info.get('codigo') or '').strip()
+        tableros = mat.get('tableros') or []
+        mat_tableros = len(tableros)
+
+        # Conteo de piezas: cada (nombre, indiceUnidad) es una pieza distinta.
+        piezas_vistas = set()
+        piezas_cortadas_vistas = set()
+        mat_tc_metros = 0.0
+        mat_cortes = 0
+
+        for t in tableros:
+            piezas_activas = []
+            for pi in (t.get('piezas') or []):
+                estado_pi = (pi.get('estado') or 'pendiente').strip()
+                if estado_pi == 'descartada':
+                    continue
+                piezas_activas.append(pi)
+                clave = (pi.get('nombre') or '', int(pi.get('indiceUnidad') or 0))
+                piezas_vistas.add(clave)
+                if estado_pi == 'cortada':
+                    piezas_cortadas_vistas.add(clave)
+
+                # Metros de tapacanto por pieza (dimensiones en mm → metros)
+                tc = pi.get('tapacantos') or {}
+                ancho_m = float(pi.get('ancho') or 0) / 1000
+                largo_m = float(pi.get('largo') or 0) / 1000
+                if tc.get('arriba'):    mat_tc_metros += ancho_m
+                if tc.get('abajo'):     mat_tc_metros += ancho_m
+                if tc.get('izquierda'): mat_tc_metros += largo_m
+                if tc.get('derecha'):   mat_tc_metros += largo_m
+                if any(tc.get(k) for k in ('arriba', 'abajo', 'izquierda', 'derecha')):
+                    tiene_tapacanto = True
+
+            # Cortes guillotina: filas + columnas únicas de corte en este tablero
+            if piezas_activas:
+                xs = set(round(pi.get('x', 0)) for pi in piezas_activas)
+                ys = set(round(pi.get('y', 0)) for pi in piezas_activas)
+                mat_cortes += max(0, len(xs) - 1) + max(0, len(ys) - 1)
+
+        if tap_nombre:
+            tiene_tapacanto = True
+
+        mat_total_piezas = len(piezas_vistas)
+        total_piezas_global += mat_total_piezas
+        total_piezas_cortadas += len(piezas_cortadas_vistas)
+        total_tableros += mat_tableros
+        total_cortes += mat_cortes
+        metros_tapacanto += mat_tc_metros
+
+        materiales_resumen.append({
+            'nombre': mat_nombre,
+            'tableros': mat_tableros,
+            'piezas': mat_total_piezas,
+            'tapacanto': tap_nombre,
+            'tiene_tapacanto': bool(tap_nombre) or mat_tc_metros > 0,
+        })
+
+    pct_avance = 0.0
+    if total_piezas_global > 0:
+        pct_avance = round(total_piezas_cortadas * 100 / total_piezas_global, 1)
+
+    # Usar totales del header JSON si el parseo de piezas da cero (proyecto nuevo)
+    if total_piezas_global == 0 and resultado.get('total_piezas'):
+        total_piezas_global = int(resultado['total_piezas'])
+    if total_tableros == 0 and resultado.get('total_tableros'):
+        total_tableros = int(resultado['total_tableros'])
+
+    # Si no hay detalle por material pero sí hay totales globales, crear entry genérico
+    if not materiales_resumen and (total_piezas_global > 0 or total_tableros > 0):
+        materiales_resumen = [{
+            'nombre': '—',
+            'tableros': total_tableros,
+            'piezas': total_piezas_global,
+            'tapacanto': '',
+            'tiene_tapacanto': tiene_tapacanto,
+        }]
+
+    return {
+        'total_tableros': total_tableros,
+        'total_piezas': total_piezas_global,
+        'total_piezas_cortadas': total_piezas_cortadas,
+        'total_cortes': total_cortes,
+        'metros_tapacanto': round(metros_tapacanto, 2),
+        'tiene_tapacanto': tiene_tapacanto,
+        'pct_avance': pct_avance,
+        'materiales': materiales_resumen,
+    }
+
+
+def resumen_payload(resumen, estado: Optional[str]) -> Dict[str, Any]:
+    """Convierte un ProyectoResumen persistido al payload de la API aplicando el estado actual.
+    Si el proyecto no ha entrado a producción las piezas no tienen estado → 0%.
+    """
+    sin_avance = estado in ESTADOS_SIN_AVANCE
+    return {
+        'total_materiales': len(resumen.materiales or []),
+        'total_tableros': resumen.total_tableros,
+        'total_piezas': resumen.total_piezas,
+        'total_piezas_cortadas': 0 if sin_avance else resumen.total_piezas_cortadas,
+        'total_cortes': resumen.total_cortes,
+        'metros_tapacanto': resumen.metros_tapacanto,
+        'tiene_tapacanto': resumen.tiene_tapacanto,
+        'pct_avance': 0 if sin_avance else resumen.pct_avance,
+        'materiales': list(resumen.materiales or []),
+    }
@@ -0,0 +1,136 @@
+"""Asignador de IDs concurrente para Proyecto.public_id y Proyecto.correlativo.
+
+Reemplaza el patrón ``order_by('-public_id').first() + 1``, que es O(n) en índice y
+produce duplicados cuando dos optimizaciones llegan a la vez.
+
+- Contadores en la tabla ``Secuencia`` con incremento atómico (UPDATE ... valor = valor + n).
+  El UPDATE bloquea la fila hasta el commit, así que la lectura posterior es consistente.
+- En PostgreSQL, public_id usa la SEQUENCE nativa ``core_proyecto_public_id_seq``
+  (nextval no bloquea ni se revierte).
+- Reserva por bloques: cada worker puede reservar N ids de una vez (setting
+  ``SECUENCIA_PUBLIC_ID_BLOQUE``, por defecto 1 para mantener ids consecutivos).
+- Autocorrección: si un id reservado ya existe (la secuencia quedó atrás tras un
+  ``loaddata`` o una copia de datos), ``sincronizar_public_id()`` la adelanta hasta
+  ``MAX(public_id)`` y se reserva de nuevo. También se puede llamar a mano tras una carga.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import F, Max
+
+PUBLIC_ID_INICIO = 100
+PUBLIC_ID_SEQ = 'core_proyecto_public_id_seq'
+CLAVE_PUBLIC_ID = 'proyecto.public_id'
+
+# Reentrante: sincronizar_public_id() descarta bloques y también corre durante una reserva
+_lock = threading.RLock()
+# Bloques reservados por este proceso: nombre → [siguiente, último]
+_bloques = {}
+
+
+def _reservar(nombre: str, cantidad: int, semilla) -> int:
+    """Reserva ``cantidad`` valores del contador ``nombre`` y devuelve el último.
+    ``semilla`` es un callable que da el valor inicial (último ya usado) si el contador no existe.
+    """
+    from core.models import Secuencia
+    for _ in range(3):
+        with transaction.atomic():
+            n = Secuencia.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+            if n:
+                return Secuencia.objects.filter(nombre=nombre).values_list('valor', flat=True).get()
+            try:
+                with transaction.atomic():
+                    Secuencia.objects.create(nombre=nombre, valor=int(semilla() or 0) + cantidad)
+            except IntegrityError:
+                # Otro proceso lo creó a la vez: reintentar con UPDATE
+                continue
+            return Secuencia.objects.filter(nombre=nombre).values_list('valor', flat=True).get()
+    raise RuntimeError(f"No se pudo reservar la secuencia {nombre}")
+
+
+def _max_public_id():
+    from core.models import Proyecto
+    ultimo = Proyecto.objects.aggregate(m=Max('public_id'))['m'] or 0
+    return max(ultimo, PUBLIC_ID_INICIO - 1)
+
+
+def _usa_sequence_nativa() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def sincronizar_public_id(using=DEFAULT_DB_ALIAS) -> None:
+    """Adelanta el contador de public_id hasta ``MAX(public_id)`` si quedó atrás (nunca lo
+    retrocede) y descarta los bloques reservados por este proceso."""
+    from core.models import Proyecto, Secuencia
+    conexion = connections[using]
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(%s, t.m) FROM (SELECT MAX(public_id) AS m FROM {Proyecto._meta.db_table}) t, "
+                f"{PUBLIC_ID_SEQ} s WHERE t.m IS NOT NULL AND t.m >= s.last_value",
+                [PUBLIC_ID_SEQ],
+            )
+    else:
+        ultimo = Proyecto.objects.using(using).aggregate(m=Max('public_id'))['m']
+        if ultimo is not None:
+            Secuencia.objects.using(using).filter(nombre=CLAVE_PUBLIC_ID, valor__lt=ultimo).update(valor=ultimo)
+    if using == DEFAULT_DB_ALIAS:
+        with _lock:
+            _bloques.pop(CLAVE_PUBLIC_ID, None)
+
+
+def _bloque_public_id(cantidad: int) -> list:
+    from core.models import Proyecto
+    for _ in range(3):
+        if _usa_sequence_nativa():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [PUBLIC_ID_SEQ, cantidad])
+                ids = sorted(row[0] for row in cursor.fetchall())
+        else:
+            ultimo = _reservar(CLAVE_PUBLIC_ID, cantidad, _max_public_id)
+            ids = list(range(ultimo - cantidad + 1, ultimo + 1))
+        # Lectura indexada: detecta una secuencia atrasada antes de que el INSERT choque
+        if not Proyecto.objects.filter(public_id__in=ids).exists():
+            return ids
+        sincronizar_public_id()
+    raise IntegrityError("La secuencia de public_id entrega valores ya usados")
+
+
+def siguiente_public_id() -> int:
+    """Devuelve un public_id nuevo, único y nunca reutilizado (inicia en 100)."""
+    bloque = int(getattr(settings, 'SECUENCIA_PUBLIC_ID_BLOQUE', 1) or 1)
+    # Dentro de una transacción externa el incremento del contador se revertiría con ella:
+    # no cachear bloques en ese caso (en PostgreSQL nextval nunca se revierte).
+    if bloque <= 1 or (connection.in_atomic_block and not _usa_sequence_nativa()):
+        return _bloque_public_id(1)[0]
+    with _lock:
+        actual = _bloques.get(CLAVE_PUBLIC_ID)
+        if not actual:
+            actual = _bloque_public_id(bloque)
+            _bloques[CLAVE_PUBLIC_ID] = actual
+        valor = actual.pop(0)
+        if not actual:
+            _bloques.pop(CLAVE_PUBLIC_ID, None)
+        return valor
+
+
+def siguiente_correlativo(cliente_id) -> int:
+    """Devuelve el siguiente correlativo del cliente (1, 2, 3...)."""
+    from core.models import Proyecto
+
+    def _max_cliente():
+        return Proyecto.objects.filter(cliente_id=cliente_id).aggregate(m=Max('correlativo'))['m'] or 0
+
+    return _reservar(f'proyecto.correlativo:{cliente_id}', 1, _max_cliente)
+
+
+def incrementar_contador(nombre: str) -> int:
+    """Incrementa en 1 el contador ``nombre`` (lo crea en 0 si no existe) y devuelve el valor nuevo."""
+    return _reservar(nombre, 1, lambda: 0)
+
+
+def valor_contador(nombre: str) -> int:
+    """Valor actual del contador ``nombre`` (0 si no existe). No bloquea ni lo modifica."""
+    from core.models import Secuencia
+    return Secuencia.objects.filter(nombre=nombre).values_list('valor', flat=True).first() or 0
@@ -0,0 +1,89 @@
+"""Hilo de fondo por proceso con cola acotada (auditoría, notificaciones).
+
+- ``ColaEnSegundoPlano(nombre, procesar, maximo)`` crea el hilo al primer ``enviar``
+  (y lo recrea si murió, p. ej. tras un fork).
+- ``enviar(item)`` lo deja en la cola; si está llena, ``procesar(item)`` corre en el hilo
+  del llamador (backpressure): nunca se descarta nada.
+- Con ``combinar(lote, extra)`` el hilo junta lo que ya esté en cola antes de procesarlo
+  (p. ej. varias listas de filas en un solo ``bulk_create``).
+- ``vaciar(timeout)`` espera a que se procese lo encolado; se registra en ``atexit``.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class ColaEnSegundoPlano:
+
+    def __init__(self, nombre, procesar, maximo=1000, combinar=None):
+        self.nombre = nombre
+        self.procesar = procesar
+        # Entero o callable (p. ej. para leer un setting recién al crear la cola)
+        self.maximo = maximo
+        self.combinar = combinar
+        self._cola = None
+        self._hilo = None
+        self._lock = threading.Lock()
+        atexit.register(self.vaciar, 10)
+
+    def _obtener_cola(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return self._cola
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                maximo = self.maximo() if callable(self.maximo) else self.maximo
+                self._cola = queue.Queue(maxsize=int(maximo))
+                self._hilo = threading.Thread(target=self._bucle, args=(self._cola,), name=self.nombre, daemon=True)
+                self._hilo.start()
+        return self._cola
+
+    def enviar(self, item) -> None:
+        try:
+            self._obtener_cola().put_nowait(item)
+        except queue.Full:
+            # Backpressure: el hilo no da abasto, procesar en el hilo actual
+            self._ejecutar(item)
+
+    def _ejecutar(self, item):
+        try:
+            self.procesar(item)
+        except Exception:
+            # procesar() maneja sus propios errores; esto solo protege el hilo
+            logger.exception("Error no controlado en %s", self.nombre)
+
+    def _bucle(self, cola):
+        while True:
+            item = cola.get()
+            if self.combinar is not None:
+                # Juntar lo que ya esté en cola para procesarlo de una vez
+                while True:
+                    try:
+                        extra = cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    item = self.combinar(item, extra)
+                    cola.task_done()
+            close_old_connections()
+            self._ejecutar(item)
+            cola.task_done()
+
+    def vaciar(self, timeout=None) -> None:
+        """Espera a que se procese lo encolado (tests, apagado del proceso)."""
+        cola = self._cola
+        if cola is None or self._hilo is None or not self._hilo.is_alive():
+            return
+        if timeout is None:
+            cola.join()
+            return
+        hecho = threading.Event()
+
+        def _esperar():
+            cola.join()
+            hecho.set()
+        threading.Thread(target=_esperar, daemon=True).start()
+        hecho.wait(timeout)
@@ -1,21 +1,32 @@
+import copy
 import datetime
-from django.db.models.signals import post_save, post_delete
+import logging
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.db import models
 from django.contrib.auth.models import AnonymousUser
 
 from .models import (
-    AuditLog,
     Cliente,
     Proyecto,
+    ProyectoResumen,
     Material,
     Tapacanto,
     MaterialProyecto,
+    Mensaje,
     UsuarioPerfilOptimizador,
+    Organizacion,
     SuperAdminSatelite,
     SATELITE_ROLES,
 )
 from .middleware import get_current_user
+from .audit import agrupacion_activa, registrar_auditoria
+from .fields import JSONComprimido
+from .auth_utils import invalidar_contexto
+from .catalogo import invalidar_catalogo
+from .eventos import publicar_mensaje, publicar_proyecto
+
+logger = logging.getLogger(__name__)
 
 
 def _get_actor_and_org():
@@ -29,46 +40,135 @@ def _get_actor_and_org():
     return (user if not isinstance(user, AnonymousUser) else None, org)
 
 
+# Campos demasiado grandes para copiar al audit: solo se registra que cambiaron
+CAMPOS_SOLO_MARCA = {'resultado_optimizacion', 'configuracion_corte', 'configuracion'}
+MARCA_MODIFICADO = '(modificado)'
+
+
+def _valor_json(val):
+    # Convertir objetos no JSON-serializables a str
+    if isinstance(val, (datetime.date, datetime.datetime, datetime.time)):
+        return val.isoformat()
+    if isinstance(val, (dict, list, str, int, float, bool, type(None))):
+        return val
+    return str(val)
+
+
 def _serialize_instance(instance: models.Model) -> dict:
-    # Campos a excluir del audit (demasiado grandes o con tipos no serializables)
-    EXCLUDE_FIELDS = {'resultado_optimizacion', 'configuracion_corte'}
     data = {}
     for field in instance._meta.fields:
         name = field.name
-        if name in EXCLUDE_FIELDS:
+        if name in CAMPOS_SOLO_MARCA:
             continue
         try:
             # Para claves foráneas, tomar el id
             if isinstance(field, models.ForeignKey):
                 data[name] = getattr(instance, f"{name}_id", None)
             else:
-                val = getattr(instance, name)
-                # Convertir objetos no JSON-serializables a str
-                if isinstance(val, (datetime.date, datetime.datetime, datetime.time)):
-                    data[name] = val.isoformat()
-                elif isinstance(val, (dict, list, str, int, float, bool, type(None))):
-                    data[name] = val
-                else:
-                    data[name] = str(val)
+                data[name] = _valor_json(getattr(instance, name))
         except Exception:
             data[name] = None
     return data
 
 
-def _log(verb: str, instance: models.Model):
-    actor, org = _get_actor_and_org()
+# ── Dirty-field tracking ─────────────────────────────────────────────────────
+# Al instanciar un modelo auditado se guarda una foto de los valores crudos cargados
+# (instance.__dict__, sin disparar descriptores ni descomprimir JSON). Los JSON pequeños
+# (dict/list) se copian: si se mutan en el mismo objeto, la foto conserva el valor
+# anterior. Los campos de CAMPOS_SOLO_MARCA (layouts de varios MB) no se copian ni se
+# decodifican: la foto guarda el mismo objeto y cuentan como modificados si se reasignan
+# o si vienen en update_fields. Al guardar se compara contra esa foto y solo se registran
+# los campos que cambiaron.
+
+def _campos_auditables(model):
+    cache = getattr(model, '_audit_campos', None)
+    if cache is None:
+        cache = tuple(
+            (f.name, f.attname) for f in model._meta.concrete_fields
+            if not getattr(f, 'auto_now', False)
+        )
+        model._audit_campos = cache
+    return cache
+
+
+def _tomar_foto(instance):
+    d = instance.__dict__
+    d.pop('_json_descomprimidos', None)
+    instance._audit_foto = {
+        attname: copy.deepcopy(d[attname])
+        if name not in CAMPOS_SOLO_MARCA and isinstance(d[attname], (dict, list)) else d[attname]
+        for name, attname in _campos_auditables(instance.__class__)
+        if attname in d
+    }
+
+
+def _reasignado(instance, attname, antes, despues) -> bool:
+    """Cambio de un campo de CAMPOS_SOLO_MARCA sin copiar ni decodificar el valor."""
+    if antes is despues:
+        return False
+    if isinstance(antes, JSONComprimido):
+        if isinstance(despues, JSONComprimido):
+            return antes.texto != despues.texto
+        # Solo se leyó: el descriptor lo descomprimió en este mismo objeto
+        return (instance.__dict__.get('_json_descomprimidos') or {}).get(attname) is not despues
+    return True
+
+
+def _distinto(antes, despues) -> bool:
+    if antes is despues:
+        return False
     try:
-        changes = _serialize_instance(instance)
+        return antes != despues
     except Exception:
-        changes = None
+        return True
+
+
+def _diff(instance, update_fields=None) -> dict:
+    foto = getattr(instance, '_audit_foto', None) or {}
+    d = instance.__dict__
+    cambios = {}
+    for name, attname in _campos_auditables(instance.__class__):
+        if update_fields is not None and name not in update_fields and attname not in update_fields:
+            continue
+        if attname not in foto:
+            # Campo diferido al cargar: solo cuenta si se guardó explícitamente
+            if update_fields is None or attname not in d:
+                continue
+            cambios[name] = MARCA_MODIFICADO if name in CAMPOS_SOLO_MARCA else [None, _valor_json(d[attname])]
+            continue
+        antes = foto[attname]
+        despues = d.get(attname, antes)
+        if name in CAMPOS_SOLO_MARCA:
+            if update_fields is not None or _reasignado(instance, attname, antes, despues):
+                cambios[name] = MARCA_MODIFICADO
+            continue
+        if _distinto(antes, despues):
+            cambios[name] = [_valor_json(antes), _valor_json(despues)]
+    return cambios
+
+
+def _log(verb: str, instance: models.Model, changes=None):
+    target_model = instance.__class__.__name__
+    target_id = str(getattr(instance, 'pk', ''))
+    grupo = agrupacion_activa()
+    if grupo is not None:
+        grupo.agregar(verb, target_model, target_id)
+        return
+
+    actor, org = _get_actor_and_org()
+    if changes is None:
+        try:
+            changes = _serialize_instance(instance)
+        except Exception:
+            changes = None
 
     try:
-        AuditLog.objects.create(
+        registrar_auditoria(
             actor=actor,
             organizacion=org,
             verb=verb,
-            target_model=instance.__class__.__name__,
-            target_id=str(getattr(instance, 'pk', '')),
+            target_model=target_model,
+            target_id=target_id,
             target_repr=str(instance),
             changes=changes,
         )
@@ -77,10 +177,37 @@ def _log(verb: str, instance: models.Model):
         pass
 
 
+def _log_guardado(instance, created, update_fields=None):
+    """CREATE con la foto completa; UPDATE solo con los campos modificados (o nada si no hubo cambios)."""
+    if created:
+        _log('CREATE', instance)
+        _tomar_foto(instance)
+        return
+    try:
+        cambios = _diff(instance, update_fields)
+    except Exception:
+        cambios = None
+    if cambios == {}:
+        return
+    _log('UPDATE', instance, changes=cambios)
+    _tomar_foto(instance)
+
+
 # Registrar señales para los modelos críticos
+MODELOS_AUDITADOS = (Cliente, Proyecto, Material, Tapacanto, MaterialProyecto)
+
+
+def _foto_al_cargar(sender, instance, **kwargs):
+    _tomar_foto(instance)
+
+
+for _modelo in MODELOS_AUDITADOS:
+    post_init.connect(_foto_al_cargar, sender=_modelo, dispatch_uid=f'audit_foto_{_modelo.__name__}')
+
+
 @receiver(post_save, sender=Cliente)
-def cliente_saved(sender, instance, created, **kwargs):
-    _log('CREATE' if created else 'UPDATE', instance)
+def cliente_saved(sender, instance, created, update_fields=None, **kwargs):
+    _log_guardado(instance, created, update_fields)
 
 
 @receiver(post_delete, sender=Cliente)
@@ -89,8 +216,29 @@ def cliente_deleted(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Proyecto)
-def proyecto_saved(sender, instance, created, **kwargs):
-    _log('CREATE' if created else 'UPDATE', instance)
+def proyecto_saved(sender, instance, created, update_fields=None, **kwargs):
+    _log_guardado(instance, created, update_fields)
+
+
+@receiver(post_save, sender=Proyecto)
+def proyecto_resumen_sync(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Mantiene ProyectoResumen al día cuando cambia el layout o el estado de las piezas."""
+    if raw:
+        return
+    if update_fields is not None and 'resultado_optimizacion' not in update_fields:
+        return
+    from django.db import transaction
+    try:
+        # Savepoint: un fallo aquí no invalida la transacción del guardado
+        with transaction.atomic():
+            ProyectoResumen.sincronizar(instance)
+    except Exception:
+        logger.exception("No se pudo sincronizar el resumen del proyecto %s", instance.pk)
+        # El resumen se reconstruye al leer si falta: borrarlo evita servir uno desactualizado
+        try:
+            ProyectoResumen.objects.filter(proyecto_id=instance.pk).delete()
+        except Exception:
+            logger.exception("No se pudo descartar el resumen del proyecto %s", instance.pk)
 
 
 @receiver(post_delete, sender=Proyecto)
@@ -98,9 +246,55 @@ def proyecto_deleted(sender, instance, **kwargs):
     _log('DELETE', instance)
 
 
+# Campos que cambian lo que ve el Operador en su listado (core.eventos → SSE)
+CAMPOS_EVENTO_PROYECTO = {'estado', 'operador', 'operador_id', 'organizacion', 'organizacion_id'}
+
+
+@receiver(pre_save, sender=Proyecto)
+def proyecto_organizacion_anterior(sender, instance, raw=False, **kwargs):
+    """Recuerda la organización cargada: proyecto_saved renueva la foto antes de proyecto_evento."""
+    if raw or instance._state.adding:
+        return
+    foto = getattr(instance, '_audit_foto', None) or {}
+    instance._evento_org_anterior = foto.get('organizacion_id')
+
+
+@receiver(post_save, sender=Proyecto)
+def proyecto_evento(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    anterior = instance.__dict__.pop('_evento_org_anterior', None)
+    if raw:
+        return
+    if not created and update_fields is not None and not CAMPOS_EVENTO_PROYECTO.intersection(update_fields):
+        return
+    try:
+        publicar_proyecto(instance, organizacion_anterior=anterior)
+    except Exception:
+        pass
+
+
+@receiver(post_delete, sender=Proyecto)
+def proyecto_evento_eliminado(sender, instance, **kwargs):
+    try:
+        publicar_proyecto(instance, eliminado=True)
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=Mensaje)
+def mensaje_evento(sender, instance, created, raw=False, **kwargs):
+    """Empuja el mensaje nuevo al canal de chat de cada participante (core.eventos)."""
+    if raw or not created:
+        return
+    try:
+        participantes = list(instance.conversacion.participantes.values_list('id', flat=True))
+        publicar_mensaje(instance, participantes)
+    except Exception:
+        pass
+
+
 @receiver(post_save, sender=Material)
-def material_saved(sender, instance, created, **kwargs):
-    _log('CREATE' if created else 'UPDATE', instance)
+def material_saved(sender, instance, created, update_fields=None, **kwargs):
+    _log_guardado(instance, created, update_fields)
 
 
 @receiver(post_delete, sender=Material)
@@ -109,8 +303,8 @@ def material_deleted(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Tapacanto)
-def tapacanto_saved(sender, instance, created, **kwargs):
-    _log('CREATE' if created else 'UPDATE', instance)
+def tapacanto_saved(sender, instance, created, update_fields=None, **kwargs):
+    _log_guardado(instance, created, update_fields)
 
 
 @receiver(post_delete, sender=Tapacanto)
@@ -119,8 +313,8 @@ def tapacanto_deleted(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=MaterialProyecto)
-def materialproyecto_saved(sender, instance, created, **kwargs):
-    _log('CREATE' if created else 'UPDATE', instance)
+def materialproyecto_saved(sender, instance, created, update_fields=None, **kwargs):
+    _log_guardado(instance, created, update_fields)
 
 
 @receiver(post_delete, sender=MaterialProyecto)
@@ -128,6 +322,28 @@ def materialproyecto_deleted(sender, instance, **kwargs):
     _log('DELETE', instance)
 
 
+# ── Invalidación del catálogo cacheado por organización (core.catalogo) ─────
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+@receiver(post_save, sender=Tapacanto)
+@receiver(post_delete, sender=Tapacanto)
+def catalogo_invalidar(sender, instance, **kwargs):
+    invalidar_catalogo(instance.organizacion_id)
+
+
+# ── Invalidación del contexto de autenticación cacheado (core.auth_utils) ────
+@receiver(post_save, sender=UsuarioPerfilOptimizador)
+@receiver(post_delete, sender=UsuarioPerfilOptimizador)
+def perfil_invalidar_auth_context(sender, instance, **kwargs):
+    invalidar_contexto('user', instance.user_id)
+
+
+@receiver(post_save, sender=Organizacion)
+@receiver(post_delete, sender=Organizacion)
+def organizacion_invalidar_auth_context(sender, instance, **kwargs):
+    invalidar_contexto('org', instance.pk)
+
+
 # ── Señal: auto-crear satélites cuando se guarda un perfil super_admin ────────
 @receiver(post_save, sender=UsuarioPerfilOptimizador)
 def crear_satelites_super_admin(sender, instance, created, **kwargs):
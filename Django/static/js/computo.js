@@ -0,0 +1,28 @@
+// Trabajos del pool de cómputo (PDF, optimización): si la vista responde 202, consultar
+// estado_url hasta que termine y devolver la respuesta final (fetch de `url` o la
+// `respuesta` JSON guardada). Uso: const resp = await esperarComputo(await fetch(...)).
+(function(){
+	if (window.esperarComputo) return;
+	const json = (datos, status) => new Response(JSON.stringify(datos), { status, headers: { 'Content-Type': 'application/json' } });
+	const pausa = ms => new Promise(r => setTimeout(r, ms));
+	window.esperarComputo = async function(resp, { intervalo = 1500, maximo = 300000 } = {}){
+		if (!resp || resp.status !== 202) return resp;
+		const datos = await resp.clone().json().catch(() => null);
+		if (!datos || !datos.estado_url) return resp;
+		const limite = Date.now() + maximo;
+		while (Date.now() < limite){
+			await pausa(intervalo);
+			const r = await fetch(datos.estado_url, { credentials: 'same-origin' }).catch(() => null);
+			// Estado en otro worker (cache no compartido): pedir directamente el resultado
+			if (!r || !r.ok) return datos.url ? window.esperarComputo(await fetch(datos.url, { credentials: 'same-origin' }), { intervalo, maximo: limite - Date.now() }) : json({ success: false, message: 'No se pudo consultar el trabajo' }, 502);
+			const trabajo = ((await r.json().catch(() => ({}))).trabajo) || {};
+			if (trabajo.estado === 'completado'){
+				if (datos.url) return fetch(datos.url, { credentials: 'same-origin' });
+				const respuesta = trabajo.respuesta || { success: true };
+				return json(respuesta, respuesta.success === false ? 400 : 200);
+			}
+			if (trabajo.estado === 'error') return json({ success: false, message: trabajo.error || 'Error en el trabajo' }, 500);
+		}
+		return json({ success: false, message: 'La generación está tomando demasiado tiempo' }, 504);
+	};
+})();
@@ -0,0 +1,23 @@
+// Stream unificado del usuario (SSE /api/eventos): una sola conexión por pestaña para
+// notificaciones de operador/enchapador y eventos de chat ('notificaciones', 'mensaje',
+// 'no_leidos'). Uso: window.eventosUsuario.on('tipo', fn). Se puede incluir varias veces.
+(function(){
+	if (!window.EventSource || window.eventosUsuario) return;
+	let es = null;
+	const listeners = [];
+	function abrir(){
+		if (es) return;
+		es = new EventSource('/api/eventos');
+		listeners.forEach(([tipo, fn]) => es.addEventListener(tipo, fn));
+	}
+	function cerrar(){
+		if (!es) return;
+		es.close();
+		es = null;
+	}
+	window.eventosUsuario = {
+		on(tipo, fn){ listeners.push([tipo, fn]); if (es) es.addEventListener(tipo, fn); abrir(); },
+	};
+	// Cerrar con la pestaña oculta y reabrir al volver (al conectar llega lo pendiente)
+	document.addEventListener('visibilitychange', () => { if (document.hidden) cerrar(); else if (listeners.length) abrir(); });
+})();
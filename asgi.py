@@ -0,0 +1,18 @@
+import os
+import sys
+from pathlib import Path
+
+# Añadir la carpeta 'Django' al PYTHONPATH para que el paquete WowDash sea importable desde la raíz
+BASE_DIR = Path(__file__).resolve().parent
+DJANGO_DIR = BASE_DIR / 'Django'
+if str(DJANGO_DIR) not in sys.path:
+    sys.path.insert(0, str(DJANGO_DIR))
+
+# Configurar el módulo de settings de Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WowDash.settings')
+
+from django.core.asgi import get_asgi_application  # noqa: E402
+
+# Entrada ASGI: las vistas async (p.ej. SSE del operador) mantienen conexiones abiertas sin
+# ocupar un worker. Ejemplo: gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+application = get_asgi_application()